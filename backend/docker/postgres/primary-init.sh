@@ -0,0 +1,11 @@
+#!/bin/bash
+# Replication role and pg_hba entry for the streaming replica of
+# docker-compose.replica.yml. Init scripts run only on an empty data
+# volume (`docker compose down -v` to re-run).
+set -euo pipefail
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-SQL
+	CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD '${REPLICATION_PASSWORD:-replicator}';
+SQL
+
+echo "host replication replicator all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -1,5 +1,19 @@
-from .llm import rank_friend_match_for_users, rank_movies_for_user
-
-__all__ = ["rank_movies_for_user", "rank_friend_match_for_users"]
+from .features import FeatureVocabulary
+from .llm import (RankingCatalog, rank_friend_match_for_users,
+                  rank_movies_dense, rank_movies_encoded,
+                  rank_movies_for_user, rank_movies_for_users,
+                  ranking_catalog)
+from .taste import DenseTasteLayout
 
+__all__ = [
+    "rank_movies_for_user",
+    "rank_movies_encoded",
+    "rank_movies_dense",
+    "rank_movies_for_users",
+    "ranking_catalog",
+    "RankingCatalog",
+    "rank_friend_match_for_users",
+    "FeatureVocabulary",
+    "DenseTasteLayout",
+]
 
@@ -0,0 +1,190 @@
+"""
+Item-to-item co-occurrence ("users who liked X also liked Y").
+
+A basket is the set of movies one user liked (favorites + like-swipes).
+The co-occurrence matrix counts, for every item pair, how many baskets
+contain both; normalizing by the item counts turns counts into a
+similarity that does not just echo popularity.
+"""
+
+from typing import Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from .embeddings import SparseRows
+
+COSINE = "cosine"
+LIFT = "lift"
+
+# pairs seen fewer times than this are noise, especially under lift
+MIN_SUPPORT = 2
+
+
+def _merge_pair_counts(
+    codes: np.ndarray, counts: np.ndarray, pending: list[np.ndarray]
+) -> tuple[np.ndarray, np.ndarray]:
+    all_codes = np.concatenate([codes, *pending])
+    all_counts = np.concatenate(
+        [counts, *(np.ones(len(p), dtype=np.int64) for p in pending)]
+    )
+    unique, inverse = np.unique(all_codes, return_inverse=True)
+    return unique, np.bincount(inverse, weights=all_counts).astype(np.int64)
+
+
+def cooccurrence_matrix(
+    baskets: Iterable[np.ndarray],
+    n_items: int,
+    max_basket: int = 500,
+    flush_pairs: int = 5_000_000,
+) -> tuple[SparseRows, np.ndarray, int]:
+    """
+    Symmetric item×item co-occurrence counts (diagonal excluded) from
+    baskets of item indices in `[0, n_items)`.
+
+    Pairs are encoded as `i * n_items + j` (i < j) and reduced with
+    `np.unique` every `flush_pairs` pairs, so memory stays bounded by the
+    number of distinct pairs. Baskets are capped at `max_basket` items.
+    Returns (counts as CSR, per-item basket counts, number of baskets).
+    """
+    item_counts = np.zeros(n_items, dtype=np.int64)
+    n_baskets = 0
+    codes = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    pending: list[np.ndarray] = []
+    buffered = 0
+
+    for basket in baskets:
+        items = np.unique(np.asarray(basket, dtype=np.int64))[:max_basket]
+        if not len(items):
+            continue
+        n_baskets += 1
+        item_counts[items] += 1
+        if len(items) < 2:
+            continue
+        i, j = np.triu_indices(len(items), k=1)
+        pending.append(items[i] * n_items + items[j])
+        buffered += len(i)
+        if buffered >= flush_pairs:
+            codes, counts = _merge_pair_counts(codes, counts, pending)
+            pending, buffered = [], 0
+    if pending:
+        codes, counts = _merge_pair_counts(codes, counts, pending)
+
+    upper, lower = codes // n_items, codes % n_items
+    rows = np.concatenate([upper, lower])
+    cols = np.concatenate([lower, upper])
+    values = np.concatenate([counts, counts])
+    order = np.lexsort((cols, rows))
+    indptr = np.concatenate(
+        [[0], np.cumsum(np.bincount(rows, minlength=n_items))]
+    ).astype(np.int64)
+    matrix = SparseRows(
+        indptr,
+        cols[order].astype(np.int32),
+        values[order].astype(np.float32),
+        n_items,
+    )
+    return matrix, item_counts, n_baskets
+
+
+def normalize_counts(
+    counts: np.ndarray,
+    count_x: np.ndarray | float,
+    count_y: np.ndarray,
+    n_baskets: int,
+    method: str = COSINE,
+) -> np.ndarray:
+    """
+    Co-occurrence counts → similarity. cosine: c / sqrt(n_x n_y);
+    lift: c N / (n_x n_y). Pairs under MIN_SUPPORT score 0.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    denom = np.asarray(count_x, dtype=np.float64) * np.asarray(
+        count_y, dtype=np.float64
+    )
+    denom[denom == 0] = np.inf
+    if method == LIFT:
+        scores = counts * max(n_baskets, 1) / denom
+    else:
+        scores = counts / np.sqrt(denom)
+    scores[counts < MIN_SUPPORT] = 0.0
+    return scores
+
+
+def top_k_neighbours(
+    matrix: SparseRows,
+    item_counts: np.ndarray,
+    n_baskets: int,
+    k: int,
+    method: str = COSINE,
+) -> Iterable[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Per item with any co-occurrence: (item, top-k neighbour items,
+    normalized scores), best first; zero-score neighbours are dropped.
+    """
+    for item in range(matrix.n_rows):
+        lo, hi = matrix.indptr[item], matrix.indptr[item + 1]
+        if hi == lo:
+            continue
+        neighbours = matrix.indices[lo:hi]
+        scores = normalize_counts(
+            matrix.data[lo:hi],
+            item_counts[item],
+            item_counts[neighbours],
+            n_baskets,
+            method,
+        )
+        keep = min(k, len(scores))
+        top = np.argpartition(-scores, keep - 1)[:keep]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        if len(top):
+            yield item, neighbours[top], scores[top]
+
+
+def neighbour_scores(
+    neighbour_lists: Iterable[Iterable[Tuple[str, float]]],
+) -> dict[str, float]:
+    """
+    Collaborative score of every movie reachable from a user's liked
+    movies: the sum of its similarities to each of them.
+    """
+    scores: dict[str, float] = {}
+    for neighbours in neighbour_lists:
+        for movie_id, score in neighbours:
+            scores[movie_id] = scores.get(movie_id, 0.0) + score
+    return scores
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    lo, hi = values.min(), values.max()
+    if hi <= lo:
+        return np.zeros_like(values)
+    return (values - lo) / (hi - lo)
+
+
+def blend_rankings(
+    content: List[Tuple[str, float]],
+    signals: Sequence[Tuple[Mapping[str, float], float]],
+) -> List[Tuple[str, float]]:
+    """
+    Mix content-ranker scores with collaborative `(scores, weight)`
+    signals (co-occurrence, matrix factorization). Every signal is min-max
+    scaled over the candidate set first (their raw scales are unrelated);
+    empty signals are skipped and content keeps the remaining share.
+    """
+    signals = [(scores, w) for scores, w in signals if scores and w > 0]
+    if not content or not signals:
+        return content
+    ids = [mid for mid, _ in content]
+    content_weight = max(0.0, 1.0 - sum(w for _, w in signals))
+    blended = content_weight * _min_max(
+        np.array([s for _, s in content], dtype=np.float64)
+    )
+    for scores, weight in signals:
+        blended += weight * _min_max(
+            np.array([scores.get(mid, 0.0) for mid in ids], dtype=np.float64)
+        )
+    scored = [(mid, float(s)) for mid, s in zip(ids, blended)]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored
@@ -0,0 +1,303 @@
+"""
+Content embeddings for "similar movies".
+
+TF-IDF over overview words, genres and keywords, reduced to a dense
+embedding with a randomized truncated SVD, plus a random-projection LSH
+index for approximate cosine nearest neighbours. NumPy only: the sparse
+matrix is kept as plain CSR arrays.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Iterable, NamedTuple, Sequence
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z][a-z0-9']{2,}")
+
+STOP_WORDS = frozenset(
+    """
+    the and for with that this from his her hers him their they them into
+    who whom what when where which while about after before over under than
+    then there these those has have had was were are been being its not but
+    all one two out off she you your our ours its also only more most very
+    can will just upon must each other some such both few own same too any
+    through during between against again further once here why how
+    """.split()
+)
+
+# a genre/keyword tag counts this many times an overview word
+TAG_WEIGHT = 2.0
+
+
+def movie_terms(
+    overview: str | None,
+    genres: Iterable[str] | None,
+    keywords: Iterable[str] | None,
+) -> dict[str, float]:
+    """
+    Raw term counts of one movie; tags are prefixed so "war" the genre and
+    "war" the overview word stay distinct terms.
+    """
+    counts: dict[str, float] = {}
+    for word in _TOKEN.findall((overview or "").lower()):
+        if word not in STOP_WORDS:
+            counts[word] = counts.get(word, 0.0) + 1.0
+    for prefix, tags in (("g:", genres), ("k:", keywords)):
+        for tag in tags or ():
+            term = prefix + tag.lower()
+            counts[term] = counts.get(term, 0.0) + TAG_WEIGHT
+    return counts
+
+
+class SparseRows(NamedTuple):
+    """
+    CSR matrix: row i is `indices/data[indptr[i]:indptr[i + 1]]`.
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    n_cols: int
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.indptr) - 1
+
+
+def tfidf_matrix(
+    docs: Sequence[dict[str, float]],
+    min_df: int = 2,
+    max_df_ratio: float = 0.5,
+    max_features: int = 50_000,
+) -> tuple[SparseRows, list[str]]:
+    """
+    Sublinear-tf, smoothed-idf, L2-normalized TF-IDF rows. Terms in fewer
+    than `min_df` or more than `max_df_ratio` of the documents are dropped.
+    """
+    n = len(docs)
+    df = Counter(term for doc in docs for term in doc)
+    max_df = max(min_df, int(max_df_ratio * n))
+    kept = [t for t, c in df.items() if min_df <= c <= max_df]
+    kept.sort(key=lambda t: (-df[t], t))
+    terms = kept[:max_features]
+    column = {t: i for i, t in enumerate(terms)}
+    idf = {t: math.log((1 + n) / (1 + df[t])) + 1.0 for t in terms}
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indices: list[int] = []
+    data: list[float] = []
+    for row, doc in enumerate(docs):
+        cells = sorted(
+            (column[t], (1.0 + math.log(c)) * idf[t])
+            for t, c in doc.items()
+            if t in column
+        )
+        norm = math.sqrt(sum(v * v for _, v in cells)) or 1.0
+        indices.extend(c for c, _ in cells)
+        data.extend(v / norm for _, v in cells)
+        indptr[row + 1] = len(indices)
+
+    matrix = SparseRows(
+        indptr,
+        np.array(indices, dtype=np.int32),
+        np.array(data, dtype=np.float32),
+        len(terms),
+    )
+    return matrix, terms
+
+
+def transpose(m: SparseRows) -> SparseRows:
+    order = np.argsort(m.indices, kind="stable")
+    rows = np.repeat(np.arange(m.n_rows, dtype=np.int32), np.diff(m.indptr))
+    counts = np.bincount(m.indices, minlength=m.n_cols)
+    return SparseRows(
+        np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        rows[order],
+        m.data[order],
+        m.n_rows,
+    )
+
+
+def _csr_dot(m: SparseRows, dense: np.ndarray) -> np.ndarray:
+    """
+    `m @ dense`, one weighted bincount per output column (much faster than
+    `np.add.reduceat` over an (nnz, k) intermediate, and O(nnz) memory).
+    """
+    rows = np.repeat(np.arange(m.n_rows), np.diff(m.indptr))
+    columns = np.ascontiguousarray(dense.T, dtype=np.float32)
+    out = np.empty((m.n_rows, dense.shape[1]), dtype=np.float32)
+    for j, column in enumerate(columns):
+        out[:, j] = np.bincount(
+            rows, weights=column[m.indices] * m.data, minlength=m.n_rows
+        )
+    return out
+
+
+def truncated_svd(
+    m: SparseRows,
+    n_components: int = 64,
+    n_oversamples: int = 10,
+    n_iter: int = 4,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Randomized truncated SVD (Halko et al.) of a CSR matrix. Returns the
+    row embedding `U * S`, shape (n_rows, n_components).
+    """
+    n_components = min(n_components, m.n_rows, m.n_cols)
+    k = min(n_components + n_oversamples, m.n_rows, m.n_cols)
+    rng = np.random.default_rng(seed)
+    mt = transpose(m)
+
+    q, _ = np.linalg.qr(
+        _csr_dot(m, rng.standard_normal((m.n_cols, k)).astype(np.float32))
+    )
+    for _ in range(n_iter):
+        z, _ = np.linalg.qr(_csr_dot(mt, q))
+        q, _ = np.linalg.qr(_csr_dot(m, z))
+
+    # B = Q^T A, small (k, n_cols)
+    b = _csr_dot(mt, q).T
+    ub, s, _ = np.linalg.svd(b, full_matrices=False)
+    u = q @ ub[:, :n_components]
+    return (u * s[:n_components]).astype(np.float32)
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (x / norms).astype(np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def brute_force_neighbours(
+    vectors: np.ndarray, row: int, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k rows by cosine (vectors L2-normalized), excluding `row`.
+    """
+    scores = vectors @ vectors[row]
+    scores[row] = -np.inf
+    top = _top_k(scores, k)
+    return top, scores[top]
+
+
+def exact_top_k_table(
+    vectors: np.ndarray,
+    rows: np.ndarray,
+    k: int,
+    chunk: int | None = None,
+    memory_budget: int = 64 << 20,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact neighbours for many rows at once, one matrix multiply per chunk.
+    Returns (neighbour rows, scores), both shape (len(rows), k).
+
+    Each chunk row costs ~12 bytes per catalog row (float32 scores plus
+    int64 argpartition indices), so by default the chunk is sized to keep
+    that under `memory_budget` bytes.
+    """
+    k = min(k, len(vectors) - 1)
+    if chunk is None:
+        chunk = max(1, memory_budget // (12 * max(len(vectors), 1)))
+    out_rows = np.empty((len(rows), k), dtype=np.int64)
+    out_scores = np.empty((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), chunk):
+        batch = rows[start:start + chunk]
+        scores = vectors[batch] @ vectors.T
+        scores[np.arange(len(batch)), batch] = -np.inf
+        # kth from the end: no negated copy of the score matrix
+        part = np.argpartition(scores, -k, axis=1)[:, -k:]
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        del scores
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        out_rows[start:start + len(batch)] = np.take_along_axis(part, order, axis=1)
+        out_scores[start:start + len(batch)] = np.take_along_axis(
+            part_scores, order, axis=1
+        )
+    return out_rows, out_scores
+
+
+class RandomProjectionLSH:
+    """
+    Sign-random-projection LSH for cosine similarity.
+
+    Each of `n_tables` tables hashes a vector to the signs of `n_bits`
+    random hyperplanes. A table is the row order sorted by code plus a
+    `2**n_bits + 1` offsets array, so a bucket is a slice rather than a
+    Python list. A query probes its own bucket and every one-bit neighbour
+    in each table, then re-ranks the union exactly.
+    """
+
+    __slots__ = ("vectors", "planes", "_powers", "_starts", "_rows")
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        n_tables: int = 8,
+        n_bits: int = 12,
+        seed: int = 0,
+    ) -> None:
+        rng = np.random.default_rng(seed)
+        self.vectors = vectors
+        self.planes = rng.standard_normal(
+            (n_tables, n_bits, vectors.shape[1])
+        ).astype(np.float32)
+        self._powers = (1 << np.arange(n_bits)).astype(np.int32)
+        codes = self._hash(vectors)
+        order = np.argsort(codes, axis=1, kind="stable")
+        sorted_codes = np.take_along_axis(codes, order, axis=1)
+        all_codes = np.arange((1 << n_bits) + 1)
+        # row order of all tables flattened; bucket (t, c) is
+        # _rows[_starts[t, c]:_starts[t, c + 1]]
+        self._rows = order.astype(np.int32).ravel()
+        self._starts = np.stack(
+            [
+                t * len(vectors) + np.searchsorted(sorted_codes[t], all_codes)
+                for t in range(n_tables)
+            ]
+        ).astype(np.int64)
+
+    def _hash(self, x: np.ndarray) -> np.ndarray:
+        # (n_tables, n) bucket codes
+        bits = np.einsum("tbd,nd->tnb", self.planes, x) > 0
+        return (bits.astype(np.int32) @ self._powers).astype(np.int32)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        codes = self._hash(query[None, :])[:, 0]
+        probes = codes[:, None] ^ np.concatenate([[0], self._powers])
+        tables = np.arange(len(codes))[:, None]
+        lo = self._starts[tables, probes].ravel()
+        hi = self._starts[tables, probes + 1].ravel()
+        lengths = hi - lo
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int32)
+        # concatenated slices without a Python loop: position j of bucket b
+        # is lo[b] + j
+        offsets = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+        return np.unique(self._rows[offsets + np.arange(total)])
+
+    def query(
+        self, row: int, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k neighbour rows of `row` (itself excluded).
+        """
+        query = self.vectors[row]
+        cand = self.candidates(query)
+        cand = cand[cand != row]
+        scores = self.vectors[cand] @ query
+        top = _top_k(scores, k)
+        return cand[top], scores[top]
+
+    def nbytes(self) -> int:
+        return self.planes.nbytes + self._starts.nbytes + self._rows.nbytes
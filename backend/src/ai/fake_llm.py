@@ -0,0 +1,73 @@
+"""
+Deterministic fake of the OpenAI chat completions endpoint.
+
+Answers re-ranking prompts (src.ai.rerank.build_prompt) with
+fake_rankings, so the whole re-ranking stage — client, batching, cache,
+budget — runs offline and under load tests without an API key. Latency
+and an error rate can be injected to exercise the fallback path.
+
+Запуск:
+
+    FAKE_LLM_LATENCY_MS=300 uvicorn src.ai.fake_llm:app --port 8090
+    RERANK_BACKEND=openai OPENAI_BASE_URL=http://localhost:8090/v1 ...
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from src.ai.rerank import fake_rankings
+
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+# share of requests answered with a 500, picked by prompt hash
+ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+app = FastAPI(title="fake-llm")
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatRequest(BaseModel):
+    model: str
+    messages: list[ChatMessage]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: ChatRequest):
+    prompt = body.messages[-1].content if body.messages else ""
+    digest = hashlib.sha1(prompt.encode()).hexdigest()
+    if ERROR_RATE and int(digest[:8], 16) / 0xFFFFFFFF < ERROR_RATE:
+        raise HTTPException(status_code=500, detail="injected failure")
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    try:
+        payload = json.loads(prompt)
+    except ValueError:
+        payload = {}
+    content = json.dumps(fake_rankings(payload if isinstance(payload, dict) else {}))
+    return {
+        "id": f"chatcmpl-{digest[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        },
+    }
@@ -0,0 +1,97 @@
+from typing import Iterable
+
+GENRE = "genre"
+KEYWORD = "keyword"
+
+# taste_vector JSON section for each feature kind
+_TASTE_SECTIONS = {GENRE: "genres", KEYWORD: "keywords"}
+
+# keyword overlap counts half as much as genre overlap in the ranker
+KEYWORD_RANK_WEIGHT = 0.5
+
+
+class FeatureVocabulary:
+    """
+    Two-way mapping between interned feature ids (`features` table) and
+    (kind, name) pairs.
+
+    Movies store `feature_ids int[]`; this is the encode/decode layer that
+    lets the ranker and taste code work on integers and only touch strings
+    at the JSON boundary (`Profile.taste_vector`).
+    """
+
+    __slots__ = ("_id_by_key", "_key_by_id")
+
+    def __init__(self, rows: Iterable[tuple[int, str, str]] = ()) -> None:
+        self._id_by_key: dict[tuple[str, str], int] = {}
+        self._key_by_id: dict[int, tuple[str, str]] = {}
+        for fid, kind, name in rows:
+            self._id_by_key[(kind, name)] = fid
+            self._key_by_id[fid] = (kind, name)
+
+    def __len__(self) -> int:
+        return len(self._key_by_id)
+
+    def kind_of(self, fid: int) -> str | None:
+        key = self._key_by_id.get(fid)
+        return key[0] if key else None
+
+    def encode(self, kind: str, names: Iterable[str] | None) -> list[int]:
+        """
+        Names → sorted feature ids; unknown names are dropped.
+        """
+        ids = {
+            self._id_by_key[(kind, n)]
+            for n in names or []
+            if (kind, n) in self._id_by_key
+        }
+        return sorted(ids)
+
+    def decode(self, ids: Iterable[int]) -> list[tuple[str, str]]:
+        return [self._key_by_id[i] for i in ids if i in self._key_by_id]
+
+    def encode_taste(self, taste_vector: dict | None) -> dict[int, float]:
+        """
+        `{"genres": {...}, "keywords": {...}}` → `{feature_id: weight}`.
+        """
+        weights: dict[int, float] = {}
+        for kind, section in _TASTE_SECTIONS.items():
+            for name, value in ((taste_vector or {}).get(section) or {}).items():
+                fid = self._id_by_key.get((kind, name))
+                if fid is not None:
+                    weights[fid] = float(value)
+        return weights
+
+    def decode_taste(self, weights: dict[int, float]) -> dict:
+        taste: dict[str, dict[str, float]] = {
+            section: {} for section in _TASTE_SECTIONS.values()
+        }
+        for fid, value in weights.items():
+            key = self._key_by_id.get(fid)
+            if key is not None:
+                kind, name = key
+                taste[_TASTE_SECTIONS[kind]][name] = value
+        return taste
+
+    def ranker_weights(self, taste_vector: dict | None) -> dict[int, float]:
+        """
+        Taste vector → per-feature ranking weight, with the keyword factor
+        of `rank_movies_for_user` already applied.
+        """
+        weights = self.encode_taste(taste_vector)
+        for fid in weights:
+            if self.kind_of(fid) == KEYWORD:
+                weights[fid] *= KEYWORD_RANK_WEIGHT
+        return weights
+
+
+def taste_names(taste_vector: dict | None) -> dict[str, list[str]]:
+    """
+    Feature names referenced by a taste vector, per kind (for loading only
+    the vocabulary slice a ranking call needs).
+    """
+    return {
+        kind: list(((taste_vector or {}).get(section) or {}).keys())
+        for kind, section in _TASTE_SECTIONS.items()
+    }
+
@@ -1,5 +1,14 @@
+import itertools
 from math import sqrt
-from typing import Iterable, List, Tuple
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .features import KEYWORD_RANK_WEIGHT
+from .taste import DenseTasteLayout
+
+# float32 (users × movies) score cells per catalog chunk
+_RANK_CHUNK_CELLS = 1 << 24
 
 
 def _cosine_similarity(a: dict[str, float], b: dict[str, float]) -> float:
@@ -38,13 +47,232 @@ def rank_movies_for_user(
         k_score = sum(kw_weights.get(k, 0.0) for k in keywords)
 
         base = (rating / 10.0) + (popularity / 100.0)
-        score = g_score + 0.5 * k_score + 0.1 * base
+        score = g_score + KEYWORD_RANK_WEIGHT * k_score + 0.1 * base
         scored.append((mid, float(score)))
 
     scored.sort(key=lambda x: x[1], reverse=True)
     return scored
 
 
+def _flatten_candidates(
+    candidates: Iterable[Tuple[str, Sequence[int] | None, float, float]],
+) -> Tuple[Sequence[str], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (movie_ids, owner, feature_ids, base) of ranker candidates: every
+    candidate's feature ids concatenated, `owner` giving each one's
+    candidate index, and the 0.1 * (rating / 10 + popularity / 100) term.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        empty = np.empty(0, dtype=np.int64)
+        return (), empty, empty, np.empty(0)
+    movie_ids, feature_lists, popularity, rating = zip(*candidates)
+    lengths = np.fromiter(
+        (0 if f is None else len(f) for f in feature_lists),
+        dtype=np.int64,
+        count=len(candidates),
+    )
+    owner = np.repeat(np.arange(len(candidates)), lengths)
+    present = [f for f in feature_lists if f is not None]
+    if present and all(isinstance(f, np.ndarray) for f in present):
+        # catalog store rows
+        fids = np.concatenate(present).astype(np.int64, copy=False)
+    else:
+        # per-list np.asarray costs more than the whole ranking
+        fids = np.fromiter(
+            itertools.chain.from_iterable(present),
+            dtype=np.int64,
+            count=len(owner),
+        )
+    base = 0.1 * (
+        np.asarray(rating, dtype=np.float64) / 10.0
+        + np.asarray(popularity, dtype=np.float64) / 100.0
+    )
+    return movie_ids, owner, fids, base
+
+
+def _ranked(
+    movie_ids: Sequence[str],
+    owner: np.ndarray,
+    feature_weights: np.ndarray,
+    base: np.ndarray,
+) -> List[Tuple[str, float]]:
+    scores = base + np.bincount(owner, weights=feature_weights, minlength=len(base))
+    # stable, like list.sort(reverse=True): ties keep candidate order
+    order = np.argsort(-scores, kind="stable")
+    return [(movie_ids[i], float(scores[i])) for i in order.tolist()]
+
+
+def rank_movies_encoded(
+    user_id: str,
+    feature_weights: dict[int, float],
+    candidates: Iterable[Tuple[str, Sequence[int], float, float]],
+) -> List[Tuple[str, float]]:
+    """
+    Тот же ранкер, что rank_movies_for_user, но на целочисленных признаках.
+
+    feature_weights — результат FeatureVocabulary.ranker_weights (вес
+    keyword уже домножен), кандидаты — кортежи
+    (movie_id, feature_ids, popularity, rating); feature_ids — список или
+    NumPy-массив (строки catalog store). Веса всех признаков кандидатов
+    берутся одной выборкой из таблицы, индексированной feature id.
+    """
+    movie_ids, owner, fids, base = _flatten_candidates(candidates)
+    if not len(base):
+        return []
+    if not len(fids):
+        return _ranked(movie_ids, owner, np.empty(0), base)
+    n = len(feature_weights)
+    keys = np.fromiter(feature_weights.keys(), dtype=np.int64, count=n)
+    values = np.fromiter(feature_weights.values(), dtype=np.float64, count=n)
+    # feature ids are serial: the table is at most the features table long
+    table = np.zeros(int(fids.max()) + 1)
+    inside = keys < len(table)
+    table[keys[inside]] = values[inside]
+    return _ranked(movie_ids, owner, table[fids], base)
+
+
+def rank_movies_dense(
+    user_id: str,
+    layout: DenseTasteLayout,
+    weights: np.ndarray,
+    candidates: Iterable[Tuple[str, Sequence[int], float, float]],
+) -> List[Tuple[str, float]]:
+    """
+    Ранкер по плотному float32 taste-вектору: weights — результат
+    layout.ranker_weights, кандидаты как в rank_movies_encoded.
+    Ключевые слова вне top-N попадают в хэш-бакеты (приближённо).
+
+    Признаки всех кандидатов переводятся в слоты одним layout.slot_array.
+    """
+    movie_ids, owner, fids, base = _flatten_candidates(candidates)
+    if not len(base):
+        return []
+    return _ranked(movie_ids, owner, weights[layout.slot_array(fids)], base)
+
+
+class RankingCatalog(NamedTuple):
+    """
+    Candidate movies in one dense layout's slot space, for
+    rank_movies_for_users. Kept longest-first: position p is catalog row
+    `rows[p]`, whose slots are `slots[starts[p]:starts[p] + lengths[p]]`
+    and popularity/rating term `base[p]`.
+    """
+
+    movie_ids: Sequence[str]
+    rows: np.ndarray
+    starts: np.ndarray
+    lengths: np.ndarray
+    slots: np.ndarray
+    base: np.ndarray
+
+
+def ranking_catalog(
+    layout: DenseTasteLayout,
+    movie_ids: Sequence[str],
+    indptr: np.ndarray,
+    feature_ids: np.ndarray,
+    popularity: np.ndarray,
+    rating: np.ndarray,
+) -> RankingCatalog:
+    """
+    RankingCatalog from movies' feature ids in CSR form.
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    lengths = np.diff(indptr)
+    rows = np.argsort(-lengths, kind="stable")
+    base = 0.1 * (
+        np.asarray(rating, dtype=np.float32) / 10.0
+        + np.asarray(popularity, dtype=np.float32) / 100.0
+    )
+    return RankingCatalog(
+        list(movie_ids),
+        rows,
+        indptr[:-1][rows],
+        lengths[rows],
+        layout.slot_array(feature_ids),
+        base[rows].astype(np.float32),
+    )
+
+
+def rank_movies_for_users(
+    taste_matrix: np.ndarray,
+    catalog: RankingCatalog,
+    k: int = 200,
+    exclude: Tuple[np.ndarray, np.ndarray] | None = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    rank_movies_dense for a block of users at once.
+
+    taste_matrix — (users, dim) rows of layout.ranker_weights; exclude —
+    parallel (user index, catalog row) arrays of pairs not to recommend.
+    The scores are the (users × slots) taste matrix times the sparse
+    (slots × movies) catalog. They are computed in catalog chunks as one
+    column gather-add per slot position (movies are sorted longest-first,
+    so the movies with a j-th slot are a prefix) and merged into a
+    running per-user top-k.
+
+    Returns (catalog rows, scores), both (users, k), best first; slots
+    past the user's last candidate hold row -1 and score -inf.
+    """
+    weights = np.asarray(taste_matrix, dtype=np.float32)
+    n_users, n_movies = len(weights), len(catalog.rows)
+    k = min(k, n_movies)
+    best_pos = np.full((n_users, k), -1, dtype=np.int64)
+    best = np.full((n_users, k), -np.inf, dtype=np.float32)
+    if not n_users or not k:
+        return best_pos, best
+
+    if exclude is not None:
+        position = np.empty(n_movies, dtype=np.int64)
+        position[catalog.rows] = np.arange(n_movies)
+        ex_users = np.asarray(exclude[0], dtype=np.int64)
+        ex_pos = position[np.asarray(exclude[1], dtype=np.int64)]
+        order = np.argsort(ex_pos, kind="stable")
+        ex_users, ex_pos = ex_users[order], ex_pos[order]
+
+    chunk = max(k, _RANK_CHUNK_CELLS // n_users)
+    for lo in range(0, n_movies, chunk):
+        hi = min(lo + chunk, n_movies)
+        scores = np.empty((n_users, hi - lo), dtype=np.float32)
+        scores[:] = catalog.base[lo:hi]
+        lengths = catalog.lengths[lo:hi]
+        starts = catalog.starts[lo:hi]
+        # movies with more than j slots, for every j
+        active = np.searchsorted(-lengths, -np.arange(lengths[0]), side="left")
+        for j, count in enumerate(active.tolist()):
+            scores[:, :count] += np.take(
+                weights, catalog.slots[starts[:count] + j], axis=1
+            )
+        if exclude is not None:
+            i, e = np.searchsorted(ex_pos, [lo, hi])
+            scores[ex_users[i:e], ex_pos[i:e] - lo] = -np.inf
+
+        merged = np.concatenate([best, scores], axis=1)
+        merged_pos = np.concatenate(
+            [best_pos, np.broadcast_to(np.arange(lo, hi), scores.shape)], axis=1
+        )
+        top = np.argpartition(-merged, k - 1, axis=1)[:, :k]
+        best = np.take_along_axis(merged, top, axis=1)
+        best_pos = np.take_along_axis(merged_pos, top, axis=1)
+
+    order = np.argsort(-best, axis=1, kind="stable")
+    best = np.take_along_axis(best, order, axis=1)
+    best_pos = np.take_along_axis(best_pos, order, axis=1)
+    rows = np.where(
+        np.isfinite(best), catalog.rows[np.maximum(best_pos, 0)], -1
+    )
+    return rows, best
+
+
+def _dense_cosine(a: np.ndarray, b: np.ndarray) -> float:
+    na = float(np.linalg.norm(a))
+    nb = float(np.linalg.norm(b))
+    if na == 0 or nb == 0:
+        return 0.0
+    return float(np.dot(a, b) / (na * nb))
+
+
 def rank_friend_match_for_users(
     user_a_id: str,
     user_b_id: str,
@@ -54,19 +282,28 @@ def rank_friend_match_for_users(
     Локальный (бесплатный) ранкер похожести друзей.
 
     Использует:
-    - косинусное сходство по жанрам и keyword-векторам,
+    - косинусное сходство по жанрам и keyword-векторам
+      (плотные dense_a/dense_b, если есть, иначе JSON taste_a/taste_b),
     - количество общих любимых фильмов.
     """
-    taste_a = payload.get("taste_a") or {}
-    taste_b = payload.get("taste_b") or {}
+    dense_a = payload.get("dense_a")
+    dense_b = payload.get("dense_b")
+    if dense_a is not None and dense_b is not None:
+        # плотные векторы одной версии layout: жанры — первые genre_dims слотов
+        g = int(payload["genre_dims"])
+        sim_genres = _dense_cosine(dense_a[:g], dense_b[:g])
+        sim_kw = _dense_cosine(dense_a[g:], dense_b[g:])
+    else:
+        taste_a = payload.get("taste_a") or {}
+        taste_b = payload.get("taste_b") or {}
 
-    genres_a: dict[str, float] = taste_a.get("genres", {}) or {}
-    genres_b: dict[str, float] = taste_b.get("genres", {}) or {}
-    kw_a: dict[str, float] = taste_a.get("keywords", {}) or {}
-    kw_b: dict[str, float] = taste_b.get("keywords", {}) or {}
+        genres_a: dict[str, float] = taste_a.get("genres", {}) or {}
+        genres_b: dict[str, float] = taste_b.get("genres", {}) or {}
+        kw_a: dict[str, float] = taste_a.get("keywords", {}) or {}
+        kw_b: dict[str, float] = taste_b.get("keywords", {}) or {}
 
-    sim_genres = _cosine_similarity(genres_a, genres_b)
-    sim_kw = _cosine_similarity(kw_a, kw_b)
+        sim_genres = _cosine_similarity(genres_a, genres_b)
+        sim_kw = _cosine_similarity(kw_a, kw_b)
 
     common_favs = float(payload.get("common_favorites_count", 0) or 0)
 
@@ -0,0 +1,412 @@
+"""
+Optional LLM re-ranking of the local ranker's head.
+
+Only the top-N of the local order is sent to the LLM, together with a
+short taste summary, and only the LLM's order of those N is used; the
+rest of the ranking is untouched. `Reranker` batches requests across
+users (one backend call per `batch_size` users), caches orders in Redis
+by a hash of the user's taste bucket and the candidate set, runs at most
+`concurrency` backend calls at a time and gives the whole stage a latency
+budget: requests whose call fails or misses the budget keep the local
+order.
+
+Backends:
+
+    OpenAIRerankBackend   chat completions in JSON mode; with
+                          base_url pointed at src.ai.fake_llm it runs
+                          offline against the deterministic fake server
+    FakeRerankBackend     the same deterministic ranking in-process
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Mapping, NamedTuple, Protocol, Sequence
+
+from redis import asyncio as redis_async
+
+logger = logging.getLogger(__name__)
+
+RERANK_PREFIX = "rerank:"
+
+SYSTEM_PROMPT = (
+    "You re-rank movie recommendations. For every request you get the "
+    "user's favourite genres and keywords and candidate movies in the "
+    "order a similarity ranker chose. Reorder each request's candidates, "
+    "best match for the user first, using everything you know about the "
+    "movies. Reply with JSON only: "
+    '{"rankings": {"<request id>": ["<candidate id>", ...], ...}} '
+    "listing every candidate id of every request exactly once."
+)
+
+
+class RerankCandidate(NamedTuple):
+    movie_id: str
+    title: str
+    year: int | None
+    genres: Sequence[str]
+
+
+class RerankRequest(NamedTuple):
+    user_id: str
+    # {"genres": [...], "keywords": [...]}, strongest first
+    taste: Mapping[str, Sequence[str]]
+    # local order, best first
+    candidates: Sequence[RerankCandidate]
+
+
+class RerankBackend(Protocol):
+    async def rerank(
+        self, requests: Sequence[RerankRequest]
+    ) -> list[list[str] | None]:
+        """
+        Movie ids of each request's candidates in the new order, or None
+        for a request the backend gave no usable answer for.
+        """
+        ...
+
+    async def aclose(self) -> None: ...
+
+
+def taste_bucket(
+    taste_vector: dict | None, genres: int = 3, keywords: int = 5
+) -> dict[str, list[str]]:
+    """
+    Strongest positive genres and keywords of a taste vector: what the
+    prompt shows the LLM and, as a set, what the cache key buckets on.
+    """
+    bucket = {}
+    for section, n in (("genres", genres), ("keywords", keywords)):
+        weights = (taste_vector or {}).get(section) or {}
+        top = sorted(
+            ((w, name) for name, w in weights.items() if w > 0), reverse=True
+        )
+        bucket[section] = [name for _, name in top[:n]]
+    return bucket
+
+
+def rerank_key(request: RerankRequest) -> str:
+    # weight drift that keeps the same top genres/keywords reuses the order
+    payload = json.dumps(
+        [
+            sorted(request.taste.get("genres", ())),
+            sorted(request.taste.get("keywords", ())),
+            sorted(c.movie_id for c in request.candidates),
+        ]
+    )
+    return RERANK_PREFIX + hashlib.sha1(payload.encode()).hexdigest()
+
+
+def build_prompt(requests: Sequence[RerankRequest]) -> str:
+    # short positional ids keep the prompt small and the answer checkable
+    return json.dumps(
+        {
+            "requests": [
+                {
+                    "id": str(i),
+                    "taste": {k: list(v) for k, v in r.taste.items()},
+                    "candidates": [
+                        {
+                            "id": f"c{j}",
+                            "title": c.title,
+                            "year": c.year,
+                            "genres": list(c.genres),
+                        }
+                        for j, c in enumerate(r.candidates)
+                    ],
+                }
+                for i, r in enumerate(requests)
+            ]
+        },
+        ensure_ascii=False,
+    )
+
+
+def complete_order(order: Sequence[str], request: RerankRequest) -> list[str]:
+    """
+    `order` as a permutation of the request's candidate movie ids:
+    unknown and repeated ids dropped, missing ones appended in local order.
+    """
+    known = {c.movie_id for c in request.candidates}
+    out: list[str] = []
+    seen: set[str] = set()
+    for mid in order:
+        if mid in known and mid not in seen:
+            out.append(mid)
+            seen.add(mid)
+    out += [c.movie_id for c in request.candidates if c.movie_id not in seen]
+    return out
+
+
+def parse_rankings(
+    content: str, requests: Sequence[RerankRequest]
+) -> list[list[str] | None]:
+    """
+    Map a `{"rankings": {...}}` answer for build_prompt(requests) back to
+    movie ids; None for requests missing from the answer.
+    """
+    try:
+        rankings = json.loads(content).get("rankings")
+    except (ValueError, AttributeError):
+        rankings = None
+    if not isinstance(rankings, dict):
+        return [None] * len(requests)
+    out: list[list[str] | None] = []
+    for i, request in enumerate(requests):
+        order = rankings.get(str(i))
+        if not isinstance(order, list):
+            out.append(None)
+            continue
+        by_cid = {f"c{j}": c.movie_id for j, c in enumerate(request.candidates)}
+        out.append(
+            complete_order(
+                [by_cid[c] for c in order if isinstance(c, str) and c in by_cid],
+                request,
+            )
+        )
+    return out
+
+
+def fake_rankings(payload: dict) -> dict:
+    """
+    Deterministic stand-in for the LLM's answer to a build_prompt payload:
+    candidates sharing more genres with the taste first, ties broken by a
+    hash of the title and taste, so equal inputs always give equal orders.
+    """
+    rankings = {}
+    for request in payload.get("requests", []):
+        taste = request.get("taste") or {}
+        liked = set(taste.get("genres") or ())
+        salt = "|".join(sorted(liked))
+
+        def key(c):
+            overlap = len(liked & set(c.get("genres") or ()))
+            tiebreak = hashlib.sha1(f"{c.get('title')}|{salt}".encode()).hexdigest()
+            return (-overlap, tiebreak)
+
+        rankings[request["id"]] = [
+            c["id"] for c in sorted(request.get("candidates") or [], key=key)
+        ]
+    return {"rankings": rankings}
+
+
+class FakeRerankBackend:
+    """
+    In-process fake_rankings with an optional artificial latency.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def rerank(self, requests):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        answer = fake_rankings(json.loads(build_prompt(requests)))
+        return parse_rankings(json.dumps(answer), requests)
+
+    async def aclose(self) -> None:
+        return None
+
+
+class OpenAIRerankBackend:
+    """
+    Chat completions in JSON mode. The client is bound to the running
+    event loop: create one per asyncio.run and aclose() it.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None,
+        model: str,
+        *,
+        base_url: str | None = None,
+        timeout: float = 30.0,
+    ):
+        from openai import AsyncOpenAI
+
+        self.model = model
+        # retries would only eat the latency budget; failures fall back
+        self._client = AsyncOpenAI(
+            api_key=api_key or "unused",
+            base_url=base_url or None,
+            timeout=timeout,
+            max_retries=0,
+        )
+
+    async def rerank(self, requests):
+        response = await self._client.chat.completions.create(
+            model=self.model,
+            temperature=0,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": build_prompt(requests)},
+            ],
+        )
+        return parse_rankings(response.choices[0].message.content or "", requests)
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+
+def apply_order(
+    rankings: Sequence[tuple[str, float]], order: Sequence[str]
+) -> list[tuple[str, float]]:
+    """
+    `rankings` with the movies in `order` moved into `order`'s sequence
+    inside the positions they already hold. Their scores are reassigned
+    in descending order, so scores still decrease down the list.
+    """
+    moved = set(order)
+    slots = [i for i, (mid, _) in enumerate(rankings) if mid in moved]
+    scores = sorted((rankings[i][1] for i in slots), reverse=True)
+    out = list(rankings)
+    for i, mid, score in zip(slots, [m for m in order if m in moved], scores):
+        out[i] = (mid, score)
+    return out
+
+
+class Reranker:
+    """
+    Batching, caching and the latency budget around a RerankBackend.
+    `stats` counts requests, cache hits, backend calls, failures, requests
+    reranked by the backend and requests that fell back to the local order.
+    """
+
+    def __init__(
+        self,
+        backend: RerankBackend,
+        *,
+        redis_client: redis_async.Redis | None = None,
+        batch_size: int = 8,
+        concurrency: int = 4,
+        budget: float = 2.0,
+        cache_ttl: int = 86400,
+    ):
+        self.backend = backend
+        self.redis = redis_client
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.budget = budget
+        self.cache_ttl = cache_ttl
+        self.stats: Counter = Counter()
+
+    async def _cache_get(self, keys: list[str]) -> list[list[str] | None]:
+        if self.redis is None or not keys:
+            return [None] * len(keys)
+        try:
+            values = await self.redis.mget(keys)
+        except Exception:
+            # the cache is an optimisation; never fail the stage on it
+            logger.warning("rerank cache read failed", exc_info=True)
+            return [None] * len(keys)
+        return [json.loads(v) if v is not None else None for v in values]
+
+    async def _cache_set(self, orders: dict[str, list[str]]) -> None:
+        if self.redis is None or not orders:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, order in orders.items():
+                    pipe.set(key, json.dumps(order), ex=self.cache_ttl)
+                await pipe.execute()
+        except Exception:
+            logger.warning("rerank cache write failed", exc_info=True)
+
+    async def rerank(self, requests: Sequence[RerankRequest]) -> list[list[str]]:
+        """
+        Final order of every request's candidates: the LLM's when it came
+        back (now or from cache) within the budget, the local one otherwise.
+        """
+        results = [[c.movie_id for c in r.candidates] for r in requests]
+        self.stats["requests"] += len(requests)
+        keys = [rerank_key(r) for r in requests]
+        # cache key -> requests it answers; equal requests share one slot
+        pending: dict[str, list[int]] = {}
+        for i, hit in enumerate(await self._cache_get(keys)):
+            if hit is not None:
+                results[i] = complete_order(hit, requests[i])
+                self.stats["cache_hits"] += 1
+            elif len(requests[i].candidates) > 1:
+                pending.setdefault(keys[i], []).append(i)
+
+        fresh: dict[str, list[str]] = {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch: list[str]) -> None:
+            async with semaphore:
+                self.stats["backend_calls"] += 1
+                try:
+                    orders = await self.backend.rerank(
+                        [requests[pending[key][0]] for key in batch]
+                    )
+                except Exception:
+                    self.stats["backend_errors"] += 1
+                    logger.warning("rerank backend call failed", exc_info=True)
+                    return
+            for key, order in zip(batch, orders):
+                if order:
+                    fresh[key] = order
+                    for i in pending[key]:
+                        results[i] = order
+
+        slots = list(pending)
+        tasks = [
+            asyncio.create_task(run(slots[s:s + self.batch_size]))
+            for s in range(0, len(slots), self.batch_size)
+        ]
+        if tasks:
+            _, late = await asyncio.wait(tasks, timeout=self.budget)
+            for task in late:
+                task.cancel()
+            await asyncio.gather(*late, return_exceptions=True)
+            self.stats["timeouts"] += len(late)
+        self.stats["reranked"] += sum(len(pending[key]) for key in fresh)
+        self.stats["fallbacks"] += sum(
+            len(ids) for key, ids in pending.items() if key not in fresh
+        )
+
+        await self._cache_set(fresh)
+        return results
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+
+def make_reranker(
+    backend: str,
+    *,
+    redis_client: redis_async.Redis | None = None,
+    api_key: str | None = None,
+    model: str = "gpt-4o-mini",
+    base_url: str | None = None,
+    fake_latency: float = 0.0,
+    batch_size: int = 8,
+    concurrency: int = 4,
+    budget: float = 2.0,
+    cache_ttl: int = 86400,
+) -> Reranker | None:
+    """
+    Reranker for `backend` ("openai" or "fake"); None when re-ranking is
+    off (empty name).
+    """
+    if not backend:
+        return None
+    if backend == "openai":
+        impl: RerankBackend = OpenAIRerankBackend(
+            api_key, model, base_url=base_url, timeout=budget
+        )
+    elif backend == "fake":
+        impl = FakeRerankBackend(fake_latency)
+    else:
+        raise ValueError(f"unknown rerank backend: {backend!r}")
+    return Reranker(
+        impl,
+        redis_client=redis_client,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        budget=budget,
+        cache_ttl=cache_ttl,
+    )
@@ -0,0 +1,204 @@
+from typing import Iterable, Mapping, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from .features import GENRE, KEYWORD_RANK_WEIGHT, FeatureVocabulary
+
+# (genre weight, keyword weight) per interaction, see recalc_taste_vector
+FAVORITE_WEIGHTS = (3.0, 2.0)
+DISLIKE_WEIGHTS = (-2.0, -1.5)
+STATUS_WEIGHTS = {
+    "completed": (2.0, 0.0),
+    "watching": (1.0, 0.0),
+}
+LIKE_SWIPE_WEIGHTS = (1.5, 1.0)
+
+# signed strength of one interaction for collaborative models: the genre
+# component of the weights above, so both models agree on what counts
+INTERACTION_STRENGTH = {
+    "favorite": FAVORITE_WEIGHTS[0],
+    "dislike": DISLIKE_WEIGHTS[0],
+    "like": LIKE_SWIPE_WEIGHTS[0],
+    **{status: weights[0] for status, weights in STATUS_WEIGHTS.items()},
+}
+
+
+def interaction_weights(
+    movie_id: UUID,
+    fav_ids: set,
+    dis_ids: set,
+    status_map: Mapping,
+    swipe_map: Mapping,
+) -> Tuple[float, float]:
+    """
+    Summed (genre, keyword) weight of every interaction a user had with
+    one movie.
+    """
+    genre_w = keyword_w = 0.0
+    parts = []
+    if movie_id in fav_ids:
+        parts.append(FAVORITE_WEIGHTS)
+    if movie_id in dis_ids:
+        parts.append(DISLIKE_WEIGHTS)
+    if movie_id in status_map:
+        parts.append(STATUS_WEIGHTS.get(status_map[movie_id], (0.0, 0.0)))
+    if swipe_map.get(movie_id) == "like":
+        parts.append(LIKE_SWIPE_WEIGHTS)
+    for g, k in parts:
+        genre_w += g
+        keyword_w += k
+    return genre_w, keyword_w
+
+
+def interaction_strength(
+    movie_id: UUID,
+    fav_ids: set,
+    dis_ids: set,
+    status_map: Mapping,
+    swipe_map: Mapping,
+) -> float:
+    """
+    Summed INTERACTION_STRENGTH of a user's interactions with one movie.
+    """
+    return interaction_weights(movie_id, fav_ids, dis_ids, status_map, swipe_map)[0]
+
+
+def accumulate_taste_scores(
+    movies: Iterable[Tuple[UUID, Sequence[int] | None]],
+    vocab: FeatureVocabulary,
+    fav_ids: set,
+    dis_ids: set,
+    status_map: Mapping,
+    swipe_map: Mapping,
+) -> dict[int, float]:
+    """
+    Integer-keyed taste accumulation: `{feature_id: weight}` over the
+    movies a user interacted with, given as (movie_id, feature_ids).
+    """
+    scores: dict[int, float] = {}
+    for movie_id, feature_ids in movies:
+        genre_w, keyword_w = interaction_weights(
+            movie_id, fav_ids, dis_ids, status_map, swipe_map
+        )
+        if not genre_w and not keyword_w:
+            continue
+        for fid in feature_ids or ():
+            kind = vocab.kind_of(fid)
+            if kind is None:
+                continue
+            weight = genre_w if kind == GENRE else keyword_w
+            if weight:
+                scores[fid] = scores.get(fid, 0.0) + weight
+    return scores
+
+
+def _bucket(fid: int, n_buckets: int) -> int:
+    # multiplicative hash: stable across processes, unlike hash() on str
+    return ((fid * 2654435761) & 0xFFFFFFFF) % n_buckets
+
+
+class DenseTasteLayout:
+    """
+    Fixed-dimension float32 layout of a taste vector (one `taste_vocabularies`
+    version).
+
+    Slots: every genre, then the top-N keywords by document frequency, then
+    `n_buckets` hashed overflow buckets shared by all other keywords.
+    Vectors are stored as little-endian float32 bytes and loaded zero-copy.
+    """
+
+    __slots__ = (
+        "version",
+        "feature_ids",
+        "genre_names",
+        "n_genres",
+        "n_buckets",
+        "dim",
+        "_slot_by_fid",
+        "_slot_table",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        feature_ids: Sequence[int],
+        genre_names: Sequence[str],
+        n_buckets: int,
+    ) -> None:
+        self.version = version
+        self.feature_ids = np.asarray(feature_ids, dtype=np.int32)
+        self.genre_names = list(genre_names)
+        self.n_genres = len(self.genre_names)
+        self.n_buckets = n_buckets
+        self.dim = len(self.feature_ids) + n_buckets
+        self._slot_by_fid = {int(f): i for i, f in enumerate(self.feature_ids)}
+        # feature id → slot up to the largest id in the layout, -1 = hashed
+        # (ids are serial, so this is at most the features table long)
+        self._slot_table = np.full(
+            int(self.feature_ids.max()) + 1 if len(self.feature_ids) else 0,
+            -1,
+            dtype=np.intp,
+        )
+        self._slot_table[self.feature_ids] = np.arange(len(self.feature_ids))
+
+    def slot(self, fid: int) -> int:
+        slot = self._slot_by_fid.get(fid)
+        if slot is None:
+            slot = len(self.feature_ids) + _bucket(fid, self.n_buckets)
+        return slot
+
+    def slots(self, feature_ids: Sequence[int] | None) -> np.ndarray:
+        # catalog store rows are arrays: no truthiness test
+        if feature_ids is None:
+            feature_ids = ()
+        return np.fromiter(
+            (self.slot(int(f)) for f in feature_ids), dtype=np.intp
+        )
+
+    def slot_array(self, feature_ids: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `slot` over an array of feature ids.
+        """
+        fids = np.asarray(feature_ids, dtype=np.int64)
+        table = self._slot_table
+        slots = np.full(len(fids), -1, dtype=np.intp)
+        inside = fids < len(table)
+        slots[inside] = table[fids[inside]]
+        hashed = slots < 0
+        slots[hashed] = len(self.feature_ids) + (
+            ((fids[hashed] * 2654435761) & 0xFFFFFFFF) % self.n_buckets
+        )
+        return slots
+
+    def encode(self, scores: Mapping[int, float]) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for fid, value in scores.items():
+            vec[self.slot(fid)] += value
+        return vec
+
+    @staticmethod
+    def to_bytes(vec: np.ndarray) -> bytes:
+        return vec.astype("<f4", copy=False).tobytes()
+
+    def load(self, buf: bytes | None) -> np.ndarray | None:
+        """
+        Zero-copy, read-only view over a stored vector (None on mismatch).
+        """
+        if not buf or len(buf) != self.dim * 4:
+            return None
+        return np.frombuffer(buf, dtype="<f4")
+
+    def ranker_weights(self, vec: np.ndarray) -> np.ndarray:
+        """
+        Per-slot ranking weight, keyword slots scaled like
+        `rank_movies_for_user` does. Also takes a (users, dim) matrix.
+        """
+        weights = vec.astype(np.float32)  # copy: stored views are read-only
+        weights[..., self.n_genres:] *= KEYWORD_RANK_WEIGHT
+        return weights
+
+    def top_genres(self, vec: np.ndarray, n: int = 3) -> list[str]:
+        genre_part = vec[: self.n_genres]
+        order = np.argsort(-genre_part, kind="stable")[:n]
+        return [self.genre_names[i] for i in order if genre_part[i] != 0]
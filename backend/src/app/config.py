@@ -12,6 +12,36 @@ class Settings(BaseModel):
     postgres_host: str = os.getenv("POSTGRES_HOST", "localhost")
     postgres_port: int = int(os.getenv("POSTGRES_PORT", "5432"))
 
+    # DB connection pool (per process; max_overflow -1 = unlimited,
+    # recycle -1 = never) and asyncpg statement caches
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout_seconds: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+    db_pool_recycle_seconds: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+    # connections opened at API startup (capped at db_pool_size)
+    db_pool_prewarm: int = int(os.getenv("DB_POOL_PREWARM", "5"))
+    db_connect_timeout_seconds: float = float(
+        os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "10")
+    )
+    # asyncpg's per-connection LRU of prepared statements
+    db_statement_cache_size: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+    # transaction-pooling pgbouncer in front: no statement caches, unique
+    # prepared statement names
+    db_pgbouncer: bool = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+    # Streaming replica for read-only endpoints ("" = reads use the primary)
+    postgres_replica_host: str = os.getenv("POSTGRES_REPLICA_HOST", "")
+    postgres_replica_port: int = int(
+        os.getenv("POSTGRES_REPLICA_PORT", os.getenv("POSTGRES_PORT", "5432"))
+    )
+    # after a write, that user's reads stay on the primary this long
+    read_your_writes_seconds: int = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+    # replay lag beyond which (or replica down) reads use the primary
+    replica_max_lag_seconds: float = float(
+        os.getenv("REPLICA_MAX_LAG_SECONDS", "10")
+    )
+
     # Redis
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
@@ -23,12 +53,165 @@ class Settings(BaseModel):
     # External APIs
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    # OpenAI-compatible endpoint; empty = api.openai.com
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
     tmdb_api_key: str | None = os.getenv("TMDB_API_KEY", "eyJdocker compose up -d rabbitmqhbGciOiJIUzI1NiJ9.eyJhdWQiOiJjNzI3NzQ3NDE5YzVjMjE2YjdkNWYzMTNkMWIzM2I1YSIsIm5iZiI6MTc2NDg0NTg4NC42NzEsInN1YiI6IjY5MzE2OTNjZWJkZThjMjA0YTMzNzBlYSIsInNjb3BlcyI6WyJhcGlfcmVhZCJdLCJ2ZXJzaW9uIjoxfQ.RvE43TjzWi4ioWVnAFXdFAAaWPZ9q-jv5j5Y0I20BMc")
 
     # Misc
     app_name: str = os.getenv("APP_NAME", "MovieTinder API")
     environment: str = os.getenv("ENVIRONMENT", "development")
 
+    # `movies.updated_at` change feed (autocomplete, catalog store): the
+    # timestamp is taken at flush, not commit, so polls re-read this far
+    # behind the watermark to catch transactions that committed late
+    change_feed_lag_seconds: float = float(
+        os.getenv("CHANGE_FEED_LAG_SECONDS", "60")
+    )
+
+    # Autocomplete (in-process title index)
+    autocomplete_refresh_seconds: float = float(
+        os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", "30")
+    )
+    # full rebuild: drops movies deleted through other API processes
+    autocomplete_full_reload_seconds: float = float(
+        os.getenv("AUTOCOMPLETE_FULL_RELOAD_SECONDS", "600")
+    )
+
+    # Catalog facets (celery beat schedule)
+    catalog_facets_refresh_seconds: float = float(
+        os.getenv("CATALOG_FACETS_REFRESH_SECONDS", "600")
+    )
+
+    # Dense taste vectors (layout of new taste_vocabularies versions)
+    taste_top_keywords: int = int(os.getenv("TASTE_TOP_KEYWORDS", "1024"))
+    taste_hash_buckets: int = int(os.getenv("TASTE_HASH_BUCKETS", "256"))
+    # beat re-freezes the layout when the genres or top keywords changed
+    taste_vocab_rebuild_seconds: float = float(
+        os.getenv("TASTE_VOCAB_REBUILD_SECONDS", "86400")
+    )
+
+    # Worker-resident catalog store (delta poll / full reload intervals)
+    catalog_store_refresh_seconds: float = float(
+        os.getenv("CATALOG_STORE_REFRESH_SECONDS", "10")
+    )
+    catalog_store_full_reload_seconds: float = float(
+        os.getenv("CATALOG_STORE_FULL_RELOAD_SECONDS", "3600")
+    )
+
+    # Shared memory-mapped catalog snapshot (empty dir = disabled)
+    catalog_snapshot_dir: str = os.getenv("CATALOG_SNAPSHOT_DIR", "")
+    catalog_snapshot_build_seconds: float = float(
+        os.getenv("CATALOG_SNAPSHOT_BUILD_SECONDS", "300")
+    )
+    # an older snapshot (builds failing) is ignored: workers fall back to
+    # their own delta-refreshed store until a fresh one is published
+    catalog_snapshot_max_age_seconds: float = float(
+        os.getenv("CATALOG_SNAPSHOT_MAX_AGE_SECONDS", "600")
+    )
+
+    # Similar movies (content embeddings build / API index refresh)
+    similar_embedding_dim: int = int(os.getenv("SIMILAR_EMBEDDING_DIM", "64"))
+    similar_precompute_top: int = int(
+        os.getenv("SIMILAR_PRECOMPUTE_TOP", "5000")
+    )
+    similar_top_k: int = int(os.getenv("SIMILAR_TOP_K", "50"))
+    similar_build_seconds: float = float(
+        os.getenv("SIMILAR_BUILD_SECONDS", "86400")
+    )
+    similar_refresh_seconds: float = float(
+        os.getenv("SIMILAR_REFRESH_SECONDS", "300")
+    )
+
+    # Item-to-item co-occurrence ("also liked")
+    cooc_method: str = os.getenv("COOC_METHOD", "cosine")  # cosine | lift
+    cooc_top_k: int = int(os.getenv("COOC_TOP_K", "50"))
+    cooc_blend_weight: float = float(os.getenv("COOC_BLEND_WEIGHT", "0.3"))
+    cooc_max_seeds: int = int(os.getenv("COOC_MAX_SEEDS", "50"))
+    cooc_candidates: int = int(os.getenv("COOC_CANDIDATES", "100"))
+    cooc_materialize_seconds: float = float(
+        os.getenv("COOC_MATERIALIZE_SECONDS", "60")
+    )
+    cooc_rebuild_seconds: float = float(
+        os.getenv("COOC_REBUILD_SECONDS", "86400")
+    )
+
+    # Matrix factorization (implicit ALS)
+    mf_factors: int = int(os.getenv("MF_FACTORS", "64"))
+    mf_reg: float = float(os.getenv("MF_REG", "0.1"))
+    mf_alpha: float = float(os.getenv("MF_ALPHA", "10"))
+    mf_iterations: int = int(os.getenv("MF_ITERATIONS", "15"))
+    mf_cg_steps: int = int(os.getenv("MF_CG_STEPS", "3"))
+    mf_blend_weight: float = float(os.getenv("MF_BLEND_WEIGHT", "0.3"))
+    mf_train_seconds: float = float(os.getenv("MF_TRAIN_SECONDS", "86400"))
+
+    # Recommendation serving (Redis ZSET + movie cards)
+    recs_cache_ttl_seconds: int = int(
+        os.getenv("RECS_CACHE_TTL_SECONDS", str(7 * 24 * 3600))
+    )
+    movie_card_ttl_seconds: int = int(
+        os.getenv("MOVIE_CARD_TTL_SECONDS", str(24 * 3600))
+    )
+    recs_prune_seconds: float = float(os.getenv("RECS_PRUNE_SECONDS", "3600"))
+
+    # Nightly batch regeneration of stale recommendations
+    batch_rank_seconds: float = float(os.getenv("BATCH_RANK_SECONDS", "86400"))
+    batch_rank_shards: int = int(os.getenv("BATCH_RANK_SHARDS", "8"))
+    batch_rank_chunk: int = int(os.getenv("BATCH_RANK_CHUNK", "1024"))
+    batch_rank_pool: int = int(os.getenv("BATCH_RANK_POOL", "20000"))
+    batch_rank_top_k: int = int(os.getenv("BATCH_RANK_TOP_K", "200"))
+    batch_rank_min_age_seconds: float = float(
+        os.getenv("BATCH_RANK_MIN_AGE_SECONDS", str(20 * 3600))
+    )
+
+    # LLM re-ranking of the recommendation head ("" = off, "openai", "fake")
+    rerank_backend: str = os.getenv("RERANK_BACKEND", "")
+    rerank_top_n: int = int(os.getenv("RERANK_TOP_N", "20"))
+    rerank_batch_size: int = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+    rerank_concurrency: int = int(os.getenv("RERANK_CONCURRENCY", "4"))
+    rerank_timeout_seconds: float = float(
+        os.getenv("RERANK_TIMEOUT_SECONDS", "2.0")
+    )
+    rerank_cache_ttl_seconds: int = int(
+        os.getenv("RERANK_CACHE_TTL_SECONDS", str(24 * 3600))
+    )
+    rerank_fake_latency_ms: float = float(
+        os.getenv("RERANK_FAKE_LATENCY_MS", "0")
+    )
+
+    # Prometheus (worker metrics HTTP port, 0 = off; the API serves /metrics)
+    celery_metrics_port: int = int(os.getenv("CELERY_METRICS_PORT", "9808"))
+
+    # Per-request query counting (same statement shape N times = N+1 warning)
+    nplus1_threshold: int = int(os.getenv("NPLUS1_THRESHOLD", "5"))
+
+    # Stage tracing ("" = off, "memory", "file", "otlp")
+    tracing_exporter: str = os.getenv("TRACING_EXPORTER", "")
+    tracing_file: str = os.getenv("TRACING_FILE", "traces.jsonl")
+    tracing_otlp_endpoint: str = os.getenv(
+        "TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+    )
+    tracing_service_name: str = os.getenv("TRACING_SERVICE_NAME", "movie-tinder")
+    # share of new traces that are recorded (propagated ones follow the caller)
+    tracing_sample_rate: float = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+
+    # On-demand cProfile captures (empty token = no X-Profile-Token captures
+    # and no /debug/profiles; sample rates 0 = off)
+    profiling_admin_token: str = os.getenv("PROFILING_ADMIN_TOKEN", "")
+    profiling_dir: str = os.getenv("PROFILING_DIR", "/tmp/profiles")
+    profiling_max_captures: int = int(os.getenv("PROFILING_MAX_CAPTURES", "200"))
+    profiling_sample_rate: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    profiling_task_sample_rate: float = float(
+        os.getenv("PROFILING_TASK_SAMPLE_RATE", "0")
+    )
+
+    # Readiness checks (background interval; each check's time budget)
+    health_check_interval_seconds: float = float(
+        os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "5")
+    )
+    health_check_timeout_seconds: float = float(
+        os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "2")
+    )
+
     # Auth / JWT
     jwt_secret: str = os.getenv("JWT_SECRET", "CHANGE_ME_SECRET")
     jwt_algorithm: str = os.getenv("JWT_ALGORITHM", "HS256")
@@ -47,6 +230,18 @@ class Settings(BaseModel):
             f"@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         )
 
+    @property
+    def database_url_replica_async(self) -> str:
+        """
+        Async SQLAlchemy URL of the read replica (same credentials/db).
+        """
+        return (
+            "postgresql+asyncpg://"
+            f"{self.postgres_user}:{self.postgres_password}"
+            f"@{self.postgres_replica_host}:{self.postgres_replica_port}"
+            f"/{self.postgres_db}"
+        )
+
     @property
     def database_url_sync(self) -> str:
         """
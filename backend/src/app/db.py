@@ -1,18 +1,71 @@
-from typing import AsyncGenerator
+import asyncio
+import logging
+from typing import Any, AsyncGenerator
+from uuid import uuid4
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from fastapi import Request
+from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncEngine, AsyncSession,
+                                    create_async_engine)
 from sqlalchemy.orm import sessionmaker
 
 from src.app.base import Base
 from src.app.config import get_settings
+from src.app.metrics import TimedQueuePool, instrument_engine
+from src.app.querycount import instrument_query_counter
+from src.app.replica import pinned_to_primary, replica_usable
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
-engine = create_async_engine(
-    settings.database_url_async,
-    echo=False,
-    future=True,
+def _connect_args() -> dict[str, Any]:
+    """
+    asyncpg connect() arguments. Behind pgbouncer in transaction mode a
+    server connection changes between transactions, so prepared
+    statements must not be cached or reused by name.
+    """
+    args: dict[str, Any] = {"timeout": settings.db_connect_timeout_seconds}
+    if settings.db_pgbouncer:
+        args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+        )
+    else:
+        # asyncpg's own cache; SQLAlchemy's adapter keeps one of the
+        # same size
+        args.update(
+            statement_cache_size=settings.db_statement_cache_size,
+            prepared_statement_cache_size=settings.db_statement_cache_size,
+        )
+    return args
+
+
+def _make_engine(url: str, pool_name: str) -> AsyncEngine:
+    db_engine = create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_logging_name=pool_name,
+        connect_args=_connect_args(),
+    )
+    instrument_engine(db_engine)
+    instrument_query_counter(db_engine)
+    return db_engine
+
+
+engine = _make_engine(settings.database_url_async, "primary")
+# without a replica, read sessions use the primary engine
+read_engine = (
+    _make_engine(settings.database_url_replica_async, "replica")
+    if settings.postgres_replica_host
+    else engine
 )
 
 AsyncSessionLocal = sessionmaker(
@@ -20,6 +73,11 @@ AsyncSessionLocal = sessionmaker(
     class_=AsyncSession,
     expire_on_commit=False,
 )
+AsyncReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
 
 
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
@@ -29,3 +87,42 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
 
+
+async def get_async_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    FastAPI dependency for read-only handlers: an `AsyncSession` on the
+    replica, or on the primary while the caller is within the
+    read-your-writes window or the replica is unusable (see
+    src.app.replica). Never write with it.
+    """
+    session_factory = AsyncReadSessionLocal
+    if read_engine is not engine and (
+        not replica_usable()
+        or await pinned_to_primary(request.headers.get("authorization"))
+    ):
+        session_factory = AsyncSessionLocal
+    async with session_factory() as session:
+        yield session
+
+
+async def prewarm_pool(db_engine: AsyncEngine, connections: int) -> int:
+    """
+    Open `connections` pooled connections at once and return them to the
+    pool, so the first requests skip TCP/auth/type introspection. Returns
+    how many opened; failures are logged, not raised (readiness reports
+    an unreachable database).
+    """
+    conns = [AsyncConnection(db_engine) for _ in range(connections)]
+    results = await asyncio.gather(*(c.start() for c in conns), return_exceptions=True)
+    for conn, result in zip(conns, results):
+        if not isinstance(result, BaseException):
+            await conn.close()
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        logger.warning(
+            "DB pool pre-warm: %d of %d connections failed: %r",
+            len(errors),
+            connections,
+            errors[0],
+        )
+    return connections - len(errors)
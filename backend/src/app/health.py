@@ -0,0 +1,185 @@
+"""
+Cached dependency checks for the liveness and readiness probes.
+
+HealthChecker runs every check concurrently on an interval from a
+background task of the API process and keeps the last result of each;
+the probe endpoints only read that snapshot, so a probe never waits on
+Postgres, Redis or the broker and probing often costs nothing.
+
+    database  SELECT 1 on a pooled connection
+    replica   replay lag of the read replica, when one is configured
+    redis     PING
+    broker    one AMQP connection attempt (no worker broadcast), in a
+              thread because kombu is blocking
+
+The broker and the replica are reported but not required for readiness:
+the API keeps serving while RabbitMQ is down, as /health always allowed,
+and while the replica is down or lags more than REPLICA_MAX_LAG_SECONDS
+read sessions use the primary instead.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, NamedTuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[None]]
+
+
+class CheckResult(NamedTuple):
+    ok: bool
+    latency_ms: float
+    error: str | None
+    checked_at: float  # time.time()
+
+
+class HealthChecker:
+    def __init__(
+        self,
+        checks: dict[str, Check],
+        required: set[str],
+        interval: float = 5.0,
+        timeout: float = 2.0,
+    ) -> None:
+        self.checks = checks
+        self.required = required
+        self.interval = interval
+        self.timeout = timeout
+        self.results: dict[str, CheckResult] = {}
+
+    async def _run_check(self, name: str, check: Check) -> None:
+        t = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+            error = None
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout:g}s"
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        result = CheckResult(
+            error is None,
+            round((time.perf_counter() - t) * 1000, 1),
+            error,
+            time.time(),
+        )
+        previous = self.results.get(name)
+        if previous is not None and previous.ok != result.ok:
+            log = logger.info if result.ok else logger.warning
+            log("health check %s: %s", name, "ok" if result.ok else error)
+        self.results[name] = result
+
+    async def check_once(self) -> None:
+        await asyncio.gather(
+            *(self._run_check(name, check) for name, check in self.checks.items())
+        )
+
+    async def run(self) -> None:
+        while True:
+            await self.check_once()
+            await asyncio.sleep(self.interval)
+
+    def ready(self) -> tuple[bool, dict]:
+        """
+        (ready, report) from the cached results. Not ready before the
+        first round, when a required check failed, or when results are
+        older than a few intervals (the checker task died or is starved).
+        """
+        now = time.time()
+        stale_after = 3 * self.interval + self.timeout
+        checks = {}
+        ready = True
+        for name in self.checks:
+            result = self.results.get(name)
+            if result is None:
+                status, ok = "pending", False
+            elif now - result.checked_at > stale_after:
+                status, ok = "stale", False
+            else:
+                status, ok = ("ok" if result.ok else "failing"), result.ok
+            if name in self.required and not ok:
+                ready = False
+            checks[name] = {
+                "status": status,
+                "required": name in self.required,
+                **(
+                    {
+                        "latency_ms": result.latency_ms,
+                        "error": result.error,
+                        "age_seconds": round(now - result.checked_at, 1),
+                    }
+                    if result is not None
+                    else {}
+                ),
+            }
+        return ready, {"status": "ready" if ready else "unready", "checks": checks}
+
+
+async def check_database() -> None:
+    from src.app.db import engine
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+# 0 while the replica has replayed everything it received (an idle
+# primary writes nothing, so the last replay timestamp grows old)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) "
+    "END"
+)
+
+
+async def check_replica(max_lag: float) -> None:
+    from src.app.db import read_engine
+    from src.app.replica import set_replica_usable
+
+    try:
+        async with read_engine.connect() as conn:
+            lag = await conn.scalar(REPLICA_LAG_SQL)
+        if lag is not None and lag > max_lag:
+            raise RuntimeError(f"replication lag {lag:.1f}s > {max_lag:g}s")
+    except BaseException:
+        # cancelled by the check timeout counts as down too
+        set_replica_usable(False)
+        raise
+    set_replica_usable(True)
+
+
+async def check_redis() -> None:
+    from src.app.redis import get_redis_client
+
+    await get_redis_client().ping()
+
+
+def _probe_broker(timeout: float) -> None:
+    from src.app.tasks import celery_app
+
+    with celery_app.connection_for_write() as conn:
+        conn.ensure_connection(max_retries=0, timeout=timeout)
+
+
+async def check_broker(timeout: float) -> None:
+    await asyncio.to_thread(_probe_broker, timeout)
+
+
+def make_health_checker(
+    interval: float, timeout: float, replica_max_lag: float | None = None
+) -> HealthChecker:
+    checks: dict[str, Check] = {
+        "database": check_database,
+        "redis": check_redis,
+        "broker": lambda: check_broker(timeout),
+    }
+    if replica_max_lag is not None:
+        checks["replica"] = lambda: check_replica(replica_max_lag)
+    return HealthChecker(
+        checks,
+        required={"database", "redis"},
+        interval=interval,
+        timeout=timeout,
+    )
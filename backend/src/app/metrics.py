@@ -0,0 +1,400 @@
+"""
+Prometheus metrics for the API, SQLAlchemy, Redis, Celery and the worker
+catalog store.
+
+Labels are kept low-cardinality: HTTP routes are labelled by their
+template (`/movies/{movie_id}/swipes`, "unmatched" for 404s) and status
+class, SQL by statement verb, Redis by command name and Celery by task
+name and queue. Nothing is labelled by user, movie or raw path.
+
+The API serves `GET /metrics`; Celery workers serve the same format on
+CELERY_METRICS_PORT. With several processes per container (uvicorn
+workers, Celery prefork children) set PROMETHEUS_MULTIPROC_DIR to an
+empty directory so every process writes its samples there and the
+endpoint aggregates them. The directory must exist before the process
+imports this module and be emptied by the launch command (stale files
+would be summed in); no metric gets a value at import time.
+"""
+
+import os
+import time
+from typing import Any
+
+from celery import signals
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess,
+                               start_http_server)
+from redis import asyncio as redis_async
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# sub-millisecond Redis/SQL up to multi-second handlers
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+# Celery tasks run up to minutes (catalog rebuilds, ALS training)
+TASK_BUCKETS = (
+    0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+    900.0, 3600.0,
+)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being handled.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency by verb.",
+    ["verb"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled DB connection.",
+    ["pool"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Pool checkouts that gave up after pool_timeout.",
+    ["pool"],
+)
+# saturation = checked_out / capacity; summed over live processes
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Pooled DB connections in use.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_IDLE = Gauge(
+    "db_pool_idle",
+    "Open pooled DB connections waiting in the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "DB connections open beyond pool_size.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity",
+    "pool_size + max_overflow: connections a pool may hold.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command (or pipeline) latency by command name.",
+    ["command"],
+    buckets=LATENCY_BUCKETS,
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task run time.",
+    ["task", "queue", "state"],
+    buckets=TASK_BUCKETS,
+)
+TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time between publishing a task and a worker starting it.",
+    ["task", "queue"],
+    buckets=TASK_BUCKETS,
+)
+TASKS = Counter(
+    "celery_tasks_total",
+    "Finished Celery tasks by outcome.",
+    ["task", "queue", "state"],
+)
+# worker catalog store by source (resident | snapshot); max/min over
+# live processes: the largest copy and the stalest one
+CATALOG_STORE_MOVIES = Gauge(
+    "catalog_store_movies",
+    "Live movies in the worker catalog store.",
+    ["source"],
+    multiprocess_mode="livemax",
+)
+CATALOG_STORE_BYTES = Gauge(
+    "catalog_store_bytes",
+    "Size of the catalog store columns (shared pages for snapshots).",
+    ["source"],
+    multiprocess_mode="livemax",
+)
+CATALOG_STORE_REFRESHED = Gauge(
+    "catalog_store_last_refresh_timestamp_seconds",
+    "When the stalest worker last refreshed or mapped its catalog store.",
+    ["source"],
+    multiprocess_mode="livemin",
+)
+CATALOG_STORE_WATERMARK = Gauge(
+    "catalog_store_watermark_timestamp_seconds",
+    "Newest movies.updated_at the stalest worker's catalog store has seen.",
+    ["source"],
+    multiprocess_mode="livemin",
+)
+
+
+def registry() -> CollectorRegistry:
+    """
+    Registry to expose: the per-process default one, or an aggregate of
+    every process's files in multiprocess mode.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    aggregate = CollectorRegistry()
+    multiprocess.MultiProcessCollector(aggregate)
+    return aggregate
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+# HTTP ---------------------------------------------------------------------
+
+
+class PrometheusMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task per request).
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        t = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            # FastAPI leaves the matched route in the scope
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                method,
+                getattr(route, "path", "unmatched"),
+                f"{status // 100}xx",
+            ).observe(time.perf_counter() - t)
+
+
+# SQLAlchemy ---------------------------------------------------------------
+
+_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT"}
+
+
+def _verb(statement: str) -> str:
+    head = statement.lstrip()[:7].split(None, 1)
+    verb = head[0].upper() if head else ""
+    return verb if verb in _VERBS else "OTHER"
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    The async engine's default pool, timing how long checkouts wait and
+    publishing its occupancy after every checkout and return. Labelled
+    by the engine's pool_logging_name.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # no samples yet: in multiprocess mode a value opens a file, and
+        # engines are built at import time
+        self._label = self.logging_name or "default"
+
+    def _do_get(self):
+        t = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self._label).inc()
+            raise
+        finally:
+            DB_POOL_WAIT.labels(self._label).observe(time.perf_counter() - t)
+            self._observe_state()
+
+    def _do_return_conn(self, record) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._observe_state()
+
+    def _observe_state(self) -> None:
+        # the pool's own counters: no events, no locking
+        label = self._label
+        DB_POOL_CHECKED_OUT.labels(label).set(self.checkedout())
+        DB_POOL_IDLE.labels(label).set(self.checkedin())
+        # overflow() starts at -pool_size while the pool fills up
+        DB_POOL_OVERFLOW.labels(label).set(max(0, self.overflow()))
+        DB_POOL_CAPACITY.labels(label).set(self.size() + max(0, self._max_overflow))
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Statement latency by verb via cursor events (they fire on the sync
+    engine under the async facade).
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.labels(_verb(statement)).observe(
+            time.perf_counter() - started
+        )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # a failed statement never reaches after_cursor_execute
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+# Catalog store ------------------------------------------------------------
+
+
+def observe_catalog_store(store) -> None:
+    """
+    Export CatalogStore.stats() of the store a worker ranks from;
+    staleness as timestamps (alert on `time() - ...`).
+    """
+    stats = store.stats()
+    source = "snapshot" if stats["snapshot"] else "resident"
+    CATALOG_STORE_MOVIES.labels(source).set(stats["movies"])
+    CATALOG_STORE_BYTES.labels(source).set(stats["nbytes"])
+    now = time.time()
+    for gauge, age in (
+        (CATALOG_STORE_REFRESHED, stats["seconds_since_refresh"]),
+        (CATALOG_STORE_WATERMARK, stats["watermark_age_seconds"]),
+    ):
+        if age >= 0:
+            gauge.labels(source).set(now - age)
+
+
+# Redis --------------------------------------------------------------------
+
+
+class InstrumentedPipeline(redis_async.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        t = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_LATENCY.labels(
+                "MULTI" if self.is_transaction else "PIPELINE"
+            ).observe(time.perf_counter() - t)
+
+
+class InstrumentedRedis(redis_async.Redis):
+    """
+    redis.asyncio client timing every command and pipeline round trip.
+    """
+
+    async def execute_command(self, *args, **options):
+        t = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.labels(str(args[0]).split(" ", 1)[0].upper()).observe(
+                time.perf_counter() - t
+            )
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: str | None = None
+    ) -> InstrumentedPipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+# Celery -------------------------------------------------------------------
+
+_task_started: dict[str, tuple[float, str]] = {}
+
+
+def _queue(task) -> str:
+    info = getattr(task.request, "delivery_info", None) or {}
+    return info.get("routing_key") or getattr(task, "queue", None) or "celery"
+
+
+def _started_header(task) -> float | None:
+    request = task.request
+    value = getattr(request, "published_at", None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get("published_at")
+    return float(value) if value is not None else None
+
+
+@signals.before_task_publish.connect
+def _stamp_publish_time(headers: dict[str, Any] | None = None, **_) -> None:
+    # wall clock: publisher and worker are different processes/hosts
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@signals.task_prerun.connect
+def _task_prerun(task_id: str, task, **_) -> None:
+    queue = _queue(task)
+    published = _started_header(task)
+    if published is not None:
+        TASK_QUEUE_WAIT.labels(task.name, queue).observe(
+            max(0.0, time.time() - published)
+        )
+    _task_started[task_id] = (time.perf_counter(), queue)
+
+
+@signals.task_postrun.connect
+def _task_postrun(task_id: str, task, state: str | None = None, **_) -> None:
+    started = _task_started.pop(task_id, None)
+    if started is None:
+        return
+    t, queue = started
+    state = state or "UNKNOWN"
+    TASK_DURATION.labels(task.name, queue, state).observe(time.perf_counter() - t)
+    TASKS.labels(task.name, queue, state).inc()
+
+
+@signals.worker_init.connect
+def _serve_worker_metrics(**_) -> None:
+    from src.app.config import get_settings
+
+    port = get_settings().celery_metrics_port
+    if not port:
+        return
+    start_http_server(port, registry=registry())
+
+
+@signals.worker_process_shutdown.connect
+def _mark_process_dead(pid: int | None = None, **_) -> None:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,343 @@
+"""
+Opt-in cProfile captures of single API requests and Celery tasks.
+
+A request is profiled when it carries `X-Profile-Token:
+<PROFILING_ADMIN_TOKEN>`, or at random with PROFILING_SAMPLE_RATE. Tasks
+are profiled at random with PROFILING_TASK_SAMPLE_RATE, and always when
+they were enqueued by a token-profiled request (the task message carries
+a `profile` header), so one slow call can be followed into the worker.
+
+Each capture is a pstats file plus a JSON metadata file (kind, route or
+task, user, status, duration, trace id) in PROFILING_DIR, shared by every
+process; the oldest captures beyond PROFILING_MAX_CAPTURES are deleted
+on write. GET /debug/profiles lists them and /debug/profiles/{id}
+downloads one (`snakeviz`, `tuna` or `flameprof` turn it into a flame
+graph; ?format=text gives the pstats table).
+
+cProfile hooks one thread, and a process runs one capture at a time
+(others are skipped, not queued). On a busy API worker the capture also
+contains whatever other requests ran on the event loop meanwhile; the
+profiled handler's own subtree is exact.
+"""
+
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from celery import signals
+
+from src.app.tracing import current_span, task_user_id
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "X-Profile-Token"
+
+_CAPTURE_ID = re.compile(r"^\d{20}-[0-9a-f]{8}$")
+
+# one cProfile per process: a second enable() would steal the hook
+_profiler_lock = threading.Lock()
+
+
+class CaptureStore:
+    """
+    Ring buffer of captures in one directory: `<id>.prof` + `<id>.json`,
+    ids sortable by creation time.
+    """
+
+    def __init__(self, directory: str, max_captures: int) -> None:
+        self.directory = directory
+        self.max_captures = max_captures
+
+    def save(
+        self,
+        profiler: cProfile.Profile,
+        meta: dict[str, Any],
+        capture_id: str | None = None,
+    ) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        capture_id = capture_id or new_capture_id()
+        base = os.path.join(self.directory, capture_id)
+        profiler.dump_stats(base + ".prof.tmp")
+        os.replace(base + ".prof.tmp", base + ".prof")
+        # metadata last: a listed capture always has its profile
+        with open(base + ".json.tmp", "w") as f:
+            json.dump({"id": capture_id, **meta}, f)
+        os.replace(base + ".json.tmp", base + ".json")
+        self.prune()
+        return capture_id
+
+    def _ids(self) -> list[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(n[: -len(".json")] for n in names if n.endswith(".json"))
+
+    def prune(self) -> None:
+        ids = self._ids()
+        for capture_id in ids[: max(0, len(ids) - self.max_captures)]:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, capture_id + suffix))
+                except FileNotFoundError:
+                    # another process pruned it first
+                    pass
+
+    def list(
+        self, limit: int = 50, kind: str | None = None, name: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Metadata of the newest captures first.
+        """
+        captures = []
+        for capture_id in reversed(self._ids()):
+            meta = self.meta(capture_id)
+            if meta is None:
+                continue
+            if (kind is None or meta["kind"] == kind) and (
+                name is None or meta["name"] == name
+            ):
+                captures.append(meta)
+                if len(captures) >= limit:
+                    break
+        return captures
+
+    def meta(self, capture_id: str) -> dict[str, Any] | None:
+        if not _CAPTURE_ID.match(capture_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, capture_id + ".json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def profile_path(self, capture_id: str) -> str | None:
+        if not _CAPTURE_ID.match(capture_id):
+            return None
+        path = os.path.join(self.directory, capture_id + ".prof")
+        return path if os.path.exists(path) else None
+
+    def text(self, capture_id: str, sort: str = "cumulative", limit: int = 60) -> str | None:
+        path = self.profile_path(capture_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+def new_capture_id() -> str:
+    return f"{time.time_ns():020d}-{secrets.token_hex(4)}"
+
+
+def get_capture_store() -> CaptureStore:
+    from src.app.config import get_settings
+
+    settings = get_settings()
+    return CaptureStore(settings.profiling_dir, settings.profiling_max_captures)
+
+
+class _Capture:
+    __slots__ = ("profiler", "trigger", "meta")
+
+    def __init__(self, trigger: str) -> None:
+        self.profiler = cProfile.Profile()
+        self.trigger = trigger
+        self.meta: dict[str, Any] = {}
+
+
+current_capture: ContextVar[_Capture | None] = ContextVar(
+    "current_capture", default=None
+)
+
+
+def annotate(**meta: Any) -> None:
+    """
+    Add metadata to the running capture, if any (e.g. user_id once the
+    request is authenticated).
+    """
+    capture = current_capture.get()
+    if capture is not None:
+        capture.meta.update(meta)
+
+
+def _start(trigger: str) -> _Capture | None:
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    capture = _Capture(trigger)
+    span = current_span.get()
+    if span is not None and span.sampled:
+        capture.meta["trace_id"] = span.trace_id
+    try:
+        capture.profiler.enable()
+    except ValueError:
+        # another profiler (debugger, coverage) owns the hook
+        _profiler_lock.release()
+        return None
+    return capture
+
+
+def _stop(capture: _Capture) -> None:
+    capture.profiler.disable()
+    _profiler_lock.release()
+
+
+def _finish_meta(capture: _Capture, seconds: float) -> dict[str, Any]:
+    return {
+        "trigger": capture.trigger,
+        "duration_ms": round(seconds * 1000, 1),
+        "created_at": time.time(),
+        "pid": os.getpid(),
+        **capture.meta,
+    }
+
+
+# HTTP ---------------------------------------------------------------------
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware; captured responses carry `X-Profile-Id`.
+    """
+
+    def __init__(
+        self, app, admin_token: str = "", sample_rate: float = 0.0
+    ) -> None:
+        self.app = app
+        self.admin_token = admin_token.encode()
+        self.sample_rate = sample_rate
+
+    def _trigger(self, scope) -> str | None:
+        if scope["path"].startswith("/debug/profiles") or scope["path"] == "/metrics":
+            return None
+        if self.admin_token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile-token":
+                    if secrets.compare_digest(value, self.admin_token):
+                        return "token"
+                    break
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+        capture = _start(trigger) if trigger else None
+        if capture is None:
+            await self.app(scope, receive, send)
+            return
+        capture_id = new_capture_id()
+        status = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"x-profile-id", capture_id.encode()),
+                    ],
+                }
+            await send(message)
+
+        token = current_capture.set(capture)
+        t = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - t
+            _stop(capture)
+            current_capture.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            meta = {
+                "kind": "http",
+                "name": f"{scope['method']} {route}",
+                "path": scope["path"],
+                "status": status,
+                **_finish_meta(capture, seconds),
+            }
+            # pstats marshalling and file I/O off the event loop
+            try:
+                await asyncio.to_thread(
+                    get_capture_store().save, capture.profiler, meta, capture_id
+                )
+            except OSError:
+                logger.warning("could not save profile capture", exc_info=True)
+            else:
+                logger.info(
+                    "profiled %s in %.1f ms: capture %s",
+                    meta["name"],
+                    seconds * 1000,
+                    capture_id,
+                )
+
+
+# Celery -------------------------------------------------------------------
+
+_task_captures: dict[str, tuple[_Capture, float]] = {}
+
+
+def _task_sample_rate() -> float:
+    from src.app.config import get_settings
+
+    return get_settings().profiling_task_sample_rate
+
+
+@signals.before_task_publish.connect
+def _propagate_profile(headers: dict[str, Any] | None = None, **_) -> None:
+    capture = current_capture.get()
+    if headers is not None and capture is not None and capture.trigger == "token":
+        headers.setdefault("profile", "1")
+
+
+@signals.task_prerun.connect
+def _start_task_capture(task_id: str, task, args=None, kwargs=None, **_) -> None:
+    request = task.request
+    flag = getattr(request, "profile", None) or (
+        getattr(request, "headers", None) or {}
+    ).get("profile")
+    if flag:
+        trigger = "request"
+    elif (rate := _task_sample_rate()) and random.random() < rate:
+        trigger = "sample"
+    else:
+        return
+    capture = _start(trigger)
+    if capture is None:
+        return
+    user_id = task_user_id(task, args, kwargs)
+    capture.meta.update(task_id=task_id, **({"user_id": user_id} if user_id else {}))
+    _task_captures[task_id] = (capture, time.perf_counter())
+
+
+@signals.task_postrun.connect
+def _save_task_capture(task_id: str, task, state: str | None = None, **_) -> None:
+    entry = _task_captures.pop(task_id, None)
+    if entry is None:
+        return
+    capture, t = entry
+    seconds = time.perf_counter() - t
+    _stop(capture)
+    meta = {
+        "kind": "task",
+        "name": task.name,
+        "status": state or "UNKNOWN",
+        **_finish_meta(capture, seconds),
+    }
+    try:
+        get_capture_store().save(capture.profiler, meta)
+    except OSError:
+        logger.warning("could not save profile capture", exc_info=True)
@@ -0,0 +1,213 @@
+"""
+Per-request SQL query counting and an N+1 heuristic.
+
+QueryCountMiddleware gives every HTTP request a RequestQueries record
+(via a ContextVar, which SQLAlchemy's async greenlets share with the
+handler); cursor events on the engine add each statement's count and
+time to it. The response gets a `Server-Timing: db;dur=...;desc="N
+queries"` header and the request is logged with `db_queries`/`db_ms`
+fields. A statement shape (SQL with bind-parameter lists collapsed) run
+`nplus1_threshold` or more times in one request is logged as a likely
+N+1: a loop issuing one query per item.
+
+For tests, `assert_max_queries` counts every statement the engine runs
+inside the block, whichever thread or task issued it:
+
+    with assert_max_queries(4):
+        client.get("/friends/suggestions", headers=auth)
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+_PARAM_LIST = re.compile(r"\$\d+(?:\s*,\s*\$\d+)*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    SQL with positional parameter lists collapsed, so IN lists of
+    different lengths count as one shape.
+    """
+    return _WHITESPACE.sub(" ", _PARAM_LIST.sub("?", statement)).strip()
+
+
+class RequestQueries:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        (shape, executions) of shapes run at least `threshold` times,
+        most repeated first.
+        """
+        shapes: Counter = Counter()
+        for statement, n in self.statements.items():
+            shapes[statement_shape(statement)] += n
+        return [(s, n) for s, n in shapes.most_common() if n >= threshold]
+
+
+current_queries: ContextVar[RequestQueries | None] = ContextVar(
+    "current_queries", default=None
+)
+
+# counters of active count_queries() blocks, fed by every connection
+_trackers: list[RequestQueries] = []
+_trackers_lock = threading.Lock()
+
+
+def instrument_query_counter(engine: AsyncEngine | Engine) -> None:
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if current_queries.get() is not None or _trackers:
+            conn.info.setdefault("count_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("count_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        targets = list(_trackers)
+        request = current_queries.get()
+        if request is not None:
+            targets.append(request)
+        for queries in targets:
+            queries.count += 1
+            queries.seconds += elapsed
+            queries.statements[statement] += 1
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("count_start"):
+            conn.info["count_start"].pop()
+
+
+class QueryCountMiddleware:
+    """
+    Pure ASGI middleware: per-request counter, Server-Timing header, log.
+    """
+
+    def __init__(self, app, nplus1_threshold: int = 5) -> None:
+        self.app = app
+        self.nplus1_threshold = nplus1_threshold
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        t = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                # body-streaming queries after this point are only logged
+                total_ms = (time.perf_counter() - t) * 1000
+                timing = (
+                    f'db;dur={queries.seconds * 1000:.1f};'
+                    f'desc="{queries.count} queries", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode()),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_queries.reset(token)
+            self._log(scope, queries, time.perf_counter() - t)
+
+    def _log(self, scope, queries: RequestQueries, seconds: float) -> None:
+        route = getattr(scope.get("route"), "path", scope["path"])
+        fields = {
+            "method": scope["method"],
+            "route": route,
+            "db_queries": queries.count,
+            "db_ms": round(queries.seconds * 1000, 1),
+            "duration_ms": round(seconds * 1000, 1),
+        }
+        repeated = queries.repeated(self.nplus1_threshold)
+        if repeated:
+            shape, n = repeated[0]
+            logger.warning(
+                "possible N+1 in %s %s: %d× %s",
+                scope["method"],
+                route,
+                n,
+                shape[:200],
+                extra={**fields, "nplus1_count": n, "nplus1_shape": shape},
+            )
+        else:
+            logger.info(
+                "%s %s: %d queries, %.1f ms db",
+                scope["method"],
+                route,
+                queries.count,
+                queries.seconds * 1000,
+                extra=fields,
+            )
+
+
+@contextmanager
+def count_queries() -> Iterator[RequestQueries]:
+    """
+    Count every statement run by the instrumented engine inside the block.
+    """
+    queries = RequestQueries()
+    with _trackers_lock:
+        _trackers.append(queries)
+    try:
+        yield queries
+    finally:
+        with _trackers_lock:
+            _trackers.remove(queries)
+
+
+@contextmanager
+def assert_max_queries(
+    max_count: int, nplus1_threshold: int | None = None
+) -> Iterator[RequestQueries]:
+    """
+    count_queries() that fails with AssertionError if the block ran more
+    than `max_count` statements (or, with `nplus1_threshold`, repeated a
+    statement shape that often), listing what ran.
+    """
+    with count_queries() as queries:
+        yield queries
+    problems = []
+    if queries.count > max_count:
+        problems.append(f"{queries.count} queries, expected at most {max_count}")
+    if nplus1_threshold is not None:
+        for shape, n in queries.repeated(nplus1_threshold):
+            problems.append(f"repeated {n}×: {shape[:200]}")
+    if problems:
+        listing = "\n".join(
+            f"  {n}× {statement_shape(s)[:200]}"
+            for s, n in queries.statements.most_common()
+        )
+        raise AssertionError("; ".join(problems) + "\n" + listing)
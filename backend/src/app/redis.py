@@ -3,6 +3,7 @@ from typing import Optional
 from redis import asyncio as redis_async
 
 from src.app.config import get_settings
+from src.app.metrics import InstrumentedRedis
 
 settings = get_settings()
 
@@ -15,7 +16,7 @@ def get_redis_client() -> redis_async.Redis:
     """
     global _redis_client
     if _redis_client is None:
-        _redis_client = redis_async.from_url(settings.redis_url)
+        _redis_client = InstrumentedRedis.from_url(settings.redis_url)
     return _redis_client
 
 
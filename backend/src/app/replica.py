@@ -0,0 +1,106 @@
+"""
+Read-your-writes for replica reads.
+
+Read-only handlers take their session from get_async_read_db, which uses
+the streaming replica unless the caller wrote recently. A successful
+write (any non-GET request answered below 400) by an authenticated user
+sets `primary_pin:<user id>` in Redis for READ_YOUR_WRITES_SECONDS; while
+the key exists that user's reads go to the primary, so a swipe or a
+favourite shows up in the next /movies/activity even if the replica
+lags. The user comes from the bearer token (no DB lookup), so the pin
+follows the account across devices. If Redis is unreachable, reads fall
+back to the primary; so do all reads while the readiness checker finds
+the replica down or lagging (src.app.health.check_replica).
+"""
+
+import logging
+from uuid import UUID
+
+from src.app.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# updated by the readiness checker every interval
+_replica_usable = True
+
+
+def replica_usable() -> bool:
+    return _replica_usable
+
+
+def set_replica_usable(usable: bool) -> None:
+    global _replica_usable
+    if usable != _replica_usable:
+        log = logger.info if usable else logger.warning
+        log(
+            "read replica %s",
+            "back in use" if usable else "unusable; reading from primary",
+        )
+    _replica_usable = usable
+
+
+def _pin_key(user_id: UUID) -> str:
+    return f"primary_pin:{user_id}"
+
+
+def _user_id(authorization: str | None) -> UUID | None:
+    # auth.deps imports src.app.db, which imports this module
+    from src.auth.deps import user_id_from_authorization
+
+    return user_id_from_authorization(authorization)
+
+
+async def pinned_to_primary(authorization: str | None) -> bool:
+    """
+    Whether the caller wrote within the read-your-writes window.
+    """
+    user_id = _user_id(authorization)
+    if user_id is None:
+        return False
+    try:
+        return bool(await get_redis_client().exists(_pin_key(user_id)))
+    except Exception:
+        logger.warning("primary pin lookup failed; reading from primary", exc_info=True)
+        return True
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware: pins the writer's reads to the primary after a
+    successful write. The pin is set before the response starts, so a
+    read the client sends after seeing the response always finds it.
+    """
+
+    def __init__(self, app, window_seconds: int = 5) -> None:
+        self.app = app
+        self.window_seconds = window_seconds
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] in _SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                await self._pin(scope)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _pin(self, scope) -> None:
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+                break
+        user_id = _user_id(authorization)
+        if user_id is None:
+            return
+        try:
+            await get_redis_client().set(
+                _pin_key(user_id), 1, ex=self.window_seconds
+            )
+        except Exception:
+            logger.warning("could not pin %s to the primary", user_id, exc_info=True)
@@ -1,18 +1,37 @@
+import json
 from uuid import UUID
 
 from celery import Celery
+from celery.signals import worker_process_init
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src.ai import rank_friend_match_for_users, rank_movies_for_user
+from src.ai import (rank_friend_match_for_users, rank_movies_dense,
+                    rank_movies_encoded)
+from src.ai.cooccurrence import blend_rankings
+from src.ai.features import GENRE, KEYWORD, taste_names
+from src.ai.rerank import taste_bucket
+from src.ai.taste import accumulate_taste_scores, interaction_strength
+from src.app import profiling  # noqa: F401 (task capture signals)
 from src.app.config import get_settings
 from src.app.db import engine
+from src.app.tracing import span
 from src.auth.models import Profile, User
 from src.friends.crud import upsert_match_score
-from src.movies import tmdb_client
-from src.movies.crud import upsert_movie_from_tmdb
+from src.movies import (batch_recommendations, cooccurrence, factors,
+                        rec_cache, rerank, similar, tmdb_client)
+from src.movies.crud import (active_recommendations, compute_catalog_facets,
+                             get_movies_by_ids, load_feature_vocabulary,
+                             prune_recommendation_generations,
+                             refresh_feature_doc_freq, upsert_movie_from_tmdb,
+                             write_recommendation_generation)
+from src.movies.catalog_snapshot import (catalog_snapshot, get_catalog_store,
+                                         write_catalog_snapshot)
+from src.movies.catalog_store import CatalogStore, refresh_catalog_store
 from src.movies.models import (AIRecommendation, Dislike, Favorite, Movie,
                                Status, Swipe)
+from src.profiles.crud import (create_taste_vocabulary, get_taste_layout,
+                               load_dense_taste, set_dense_taste)
 
 settings = get_settings()
 
@@ -22,6 +41,57 @@ celery_app = Celery(
     backend=settings.redis_url,
 )
 
+celery_app.conf.beat_schedule = {
+    "rebuild-taste-vocabulary": {
+        "task": "src.app.tasks.rebuild_taste_vocabulary",
+        "schedule": settings.taste_vocab_rebuild_seconds,
+        "options": {"queue": "taste_update_queue"},
+    },
+    "refresh-catalog-facets": {
+        "task": "src.app.tasks.refresh_catalog_facets",
+        "schedule": settings.catalog_facets_refresh_seconds,
+        "options": {"queue": "catalog_queue"},
+    },
+    "materialize-cooccurrence": {
+        "task": "src.app.tasks.materialize_cooccurrence",
+        "schedule": settings.cooc_materialize_seconds,
+        "options": {"queue": "cooccurrence_queue"},
+    },
+    "rebuild-cooccurrence": {
+        "task": "src.app.tasks.rebuild_cooccurrence",
+        "schedule": settings.cooc_rebuild_seconds,
+        "options": {"queue": "cooccurrence_queue"},
+    },
+    "build-movie-embeddings": {
+        "task": "src.app.tasks.build_movie_embeddings",
+        "schedule": settings.similar_build_seconds,
+        "options": {"queue": "catalog_queue"},
+    },
+    "regenerate-all-recommendations": {
+        "task": "src.app.tasks.regenerate_all_recommendations",
+        "schedule": settings.batch_rank_seconds,
+        "options": {"queue": "batch_recommendation_queue"},
+    },
+    "prune-recommendations": {
+        "task": "src.app.tasks.prune_recommendations",
+        "schedule": settings.recs_prune_seconds,
+        "options": {"queue": "movie_recommendation_queue"},
+    },
+    "train-factor-model": {
+        "task": "src.app.tasks.train_factor_model",
+        "schedule": settings.mf_train_seconds,
+        "options": {"queue": "catalog_queue"},
+    },
+}
+if settings.catalog_snapshot_dir:
+    celery_app.conf.beat_schedule["build-catalog-snapshot"] = {
+        "task": "src.app.tasks.build_catalog_snapshot",
+        "schedule": settings.catalog_snapshot_build_seconds,
+        "options": {"queue": "catalog_queue"},
+    }
+
+CATALOG_FACETS_KEY = "catalog_facets"
+
 SessionLocal = async_sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -29,6 +99,12 @@ SessionLocal = async_sessionmaker(
 )
 
 
+@worker_process_init.connect
+def _map_catalog_snapshot(**_) -> None:
+    # map the published snapshot as each prefork child starts
+    catalog_snapshot.get()
+
+
 @celery_app.task(queue="taste_update_queue")
 def recalc_taste_vector(user_id: str) -> None:
     """
@@ -48,35 +124,43 @@ def recalc_taste_vector(user_id: str) -> None:
 
             # ORM-запрос, чтобы получить именно объект Profile,
             # а не "сырую" Row, иначе присвоение profile.taste_vector не сохранится.
-            profile_q = await session.execute(
-                select(Profile).where(Profile.user_id == uid)
-            )
-            profile = profile_q.scalar_one_or_none()
+            with span("load_profile"):
+                profile_q = await session.execute(
+                    select(Profile).where(Profile.user_id == uid)
+                )
+                profile = profile_q.scalar_one_or_none()
 
             if profile is None:
                 # no profile – nothing to do
                 return
 
             # collect user interactions
-            fav_q = await session.execute(
-                Favorite.__table__.select().where(Favorite.user_id == uid)
-            )
-            favs = fav_q.fetchall()
+            with span("load_interactions") as s:
+                fav_q = await session.execute(
+                    Favorite.__table__.select().where(Favorite.user_id == uid)
+                )
+                favs = fav_q.fetchall()
 
-            dis_q = await session.execute(
-                Dislike.__table__.select().where(Dislike.user_id == uid)
-            )
-            dis = dis_q.fetchall()
+                dis_q = await session.execute(
+                    Dislike.__table__.select().where(Dislike.user_id == uid)
+                )
+                dis = dis_q.fetchall()
 
-            status_q = await session.execute(
-                Status.__table__.select().where(Status.user_id == uid)
-            )
-            statuses = status_q.fetchall()
+                status_q = await session.execute(
+                    Status.__table__.select().where(Status.user_id == uid)
+                )
+                statuses = status_q.fetchall()
 
-            swipe_q = await session.execute(
-                Swipe.__table__.select().where(Swipe.user_id == uid)
-            )
-            swipes = swipe_q.fetchall()
+                swipe_q = await session.execute(
+                    Swipe.__table__.select().where(Swipe.user_id == uid)
+                )
+                swipes = swipe_q.fetchall()
+                s.set(
+                    favorites=len(favs),
+                    dislikes=len(dis),
+                    statuses=len(statuses),
+                    swipes=len(swipes),
+                )
 
             # build sets of movie ids per type
             fav_ids = {row.movie_id for row in favs}
@@ -90,45 +174,115 @@ def recalc_taste_vector(user_id: str) -> None:
             )
             if not all_movie_ids:
                 profile.taste_vector = None
+                set_dense_taste(profile, None, {})
+                profile.mf_factors = None
+                profile.mf_version = None
+                with span("commit"):
+                    await session.commit()
+                return
+
+            with span("load_movies") as s:
+                movies_q = await session.execute(
+                    select(Movie.id, Movie.feature_ids).where(
+                        Movie.id.in_(list(all_movie_ids))
+                    )
+                )
+                movies = movies_q.all()
+                s.set(movies=len(movies))
+
+            # считаем на целочисленных feature id, в строки — только в конце
+            with span("accumulate"):
+                vocab = await load_feature_vocabulary(
+                    session,
+                    ids={fid for m in movies for fid in m.feature_ids or ()},
+                )
+                scores = accumulate_taste_scores(
+                    movies, vocab, fav_ids, dis_ids, status_map, swipe_map
+                )
+                profile.taste_vector = vocab.decode_taste(scores)
+                set_dense_taste(profile, await get_taste_layout(session), scores)
+            # факторы ALS без переобучения: fold-in по текущей модели
+            with span("fold_in"):
+                await factors.fold_in_profile(
+                    session,
+                    profile,
+                    {
+                        mid: interaction_strength(
+                            mid, fav_ids, dis_ids, status_map, swipe_map
+                        )
+                        for mid in all_movie_ids
+                    },
+                )
+            with span("commit"):
                 await session.commit()
+
+    import asyncio
+
+    asyncio.run(_run())
+
+
+@celery_app.task(queue="taste_update_queue")
+def rebuild_taste_vocabulary(
+    top_keywords: int | None = None,
+    n_buckets: int | None = None,
+    chunk_size: int = 500,
+    force: bool = False,
+) -> None:
+    """
+    Background job: freeze a new dense taste layout version (current top
+    keywords by doc_freq) and re-encode every profile's JSON taste vector
+    into it, in chunks. Scheduled by beat, it does nothing unless the
+    genres or top keywords changed (or `force`); nothing either while the
+    catalog has no genres.
+    """
+
+    async def _run() -> None:
+        async with SessionLocal() as session:
+            with span("freeze_layout") as s:
+                layout = await create_taste_vocabulary(
+                    session,
+                    top_keywords or settings.taste_top_keywords,
+                    n_buckets or settings.taste_hash_buckets,
+                    only_if_changed=not force,
+                )
+                s.set(changed=layout is not None)
+            if layout is None:
                 return
 
-            movies_q = await session.execute(
-                select(Movie).where(Movie.id.in_(list(all_movie_ids)))
-            )
-            movies = movies_q.scalars().all()
-
-            genre_scores: dict[str, float] = {}
-            keyword_scores: dict[str, float] = {}
-
-            def bump(counter: dict[str, float], items, weight: float) -> None:
-                for name in items or []:
-                    counter[name] = counter.get(name, 0.0) + weight
-
-            for m in movies:
-                mid = m.id
-                # base weights
-                if mid in fav_ids:
-                    bump(genre_scores, m.genres, 3.0)
-                    bump(keyword_scores, m.keywords, 2.0)
-                if mid in dis_ids:
-                    bump(genre_scores, m.genres, -2.0)
-                    bump(keyword_scores, m.keywords, -1.5)
-                if mid in status_map:
-                    status_val = status_map[mid]
-                    if status_val == "completed":
-                        bump(genre_scores, m.genres, 2.0)
-                    elif status_val == "watching":
-                        bump(genre_scores, m.genres, 1.0)
-                if mid in swipe_map and swipe_map[mid] == "like":
-                    bump(genre_scores, m.genres, 1.5)
-                    bump(keyword_scores, m.keywords, 1.0)
-
-            profile.taste_vector = {
-                "genres": genre_scores,
-                "keywords": keyword_scores,
-            }
-            await session.commit()
+            last_id = None
+            while True:
+                stmt = (
+                    select(Profile)
+                    .where(Profile.taste_vector.is_not(None))
+                    .order_by(Profile.id)
+                    .limit(chunk_size)
+                )
+                if last_id is not None:
+                    stmt = stmt.where(Profile.id > last_id)
+                with span("load_profiles") as s:
+                    profiles = (await session.scalars(stmt)).all()
+                    s.set(profiles=len(profiles))
+                if not profiles:
+                    break
+
+                with span("reencode", profiles=len(profiles)):
+                    genre_names: set[str] = set()
+                    keyword_names: set[str] = set()
+                    for p in profiles:
+                        names = taste_names(p.taste_vector)
+                        genre_names.update(names[GENRE])
+                        keyword_names.update(names[KEYWORD])
+                    vocab = await load_feature_vocabulary(
+                        session, genres=genre_names, keywords=keyword_names
+                    )
+
+                    for p in profiles:
+                        set_dense_taste(
+                            p, layout, vocab.encode_taste(p.taste_vector)
+                        )
+                with span("commit"):
+                    await session.commit()
+                last_id = profiles[-1].id
 
     import asyncio
 
@@ -151,10 +305,11 @@ def generate_movie_recommendations(user_id: str) -> None:
                 return
 
             # load profile + taste vector (ORM object, не Row)
-            prof_q = await session.execute(
-                select(Profile).where(Profile.user_id == uid)
-            )
-            profile = prof_q.scalar_one_or_none()
+            with span("load_profile"):
+                prof_q = await session.execute(
+                    select(Profile).where(Profile.user_id == uid)
+                )
+                profile = prof_q.scalar_one_or_none()
             if profile is None or not profile.taste_vector:
                 return
 
@@ -162,78 +317,217 @@ def generate_movie_recommendations(user_id: str) -> None:
 
             # get seen movie ids: считаем "просмотренными" только лайки и дизлайки,
             # чтобы всегда оставались кандидаты, даже если пользователь много свайпал/ставил статусы
-            fav_ids = {
-                row.movie_id
-                for row in (
-                    await session.execute(
-                        Favorite.__table__.select().where(Favorite.user_id == uid)
+            with span("seen_set") as s:
+                fav_ids = {
+                    row.movie_id
+                    for row in (
+                        await session.execute(
+                            Favorite.__table__.select().where(Favorite.user_id == uid)
+                        )
+                    ).fetchall()
+                }
+                dis_ids = {
+                    row.movie_id
+                    for row in (
+                        await session.execute(
+                            Dislike.__table__.select().where(Dislike.user_id == uid)
+                        )
+                    ).fetchall()
+                }
+
+                seen_ids = fav_ids | dis_ids
+                s.set(seen=len(seen_ids))
+
+            # candidate movies: топ по популярности, которых ещё не видел —
+            # из резидентного catalog store, без запроса к movies
+            with span("candidates") as s:
+                store = await get_catalog_store(session)
+                cand_rows = store.candidates(200, exclude=seen_ids)
+                s.set(candidates=len(cand_rows))
+
+            # второй источник кандидатов: "кто лайкал X, лайкал и Y" —
+            # соседи по co-occurrence избранного и последних лайков
+            with span("cooccurrence") as s:
+                liked_q = await session.execute(
+                    select(Swipe.movie_id)
+                    .where((Swipe.user_id == uid) & (Swipe.direction == "like"))
+                    .order_by(Swipe.created_at.desc())
+                    .limit(settings.cooc_max_seeds)
+                )
+                seeds = list(fav_ids) + [
+                    m for m in liked_q.scalars().all() if m not in fav_ids
+                ]
+                redis_client = get_redis_client()
+                try:
+                    cooc_scores = await cooccurrence.get_cooccurrence_scores(
+                        redis_client,
+                        seeds[: settings.cooc_max_seeds],
+                        settings.cooc_top_k,
                     )
-                ).fetchall()
-            }
-            dis_ids = {
-                row.movie_id
-                for row in (
-                    await session.execute(
-                        Dislike.__table__.select().where(Dislike.user_id == uid)
+                finally:
+                    # клиент привязан к event loop этого asyncio.run
+                    await close_redis()
+
+                known = {mid for mid, *_ in cand_rows}
+                cooc_ids = [
+                    UUID(mid)
+                    for mid, _ in sorted(
+                        cooc_scores.items(), key=lambda x: x[1], reverse=True
                     )
-                ).fetchall()
-            }
-
-            seen_ids = fav_ids | dis_ids
-
-            # candidate movies: топ по популярности, которых ещё не видел
-            cand_q = await session.execute(
-                Movie.__table__.select().order_by(Movie.popularity.desc()).limit(500)
-            )
-            all_cands = cand_q.fetchall()
-            candidates = [m for m in all_cands if m.id not in seen_ids][:200]
+                    if mid not in known and UUID(mid) not in seen_ids
+                ][: settings.cooc_candidates]
+                cand_rows += [store.candidate(row) for row in store.rows_of(cooc_ids)]
+                s.set(seeds=len(seeds), candidates=len(cooc_ids))
 
-            if not candidates:
+            if not cand_rows:
                 return
 
-            cand_payload = [
-                {
-                    "movie_id": str(m.id),
-                    "title": m.title,
-                    "overview": m.overview,
-                    "genres": m.genres or [],
-                    "keywords": m.keywords or [],
-                    "popularity": float(m.popularity or 0),
-                    "rating": float(m.rating or 0),
-                }
-                for m in candidates
-            ]
-
-            rankings = rank_movies_for_user(str(uid), taste_vector, cand_payload)
-
-            # upsert into AIRecommendation
-            for mid_str, score in rankings:
-                mid = UUID(mid_str)
-                rec_q = await session.execute(
-                    AIRecommendation.__table__.select().where(
-                        (AIRecommendation.user_id == uid)
-                        & (AIRecommendation.movie_id == mid)
+            with span("rank") as s:
+                layout, dense = await load_dense_taste(session, profile)
+                if dense is not None:
+                    rankings = rank_movies_dense(
+                        str(uid), layout, layout.ranker_weights(dense), cand_rows
                     )
-                )
-                existing = rec_q.scalar_one_or_none()
-                now = datetime.utcnow()
-                if existing:
-                    existing.score = score
-                    existing.generated_at = now
                 else:
-                    rec = AIRecommendation(
-                        user_id=uid, movie_id=mid, score=score, generated_at=now
+                    names = taste_names(taste_vector)
+                    vocab = await load_feature_vocabulary(
+                        session, genres=names[GENRE], keywords=names[KEYWORD]
+                    )
+                    rankings = rank_movies_encoded(
+                        str(uid), vocab.ranker_weights(taste_vector), cand_rows
+                    )
+                s.set(dense=dense is not None, ranked=len(rankings))
+            with span("blend"):
+                mf_scores = await factors.factor_scores(
+                    session, profile, [UUID(mid) for mid, _ in rankings]
+                )
+                rankings = blend_rankings(
+                    rankings,
+                    [
+                        (cooc_scores, settings.cooc_blend_weight),
+                        (mf_scores, settings.mf_blend_weight),
+                    ],
+                )
+
+            with span("load_movies"):
+                ranked_movies = await get_movies_by_ids(
+                    session, [UUID(mid) for mid, _ in rankings]
+                )
+            redis_client = get_redis_client()
+            try:
+                # LLM переставляет только голову списка; при ошибке или
+                # превышении бюджета остаётся локальный порядок
+                reranker = rerank.get_reranker(redis_client)
+                if reranker is not None:
+                    with span("rerank") as s:
+                        try:
+                            [rankings] = await rerank.rerank_heads(
+                                reranker,
+                                [(uid, taste_bucket(taste_vector), rankings)],
+                                {
+                                    str(m.id): rerank.rerank_candidate(m)
+                                    for m in ranked_movies
+                                },
+                                settings.rerank_top_n,
+                            )
+                        finally:
+                            await reranker.aclose()
+                        s.set(**reranker.stats)
+
+                # новое поколение + переключение указателя одной транзакцией
+                with span("write_generation"):
+                    generation = await write_recommendation_generation(
+                        session, uid, rankings
                     )
-                    session.add(rec)
 
-            await session.commit()
+                # публикуем ранжирование в Redis для GET /movies/recommendations
+                with span("publish"):
+                    await rec_cache.publish_recommendations(
+                        redis_client,
+                        uid,
+                        generation,
+                        rankings,
+                        ranked_movies,
+                        ttl=settings.recs_cache_ttl_seconds,
+                        card_ttl=settings.movie_card_ttl_seconds,
+                    )
+            finally:
+                await close_redis()
 
     import asyncio
-    from datetime import datetime
+
+    from src.app.redis import close_redis, get_redis_client
 
     asyncio.run(_run())
 
 
+@celery_app.task(queue="batch_recommendation_queue")
+def regenerate_all_recommendations(n_shards: int | None = None) -> int:
+    """
+    Scheduled job (celery beat): fan the nightly regeneration of stale
+    recommendations out into one task per profile-id shard.
+    """
+    n_shards = n_shards or settings.batch_rank_shards
+    for shard in range(n_shards):
+        regenerate_recommendations_shard.delay(shard, n_shards)
+    return n_shards
+
+
+@celery_app.task(queue="batch_recommendation_queue")
+def regenerate_recommendations_shard(shard: int, n_shards: int) -> dict:
+    """
+    Background job: rank every stale profile of one shard in chunks with
+    rank_movies_for_users and bulk-write new generations.
+    """
+
+    async def _run() -> dict:
+        redis_client = get_redis_client()
+        reranker = rerank.get_reranker(redis_client)
+        try:
+            async with SessionLocal() as session:
+                return await batch_recommendations.regenerate_shard(
+                    session,
+                    redis_client,
+                    shard,
+                    n_shards,
+                    chunk=settings.batch_rank_chunk,
+                    pool=settings.batch_rank_pool,
+                    k=settings.batch_rank_top_k,
+                    min_age=timedelta(seconds=settings.batch_rank_min_age_seconds),
+                    ttl=settings.recs_cache_ttl_seconds,
+                    card_ttl=settings.movie_card_ttl_seconds,
+                    reranker=reranker,
+                    rerank_top_n=settings.rerank_top_n,
+                )
+        finally:
+            if reranker is not None:
+                await reranker.aclose()
+            await close_redis()
+
+    import asyncio
+    from datetime import timedelta
+
+    from src.app.redis import close_redis, get_redis_client
+
+    return asyncio.run(_run())
+
+
+@celery_app.task(queue="movie_recommendation_queue")
+def prune_recommendations() -> int:
+    """
+    Scheduled job (celery beat): bulk-delete replaced recommendation
+    generations.
+    """
+
+    async def _run() -> int:
+        async with SessionLocal() as session:
+            return await prune_recommendation_generations(session)
+
+    import asyncio
+
+    return asyncio.run(_run())
+
+
 @celery_app.task(queue="friend_match_queue")
 def calculate_friend_match(user_a_id: str, user_b_id: str) -> None:
     """
@@ -251,15 +545,17 @@ def calculate_friend_match(user_a_id: str, user_b_id: str) -> None:
             except ValueError:
                 return
 
-            # load profiles
-            pa_q = await session.execute(
-                Profile.__table__.select().where(Profile.user_id == ua)
-            )
-            pa = pa_q.scalar_one_or_none()
-            pb_q = await session.execute(
-                Profile.__table__.select().where(Profile.user_id == ub)
-            )
-            pb = pb_q.scalar_one_or_none()
+            # load profiles (ORM objects: scalar_one_or_none() on a Core
+            # table select would only return the id column)
+            with span("load_profiles"):
+                pa_q = await session.execute(
+                    select(Profile).where(Profile.user_id == ua)
+                )
+                pa = pa_q.scalar_one_or_none()
+                pb_q = await session.execute(
+                    select(Profile).where(Profile.user_id == ub)
+                )
+                pb = pb_q.scalar_one_or_none()
 
             if pa is None or pb is None:
                 return
@@ -269,23 +565,25 @@ def calculate_friend_match(user_a_id: str, user_b_id: str) -> None:
             taste_b = pb.taste_vector or {}
 
             # common favorites
-            fa = {
-                row.movie_id
-                for row in (
-                    await session.execute(
-                        Favorite.__table__.select().where(Favorite.user_id == ua)
-                    )
-                ).fetchall()
-            }
-            fb = {
-                row.movie_id
-                for row in (
-                    await session.execute(
-                        Favorite.__table__.select().where(Favorite.user_id == ub)
-                    )
-                ).fetchall()
-            }
-            common_favs = list(fa & fb)
+            with span("common_favorites") as s:
+                fa = {
+                    row.movie_id
+                    for row in (
+                        await session.execute(
+                            Favorite.__table__.select().where(Favorite.user_id == ua)
+                        )
+                    ).fetchall()
+                }
+                fb = {
+                    row.movie_id
+                    for row in (
+                        await session.execute(
+                            Favorite.__table__.select().where(Favorite.user_id == ub)
+                        )
+                    ).fetchall()
+                }
+                common_favs = list(fa & fb)
+                s.set(common=len(common_favs))
 
             payload = {
                 "taste_a": taste_a,
@@ -293,19 +591,49 @@ def calculate_friend_match(user_a_id: str, user_b_id: str) -> None:
                 "common_favorites_count": len(common_favs),
             }
 
-            score = rank_friend_match_for_users(
-                str(ua),
-                str(ub),
-                payload,
-            )
+            with span("load_dense_taste"):
+                layout_a, dense_a = await load_dense_taste(session, pa)
+                layout_b, dense_b = await load_dense_taste(session, pb)
+            if dense_a is not None and dense_b is not None and (
+                layout_a.version == layout_b.version
+            ):
+                payload.update(
+                    dense_a=dense_a,
+                    dense_b=dense_b,
+                    genre_dims=layout_a.n_genres,
+                )
 
-            await upsert_match_score(session, ua, ub, float(score))
+            with span("score") as s:
+                score = rank_friend_match_for_users(
+                    str(ua),
+                    str(ub),
+                    payload,
+                )
+                s.set(score=float(score))
+
+            with span("write_score"):
+                await upsert_match_score(session, ua, ub, float(score))
 
     import asyncio
 
     asyncio.run(_run())
 
 
+async def _upsert_tmdb_results(
+    session: AsyncSession, items: list[dict]
+) -> None:
+    """
+    Pull details + keywords of TMDB list results and upsert each movie.
+    """
+    for item in items:
+        movie_id = item["id"]
+        with span("fetch_details", tmdb_id=movie_id):
+            details = tmdb_client.fetch_movie_details(movie_id)
+            keywords = tmdb_client.fetch_movie_keywords(movie_id)
+        with span("upsert", tmdb_id=movie_id):
+            await upsert_movie_from_tmdb(session, details, keywords)
+
+
 @celery_app.task(queue="tmdb_sync_queue")
 def sync_tmdb_movies(pages: int = 3) -> None:
     """
@@ -320,20 +648,37 @@ def sync_tmdb_movies(pages: int = 3) -> None:
         async with SessionLocal() as session:
             # Popular movies
             for page in range(1, pages + 1):
-                popular = tmdb_client.fetch_popular_movies(page=page)
-                for item in popular.get("results", []):
-                    movie_id = item["id"]
-                    details = tmdb_client.fetch_movie_details(movie_id)
-                    keywords = tmdb_client.fetch_movie_keywords(movie_id)
-                    await upsert_movie_from_tmdb(session, details, keywords)
+                with span("fetch_popular", page=page):
+                    popular = tmdb_client.fetch_popular_movies(page=page)
+                await _upsert_tmdb_results(session, popular.get("results", []))
 
             # Trending movies (day)
-            trending = tmdb_client.fetch_trending_movies(window="day")
-            for item in trending.get("results", []):
-                movie_id = item["id"]
-                details = tmdb_client.fetch_movie_details(movie_id)
-                keywords = tmdb_client.fetch_movie_keywords(movie_id)
-                await upsert_movie_from_tmdb(session, details, keywords)
+            with span("fetch_trending"):
+                trending = tmdb_client.fetch_trending_movies(window="day")
+            await _upsert_tmdb_results(session, trending.get("results", []))
+
+    import asyncio
+
+    asyncio.run(_run())
+
+
+@celery_app.task(queue="tmdb_sync_queue")
+def ingest_tmdb_search(query: str, max_results: int = 5) -> None:
+    """
+    Background job: fallback for GET /movies/search.
+
+    When the local catalog has too few hits for a query, pull the top
+    TMDB search results and upsert them so the next search finds them.
+    """
+
+    async def _run() -> None:
+        async with SessionLocal() as session:
+            with span("search") as s:
+                found = tmdb_client.search_movie(query)
+                s.set(results=len(found.get("results", [])))
+            await _upsert_tmdb_results(
+                session, found.get("results", [])[:max_results]
+            )
 
     import asyncio
 
@@ -358,14 +703,11 @@ def sync_tmdb_movies_full(
         async with SessionLocal() as session:
             for year in range(start_year, end_year + 1):
                 for page in range(1, pages_per_year + 1):
-                    data = tmdb_client.discover_movies_by_year(
-                        year=year, page=page
-                    )
-                    for item in data.get("results", []):
-                        movie_id = item["id"]
-                        details = tmdb_client.fetch_movie_details(movie_id)
-                        keywords = tmdb_client.fetch_movie_keywords(movie_id)
-                        await upsert_movie_from_tmdb(session, details, keywords)
+                    with span("discover", year=year, page=page):
+                        data = tmdb_client.discover_movies_by_year(
+                            year=year, page=page
+                        )
+                    await _upsert_tmdb_results(session, data.get("results", []))
 
     import asyncio
 
@@ -387,50 +729,252 @@ def prepare_swipe_batch(user_id: str) -> None:
                 return
 
             # 1. Get all movie IDs the user has already interacted with
-            swipe_q = await session.execute(
-                select(Swipe.movie_id).where(Swipe.user_id == uid)
-            )
-            fav_q = await session.execute(
-                select(Favorite.movie_id).where(Favorite.user_id == uid)
-            )
-            dislike_q = await session.execute(
-                select(Dislike.movie_id).where(Dislike.user_id == uid)
-            )
-            seen_ids = {
-                *swipe_q.scalars().all(),
-                *fav_q.scalars().all(),
-                *dislike_q.scalars().all(),
-            }
+            with span("seen_set") as s:
+                swipe_q = await session.execute(
+                    select(Swipe.movie_id).where(Swipe.user_id == uid)
+                )
+                fav_q = await session.execute(
+                    select(Favorite.movie_id).where(Favorite.user_id == uid)
+                )
+                dislike_q = await session.execute(
+                    select(Dislike.movie_id).where(Dislike.user_id == uid)
+                )
+                seen_ids = {
+                    *swipe_q.scalars().all(),
+                    *fav_q.scalars().all(),
+                    *dislike_q.scalars().all(),
+                }
+                s.set(seen=len(seen_ids))
 
             # 2. Get the user's top recommendations
-            rec_q = await session.execute(
-                select(AIRecommendation)
-                .where(AIRecommendation.user_id == uid)
-                .order_by(AIRecommendation.score.desc())
-                .limit(100)
-            )
-            recommendations = rec_q.scalars().all()
+            with span("load_recommendations") as s:
+                rec_q = await session.execute(
+                    select(AIRecommendation)
+                    .where(active_recommendations(uid))
+                    .order_by(AIRecommendation.score.desc())
+                    .limit(100)
+                )
+                recommendations = rec_q.scalars().all()
+                s.set(recommendations=len(recommendations))
 
             # 3. Filter out seen movies and take the top 20
             unseen_recs = [rec.movie_id for rec in recommendations if rec.movie_id not in seen_ids]
             batch = unseen_recs[:20]
 
+            # 3b. Not enough recommendations yet (new user): top up with
+            # popular unseen movies from the resident catalog store
+            if len(batch) < 20:
+                with span("popular_fill") as s:
+                    store = await get_catalog_store(session)
+                    batch += [
+                        store.movie_id(row)
+                        for row in store.top_popular(
+                            20 - len(batch), exclude=seen_ids | set(batch)
+                        )
+                    ]
+                    s.set(batch=len(batch))
+
             if not batch:
                 return
 
             # 4. Store the batch in Redis
             redis_client = get_redis_client()
             redis_key = f"swipe_batch:{user_id}"
-            
+
             # Use a pipeline to clear the old list and add the new one atomically
-            async with redis_client.pipeline() as pipe:
-                pipe.delete(redis_key)
-                # str(m_id) is important because Redis stores strings
-                pipe.rpush(redis_key, *[str(m_id) for m_id in batch])
-                await pipe.execute()
+            try:
+                with span("publish"):
+                    async with redis_client.pipeline() as pipe:
+                        pipe.delete(redis_key)
+                        # str(m_id) is important because Redis stores strings
+                        pipe.rpush(redis_key, *[str(m_id) for m_id in batch])
+                        await pipe.execute()
+            finally:
+                # клиент привязан к event loop этого asyncio.run
+                await close_redis()
 
     import asyncio
-    from src.app.redis import get_redis_client
+    from src.app.redis import close_redis, get_redis_client
 
     asyncio.run(_run())
 
+
+@celery_app.task(queue="catalog_queue")
+def refresh_catalog_facets() -> None:
+    """
+    Scheduled job (celery beat): recompute genre/decade facet counts and
+    cache them in Redis, so browse screens never aggregate at request time.
+    Also refreshes the document frequencies of the feature vocabulary.
+    """
+
+    async def _run() -> None:
+        async with SessionLocal() as session:
+            with span("facets"):
+                facets = await compute_catalog_facets(session)
+            with span("doc_freq"):
+                await refresh_feature_doc_freq(session)
+
+        redis_client = get_redis_client()
+        try:
+            with span("publish"):
+                await redis_client.set(CATALOG_FACETS_KEY, json.dumps(facets))
+        finally:
+            # клиент привязан к event loop этого asyncio.run
+            await close_redis()
+
+    import asyncio
+    from src.app.redis import close_redis, get_redis_client
+
+    asyncio.run(_run())
+
+
+@celery_app.task(queue="catalog_queue")
+def build_catalog_snapshot() -> str | None:
+    """
+    Scheduled job (celery beat): export the catalog store into a new
+    memory-mapped snapshot and publish it; workers remap on their next
+    task. Returns the published version.
+    """
+    if not settings.catalog_snapshot_dir:
+        return None
+
+    async def _run() -> CatalogStore:
+        async with SessionLocal() as session:
+            # fresh store: a full load, never the process-wide one
+            return await refresh_catalog_store(session, CatalogStore())
+
+    import asyncio
+
+    with span("load_store") as s:
+        store = asyncio.run(_run())
+        s.set(movies=len(store))
+    with span("write_snapshot") as s:
+        version = write_catalog_snapshot(store, settings.catalog_snapshot_dir)
+        s.set(version=version)
+    catalog_snapshot.reload()
+    return version
+
+
+@celery_app.task(queue="catalog_queue")
+def build_movie_embeddings() -> dict:
+    """
+    Scheduled job (celery beat): TF-IDF + SVD content embeddings for the
+    whole catalog and the precomputed similar-movies table. The API picks
+    up the new version on its next index refresh.
+    """
+
+    async def _run() -> dict:
+        async with SessionLocal() as session:
+            return await similar.build_movie_embeddings(
+                session,
+                n_components=settings.similar_embedding_dim,
+                precompute_top=settings.similar_precompute_top,
+                top_k=settings.similar_top_k,
+            )
+
+    import asyncio
+
+    return asyncio.run(_run())
+
+
+@celery_app.task(queue="catalog_queue")
+def train_factor_model() -> dict:
+    """
+    Scheduled job (celery beat): retrain the ALS model on all interactions
+    and refresh every trained user's factors.
+    """
+
+    async def _run() -> dict:
+        async with SessionLocal() as session:
+            return await factors.train_factor_model(
+                session,
+                factors=settings.mf_factors,
+                reg=settings.mf_reg,
+                alpha=settings.mf_alpha,
+                iterations=settings.mf_iterations,
+                cg_steps=settings.mf_cg_steps,
+            )
+
+    import asyncio
+
+    return asyncio.run(_run())
+
+
+@celery_app.task(queue="cooccurrence_queue")
+def record_cooccurrence(user_id: str, movie_id: str) -> bool:
+    """
+    Background job: count a favorite / like-swipe into the co-occurrence
+    counters (idempotent per user and movie).
+    """
+
+    async def _run() -> bool:
+        redis_client = get_redis_client()
+        try:
+            return await cooccurrence.record_like(
+                redis_client, UUID(user_id), UUID(movie_id)
+            )
+        finally:
+            await close_redis()
+
+    import asyncio
+    from src.app.redis import close_redis, get_redis_client
+
+    return asyncio.run(_run())
+
+
+@celery_app.task(queue="cooccurrence_queue")
+def materialize_cooccurrence(max_batches: int = 20) -> int:
+    """
+    Scheduled job (celery beat): normalize the counts of movies that got
+    new likes into their per-movie top-k lists.
+    """
+
+    async def _run() -> int:
+        redis_client = get_redis_client()
+        total = 0
+        try:
+            for _ in range(max_batches):
+                with span("materialize_batch") as s:
+                    done = await cooccurrence.materialize_dirty(
+                        redis_client,
+                        k=settings.cooc_top_k,
+                        method=settings.cooc_method,
+                    )
+                    s.set(movies=done)
+                total += done
+                if done == 0:
+                    break
+        finally:
+            await close_redis()
+        return total
+
+    import asyncio
+    from src.app.redis import close_redis, get_redis_client
+
+    return asyncio.run(_run())
+
+
+@celery_app.task(queue="cooccurrence_queue")
+def rebuild_cooccurrence() -> dict:
+    """
+    Scheduled job (celery beat): exact rebuild of the co-occurrence
+    counters and top-k lists from favorites and like-swipes.
+    """
+
+    async def _run() -> dict:
+        redis_client = get_redis_client()
+        try:
+            async with SessionLocal() as session:
+                return await cooccurrence.rebuild_cooccurrence(
+                    session,
+                    redis_client,
+                    k=settings.cooc_top_k,
+                    method=settings.cooc_method,
+                )
+        finally:
+            await close_redis()
+
+    import asyncio
+    from src.app.redis import close_redis, get_redis_client
+
+    return asyncio.run(_run())
@@ -0,0 +1,590 @@
+"""
+Lightweight stage spans for Celery tasks and the API requests that
+enqueue them.
+
+    with span("candidates") as s:
+        rows = store.candidates(200, exclude=seen_ids)
+        s.set(candidates=len(rows))
+
+Spans nest through a ContextVar, which asyncio.run and SQLAlchemy's
+greenlets carry into the task body, so stage spans become children of
+the task span. A trace starts at the HTTP request (TracingMiddleware,
+continuing an incoming W3C `traceparent`), travels to the worker in the
+task message's `traceparent` header and continues in a task span named
+after the task. Child spans copy `user_id`, `task_id` and `task` from
+their parent, so any stage can be filtered by user or task on its own.
+
+Finished spans go to the exporter chosen by TRACING_EXPORTER:
+
+    ""        off; span() yields a shared no-op span
+    "memory"  InMemoryExporter (tests, eager tasks, notebooks)
+    "file"    JSON lines in TRACING_FILE (src.scripts.trace_report reads it)
+    "otlp"    OTLP/HTTP JSON to TRACING_OTLP_ENDPOINT: an OpenTelemetry
+              collector, Jaeger or Tempo, without the OpenTelemetry SDK
+
+The file and OTLP exporters write from a background thread, so
+exporting never blocks the event loop or a task.
+"""
+
+import abc
+import atexit
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Iterator, Protocol
+
+import httpx
+from celery import signals
+
+logger = logging.getLogger(__name__)
+
+# attributes a child span copies from its parent
+CORRELATED = ("user_id", "task_id", "task")
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "kind",
+        "sampled",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None,
+        sampled: bool,
+        kind: str = "internal",
+        attributes: dict[str, Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        # wall clock: spans of one trace come from different processes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    @property
+    def traceparent(self) -> str:
+        flags = "01" if self.sampled else "00"
+        return f"00-{self.trace_id}-{self.span_id}-{flags}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan(Span):
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan("noop", "0" * 32, None, False)
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """
+    (trace_id, parent span id, sampled) of a W3C traceparent header.
+    """
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+# Exporters ----------------------------------------------------------------
+
+
+class Exporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+    def flush(self, timeout: float = 5.0) -> None: ...
+
+
+class InMemoryExporter:
+    def __init__(self, max_spans: int = 10_000) -> None:
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+
+    def flush(self, timeout: float = 5.0) -> None:
+        pass
+
+    def spans(self, name: str | None = None, trace_id: str | None = None) -> list[Span]:
+        return [
+            s
+            for s in list(self._spans)
+            if (name is None or s.name == name)
+            and (trace_id is None or s.trace_id == trace_id)
+        ]
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+
+class _BackgroundExporter(abc.ABC):
+    """
+    Queues finished spans for a daemon thread that writes them in
+    batches. The thread is started lazily per process: Celery prefork
+    children do not inherit the parent's.
+    """
+
+    def __init__(
+        self, batch_size: int = 512, interval: float = 0.5, max_queue: int = 20_000
+    ) -> None:
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: queue.Queue[Span] = queue.Queue(maxsize=max_queue)
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> None:
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # a forked copy may hold the parent's pending spans
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            threading.Thread(
+                target=self._loop, name=type(self).__name__, daemon=True
+            ).start()
+
+    def _loop(self) -> None:
+        spans = self._queue
+        while True:
+            batch = [spans.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(spans.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                logger.warning(
+                    "dropping %d spans: export failed", len(batch), exc_info=True
+                )
+            for _ in batch:
+                spans.task_done()
+
+    @abc.abstractmethod
+    def _write(self, batch: list[Span]) -> None:
+        """
+        Deliver one batch; runs on the exporter thread.
+        """
+
+
+class FileExporter(_BackgroundExporter):
+    """
+    One JSON object per span; every process appends to the same file.
+    """
+
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+
+    def _write(self, batch: list[Span]) -> None:
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            for s in batch:
+                # one write per line keeps lines of concurrent writers whole
+                os.write(fd, (json.dumps(s.to_dict(), default=str) + "\n").encode())
+        finally:
+            os.close(fd)
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+def otlp_payload(spans: list[Span], service_name: str) -> dict[str, Any]:
+    """
+    ExportTraceServiceRequest in the OTLP/HTTP JSON encoding.
+    """
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes(
+                        {"service.name": service_name, "process.pid": os.getpid()}
+                    )
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [
+                            {
+                                "traceId": s.trace_id,
+                                "spanId": s.span_id,
+                                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                                "name": s.name,
+                                "kind": _OTLP_KINDS.get(s.kind, 1),
+                                "startTimeUnixNano": str(s.start_ns),
+                                "endTimeUnixNano": str(s.end_ns),
+                                "attributes": _otlp_attributes(s.attributes),
+                                "status": (
+                                    {"code": 2, "message": s.error}
+                                    if s.error
+                                    else {"code": 1}
+                                ),
+                            }
+                            for s in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class OTLPExporter(_BackgroundExporter):
+    def __init__(
+        self, endpoint: str, service_name: str, timeout: float = 5.0, **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        self._client: httpx.Client | None = None
+
+    def _write(self, batch: list[Span]) -> None:
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        response = self._client.post(
+            self.endpoint, json=otlp_payload(batch, self.service_name)
+        )
+        response.raise_for_status()
+
+
+_exporter: Exporter | None = None
+_configured = False
+
+
+def configure(exporter: Exporter | None) -> None:
+    """
+    Replace the exporter chosen from settings (None turns tracing off).
+    """
+    global _exporter, _configured
+    _exporter, _configured = exporter, True
+
+
+def get_exporter() -> Exporter | None:
+    global _exporter, _configured
+    if not _configured:
+        from src.app.config import get_settings
+
+        settings = get_settings()
+        kind = settings.tracing_exporter
+        if kind == "memory":
+            _exporter = InMemoryExporter()
+        elif kind == "file":
+            _exporter = FileExporter(settings.tracing_file)
+        elif kind == "otlp":
+            _exporter = OTLPExporter(
+                settings.tracing_otlp_endpoint, settings.tracing_service_name
+            )
+        elif kind:
+            raise ValueError(f"unknown TRACING_EXPORTER {kind!r}")
+        _configured = True
+    return _exporter
+
+
+def _sample_rate() -> float:
+    from src.app.config import get_settings
+
+    return get_settings().tracing_sample_rate
+
+
+# Spans --------------------------------------------------------------------
+
+
+def start_span(
+    name: str,
+    traceparent: str | None = None,
+    kind: str = "internal",
+    **attributes: Any,
+) -> Span:
+    """
+    New span under `traceparent` if given, else under the current span,
+    else a new trace. Pair with end_span(); span() does both.
+    """
+    if get_exporter() is None:
+        return NOOP_SPAN
+    remote = parse_traceparent(traceparent)
+    parent = current_span.get()
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    elif parent is not None and parent is not NOOP_SPAN:
+        trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        inherited = {k: parent.attributes[k] for k in CORRELATED if k in parent.attributes}
+        attributes = {**inherited, **attributes}
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+        sampled = random.random() < _sample_rate()
+    return Span(name, trace_id, parent_id, sampled, kind, attributes)
+
+
+def end_span(span: Span, error: BaseException | str | None = None) -> None:
+    if span is NOOP_SPAN:
+        return
+    span.end_ns = time.time_ns()
+    if isinstance(error, BaseException):
+        error = f"{type(error).__name__}: {error}"
+    if error:
+        span.error = error
+    exporter = get_exporter()
+    if span.sampled and exporter is not None:
+        exporter.export(span)
+
+
+@contextmanager
+def span(
+    name: str,
+    traceparent: str | None = None,
+    kind: str = "internal",
+    **attributes: Any,
+) -> Iterator[Span]:
+    """
+    Time the block as a span that is current inside it; an exception
+    escaping the block marks the span as failed.
+    """
+    s = start_span(name, traceparent, kind, **attributes)
+    if s is NOOP_SPAN:
+        yield s
+        return
+    token = current_span.set(s)
+    error: BaseException | None = None
+    try:
+        yield s
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        current_span.reset(token)
+        end_span(s, error)
+
+
+def set_attributes(**attributes: Any) -> None:
+    """
+    Add attributes to the current span, if any (e.g. user_id once the
+    request is authenticated).
+    """
+    s = current_span.get()
+    if s is not None:
+        s.set(**attributes)
+
+
+def flush(timeout: float = 5.0) -> None:
+    exporter = _exporter
+    if exporter is not None:
+        exporter.flush(timeout)
+
+
+atexit.register(flush)
+
+
+# HTTP ---------------------------------------------------------------------
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: one server span per request, named after the
+    route template; sampled responses carry an `x-trace-id` header.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or get_exporter() is None:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1")
+        method = scope["method"]
+        status = 500
+
+        with span(
+            f"{method} {scope['path']}", traceparent, "server", http_method=method
+        ) as s:
+
+            async def send_wrapper(message) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if s.sampled:
+                        message = {
+                            **message,
+                            "headers": [
+                                *message.get("headers", []),
+                                (b"x-trace-id", s.trace_id.encode()),
+                            ],
+                        }
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # FastAPI leaves the matched route in the scope
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    s.name = f"{method} {route}"
+                s.set(http_route=route or "unmatched", http_status=status)
+                if status >= 500:
+                    s.error = f"HTTP {status}"
+
+
+# Celery -------------------------------------------------------------------
+
+_task_spans: dict[str, tuple[Span, Token]] = {}
+
+
+def task_user_id(task, args, kwargs) -> str | None:
+    try:
+        arguments = (
+            inspect.signature(task.run)
+            .bind_partial(*(args or ()), **(kwargs or {}))
+            .arguments
+        )
+    except (TypeError, ValueError):
+        return None
+    user_id = arguments.get("user_id") or arguments.get("user_a_id")
+    return str(user_id) if user_id else None
+
+
+def _header(task, name: str) -> str | None:
+    request = task.request
+    value = getattr(request, name, None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get(name)
+    return value
+
+
+@signals.before_task_publish.connect
+def _inject_traceparent(headers: dict[str, Any] | None = None, **_) -> None:
+    s = current_span.get()
+    if headers is not None and s is not None and s is not NOOP_SPAN:
+        headers.setdefault("traceparent", s.traceparent)
+
+
+@signals.task_prerun.connect
+def _start_task_span(task_id: str, task, args=None, kwargs=None, **_) -> None:
+    if get_exporter() is None:
+        return
+    attributes: dict[str, Any] = {"task_id": task_id, "task": task.name}
+    user_id = task_user_id(task, args, kwargs)
+    if user_id is not None:
+        attributes["user_id"] = user_id
+    s = start_span(
+        task.name.rsplit(".", 1)[-1],
+        _header(task, "traceparent"),
+        "consumer",
+        **attributes,
+    )
+    _task_spans[task_id] = (s, current_span.set(s))
+
+
+@signals.task_failure.connect
+def _record_task_failure(task_id: str | None = None, exception=None, **_) -> None:
+    entry = _task_spans.get(task_id or "")
+    if entry is not None and exception is not None:
+        entry[0].error = f"{type(exception).__name__}: {exception}"
+
+
+@signals.task_postrun.connect
+def _end_task_span(task_id: str, state: str | None = None, **_) -> None:
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    s, token = entry
+    try:
+        current_span.reset(token)
+    except ValueError:
+        # prerun ran in another context (should not happen in a worker)
+        pass
+    s.set(task_state=state or "UNKNOWN")
+    end_span(s, None if state in (None, "SUCCESS") else s.error or state)
+
+
+@signals.worker_process_shutdown.connect
+def _flush_spans(**_) -> None:
+    # prefork children leave with os._exit, skipping atexit
+    flush()
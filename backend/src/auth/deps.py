@@ -8,6 +8,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.config import get_settings
 from src.app.db import get_async_db
+from src.app.profiling import annotate
+from src.app.tracing import set_attributes
 from src.auth.crud import get_user_by_id
 from src.auth.models import User
 
@@ -15,6 +17,26 @@ settings = get_settings()
 security_scheme = HTTPBearer(auto_error=False)
 
 
+def user_id_from_authorization(authorization: str | None) -> UUID | None:
+    """
+    id пользователя из заголовка `Authorization: Bearer <jwt>` без
+    обращения к БД; None, если токена нет или он невалиден.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(
+            token,
+            settings.jwt_secret,
+            algorithms=[settings.jwt_algorithm],
+            options={"verify_aud": False},
+        )
+        return UUID(payload["sub"])
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError):
+        return None
+
+
 async def get_current_user(
     credentials: Annotated[
         HTTPAuthorizationCredentials | None, Depends(security_scheme)
@@ -66,6 +88,9 @@ async def get_current_user(
             detail="User not found",
         )
 
+    # span запроса в трейсе и профиль запроса — с id пользователя
+    set_attributes(user_id=str(user.id))
+    annotate(user_id=str(user.id))
     return user
 
 
@@ -1,7 +1,8 @@
 import uuid
 from datetime import datetime, timedelta
 
-from sqlalchemy import Column, Date, DateTime, ForeignKey, Text
+from sqlalchemy import (BigInteger, Column, Date, DateTime, ForeignKey,
+                        Integer, LargeBinary, Text)
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 
@@ -37,6 +38,15 @@ class Profile(Base):
     birthdate = Column(Date, nullable=True)
     # JSON taste vector for recommendations (genres/keywords/embeddings)
     taste_vector = Column(JSONB, nullable=True)
+    # same taste as little-endian float32 bytes over taste_vocabularies
+    # version `taste_dense_version` (see src.ai.taste.DenseTasteLayout)
+    taste_dense = Column(LargeBinary, nullable=True)
+    taste_dense_version = Column(Integer, nullable=True)
+    # ALS user factors (little-endian float32) for factor_models `mf_version`
+    mf_factors = Column(LargeBinary, nullable=True)
+    mf_version = Column(Integer, nullable=True)
+    # live ai_recommendations generation (see generate_movie_recommendations)
+    rec_generation = Column(BigInteger, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="profile")
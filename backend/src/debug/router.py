@@ -0,0 +1,67 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from src.app.config import get_settings
+from src.app.profiling import TOKEN_HEADER, get_capture_store
+
+settings = get_settings()
+
+router = APIRouter()
+
+
+async def require_admin_token(
+    token: str | None = Header(default=None, alias=TOKEN_HEADER),
+) -> None:
+    """
+    Доступ только с PROFILING_ADMIN_TOKEN; без настроенного токена
+    эндпоинтов как будто нет.
+    """
+    if not settings.profiling_admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not secrets.compare_digest(
+        token.encode(), settings.profiling_admin_token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin_token)])
+async def list_profiles(
+    kind: str | None = Query(None, pattern="^(http|task)$"),
+    name: str | None = Query(
+        None, description='"GET /friends/suggestions" или имя задачи'
+    ),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Список сохранённых профилей (новые первыми) с метаданными:
+    маршрут/задача, пользователь, статус, длительность, trace id.
+    """
+    return get_capture_store().list(limit=limit, kind=kind, name=name)
+
+
+@router.get("/profiles/{capture_id}", dependencies=[Depends(require_admin_token)])
+async def download_profile(
+    capture_id: str,
+    format: str = Query("prof", pattern="^(prof|text)$"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$"),
+):
+    """
+    Скачать профиль: pstats-файл (snakeviz / tuna / flameprof) или
+    текстовую таблицу pstats при format=text.
+    """
+    store = get_capture_store()
+    if format == "text":
+        text = store.text(capture_id, sort=sort)
+        if text is None:
+            raise HTTPException(status_code=404, detail="Capture not found")
+        return PlainTextResponse(text)
+    path = store.profile_path(capture_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"{capture_id}.prof",
+    )
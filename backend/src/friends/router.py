@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import and_, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.app.db import get_async_db
+from src.app.db import get_async_db, get_async_read_db
 from src.app.tasks import calculate_friend_match
 from src.auth.deps import get_current_user
 from src.auth.models import Profile, User
@@ -12,6 +12,7 @@ from src.friends import crud
 from src.friends.models import Friend, MatchScore
 from src.friends.schema import (FriendCreate, FriendOut, FriendSuggestionOut,
                                 MatchScoreOut)
+from src.profiles.crud import load_dense_taste
 
 router = APIRouter()
 
@@ -19,7 +20,7 @@ router = APIRouter()
 @router.get("/", response_model=list[FriendOut])
 async def list_friends(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Список друзей для текущего авторизованного пользователя.
@@ -30,7 +31,7 @@ async def list_friends(
 @router.get("/requests", response_model=list[FriendOut])
 async def list_friend_requests(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Входящие запросы в друзья для текущего пользователя.
@@ -118,7 +119,7 @@ async def block_friend(
 @router.get("/suggestions", response_model=list[FriendSuggestionOut])
 async def friend_suggestions(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Рекомендации / рейтинг «совместимости» друзей для текущего пользователя.
@@ -177,7 +178,12 @@ async def friend_suggestions(
         prof = prof_res.scalar_one_or_none()
 
         top_genres: list[str] = []
-        if prof and prof.taste_vector:
+        layout, dense = (
+            await load_dense_taste(db, prof) if prof else (None, None)
+        )
+        if dense is not None:
+            top_genres = layout.top_genres(dense, 3)
+        elif prof and prof.taste_vector:
             genres = prof.taste_vector.get("genres") or {}
             top_genres = [
                 g for g, _ in sorted(
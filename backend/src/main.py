@@ -1,61 +1,136 @@
-from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy import text
-from sqlalchemy.exc import OperationalError
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse
 
 from src.app.config import get_settings
-from src.app.db import get_async_db
-from src.app.redis import close_redis, get_redis_client
-from src.app.tasks import celery_app
+from src.app.db import engine, prewarm_pool, read_engine
+from src.app.health import make_health_checker
+from src.app.metrics import PrometheusMiddleware, render
+from src.app.profiling import ProfilingMiddleware
+from src.app.querycount import QueryCountMiddleware
+from src.app.replica import ReadYourWritesMiddleware
+from src.app.redis import close_redis
+from src.app.tracing import TracingMiddleware
 from src.auth.router import router as auth_router
+from src.debug.router import router as debug_router
 from src.friends.router import router as friends_router
+from src.movies.autocomplete import run_title_index_refresher
 from src.movies.router import router as movies_router
+from src.movies.similar import run_similar_index_refresher
 from src.profiles.router import router as profiles_router
 
 settings = get_settings()
 
 app = FastAPI(title=settings.app_name)
+health_checker = make_health_checker(
+    settings.health_check_interval_seconds,
+    settings.health_check_timeout_seconds,
+    replica_max_lag=(
+        settings.replica_max_lag_seconds if read_engine is not engine else None
+    ),
+)
+# innermost: captures the handler, not the other middleware
+app.add_middleware(
+    ProfilingMiddleware,
+    admin_token=settings.profiling_admin_token,
+    sample_rate=settings.profiling_sample_rate,
+)
+app.add_middleware(
+    QueryCountMiddleware, nplus1_threshold=settings.nplus1_threshold
+)
+if read_engine is not engine:
+    app.add_middleware(
+        ReadYourWritesMiddleware, window_seconds=settings.read_your_writes_seconds
+    )
+app.add_middleware(PrometheusMiddleware)
+# outermost: the request span covers the other middleware too
+app.add_middleware(TracingMiddleware)
+
+
+@app.on_event("startup")
+async def startup_event() -> None:
+    # первые запросы не платят за TCP/auth/интроспекцию типов asyncpg
+    prewarm = min(settings.db_pool_prewarm, settings.db_pool_size)
+    await prewarm_pool(engine, prewarm)
+    if read_engine is not engine:
+        await prewarm_pool(read_engine, prewarm)
+    app.state.title_index_task = asyncio.create_task(
+        run_title_index_refresher(
+            settings.autocomplete_refresh_seconds,
+            settings.autocomplete_full_reload_seconds,
+            settings.change_feed_lag_seconds,
+        )
+    )
+    app.state.similar_index_task = asyncio.create_task(
+        run_similar_index_refresher(settings.similar_refresh_seconds)
+    )
+    app.state.health_task = asyncio.create_task(health_checker.run())
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
+    app.state.title_index_task.cancel()
+    app.state.similar_index_task.cancel()
+    app.state.health_task.cancel()
     await close_redis()
 
 
+@app.get("/livez")
+async def liveness() -> dict:
+    """
+    Liveness: процесс жив и event loop отвечает. Без I/O.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readiness() -> JSONResponse:
+    """
+    Readiness по закэшированным результатам фоновых проверок
+    (Postgres, Redis, брокер); 503, пока обязательные проверки не пройдены.
+    """
+    ready, report = health_checker.ready()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+
 @app.get("/health")
-async def check_health(db: AsyncSession = Depends(get_async_db)):
+async def check_health():
     """
     Simple healthcheck that verifies DB and Redis connections.
+
+    Served from the same cached checks as /readyz.
     """
-    # Check DB
-    try:
-        await db.execute(text("SELECT 1"))
-    except OperationalError:
+    ready, report = health_checker.ready()
+    checks = report["checks"]
+    if checks["database"]["status"] != "ok":
         raise HTTPException(status_code=500, detail="Database connection failed")
-
-    # Check Redis
-    redis_client = get_redis_client()
-    try:
-        await redis_client.ping()
-    except Exception:
+    if checks["redis"]["status"] != "ok":
         raise HTTPException(status_code=500, detail="Redis connection failed")
 
-    # Check Celery broker (optional – don't fail health if broker is down)
-    try:
-        celery_ok = celery_app.control.inspect().ping() is not None
-    except Exception:
-        celery_ok = False
-
     return {
         "status": "ok",
         "database": "connected",
         "redis": "connected",
-        "celery": "connected" if celery_ok else "unreachable",
+        # broker is optional – don't fail health if it is down
+        "celery": "connected" if checks["broker"]["status"] == "ok" else "unreachable",
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """
+    Prometheus scrape endpoint.
+    """
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+
 # Routers
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(movies_router, prefix="/movies", tags=["movies"])
 app.include_router(profiles_router, prefix="/profiles", tags=["profiles"])
-app.include_router(friends_router, prefix="/friends", tags=["friends"])
\ No newline at end of file
+app.include_router(friends_router, prefix="/friends", tags=["friends"])
+app.include_router(
+    debug_router, prefix="/debug", tags=["debug"], include_in_schema=False
+)
\ No newline at end of file
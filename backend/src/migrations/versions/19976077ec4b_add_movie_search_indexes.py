@@ -0,0 +1,69 @@
+"""add full-text and trigram search to movies
+
+Revision ID: 19976077ec4b
+Revises: ed58854bfc45
+Create Date: 2026-10-19 10:12:41.503217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '19976077ec4b'
+down_revision: Union[str, None] = 'ed58854bfc45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', "
+    "coalesce(movies_keywords_text(keywords), '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(overview, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # array_to_string is STABLE, generated columns need IMMUTABLE
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION movies_keywords_text(text[])
+        RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$ SELECT array_to_string($1, ' ') $$
+        """
+    )
+    op.add_column(
+        'movies',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR_SQL, persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        'ix_movies_search_vector',
+        'movies',
+        ['search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'ix_movies_title_trgm',
+        'movies',
+        ['title'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'title': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_movies_title_trgm', table_name='movies')
+    op.drop_index('ix_movies_search_vector', table_name='movies')
+    op.drop_column('movies', 'search_vector')
+    op.execute("DROP FUNCTION IF EXISTS movies_keywords_text(text[])")
@@ -0,0 +1,68 @@
+"""add dense float32 taste vectors and taste_vocabularies
+
+Revision ID: 3d3eff5d41c5
+Revises: e292c55d1c1c
+Create Date: 2026-10-19 15:08:33.617042
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '3d3eff5d41c5'
+down_revision: Union[str, None] = 'e292c55d1c1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('taste_vocabularies',
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('feature_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+    sa.Column('genre_names', postgresql.ARRAY(sa.Text()), nullable=False),
+    sa.Column('n_buckets', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('version')
+    )
+    op.add_column('profiles', sa.Column('taste_dense', sa.LargeBinary(), nullable=True))
+    op.add_column('profiles', sa.Column('taste_dense_version', sa.Integer(), nullable=True))
+
+    # version 1: all genres + top 1024 keywords by doc_freq, 256 buckets.
+    # Profiles get their dense vector on the next recalc_taste_vector run
+    # (or all at once via rebuild_taste_vocabulary). Not seeded on a fresh
+    # database (no features before the first TMDB sync): the scheduled
+    # rebuild_taste_vocabulary creates the first layout once genres exist.
+    op.execute(
+        """
+        INSERT INTO taste_vocabularies (feature_ids, genre_names, n_buckets, created_at)
+        SELECT
+            coalesce(g.ids, '{}') || coalesce(k.ids, '{}'),
+            coalesce(g.names, '{}'),
+            256,
+            now()
+        FROM (
+            SELECT array_agg(id ORDER BY id) AS ids,
+                   array_agg(name ORDER BY id) AS names
+            FROM features WHERE kind = 'genre'
+        ) g,
+        (
+            SELECT array_agg(id ORDER BY doc_freq DESC, id) AS ids
+            FROM (
+                SELECT id, doc_freq FROM features
+                WHERE kind = 'keyword'
+                ORDER BY doc_freq DESC, id
+                LIMIT 1024
+            ) top
+        ) k
+        WHERE g.ids IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('profiles', 'taste_dense_version')
+    op.drop_column('profiles', 'taste_dense')
+    op.drop_table('taste_vocabularies')
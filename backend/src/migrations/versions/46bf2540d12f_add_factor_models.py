@@ -0,0 +1,50 @@
+"""add factor_models, movie_factors and profile mf factors
+
+Revision ID: 46bf2540d12f
+Revises: a2103825a3b3
+Create Date: 2026-10-19 18:02:37.114082
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '46bf2540d12f'
+down_revision: Union[str, None] = 'a2103825a3b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('factor_models',
+    sa.Column('version', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('factors', sa.Integer(), nullable=False),
+    sa.Column('reg', sa.Float(), nullable=False),
+    sa.Column('alpha', sa.Float(), nullable=False),
+    sa.Column('gram', sa.LargeBinary(), nullable=False),
+    sa.Column('users', sa.Integer(), nullable=False),
+    sa.Column('movies', sa.Integer(), nullable=False),
+    sa.Column('interactions', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('version')
+    )
+    op.create_table('movie_factors',
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('movie_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('vector', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['version'], ['factor_models.version'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('version', 'movie_id')
+    )
+    op.add_column('profiles', sa.Column('mf_factors', sa.LargeBinary(), nullable=True))
+    op.add_column('profiles', sa.Column('mf_version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('profiles', 'mf_version')
+    op.drop_column('profiles', 'mf_factors')
+    op.drop_table('movie_factors')
+    op.drop_table('factor_models')
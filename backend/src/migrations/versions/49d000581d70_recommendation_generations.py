@@ -0,0 +1,45 @@
+"""generation-versioned ai_recommendations
+
+Revision ID: 49d000581d70
+Revises: 46bf2540d12f
+Create Date: 2026-10-19 19:11:48.530214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '49d000581d70'
+down_revision: Union[str, None] = '46bf2540d12f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('ai_recommendation_generation_seq')))
+    # existing rows become generation 0, live for every user that has them
+    op.add_column('ai_recommendations', sa.Column('generation', sa.BigInteger(), server_default='0', nullable=False))
+    op.alter_column('ai_recommendations', 'generation', server_default=None)
+    op.drop_constraint('uq_ai_recs_user_movie', 'ai_recommendations', type_='unique')
+    op.create_unique_constraint('uq_ai_recs_user_generation_movie', 'ai_recommendations', ['user_id', 'generation', 'movie_id'])
+    op.add_column('profiles', sa.Column('rec_generation', sa.BigInteger(), nullable=True))
+    op.execute(
+        "UPDATE profiles SET rec_generation = 0 "
+        "WHERE user_id IN (SELECT DISTINCT user_id FROM ai_recommendations)"
+    )
+
+
+def downgrade() -> None:
+    # keep only the live generation, the old constraint allows one row per movie
+    op.execute(
+        "DELETE FROM ai_recommendations r USING profiles p "
+        "WHERE r.user_id = p.user_id "
+        "AND r.generation IS DISTINCT FROM p.rec_generation"
+    )
+    op.drop_column('profiles', 'rec_generation')
+    op.drop_constraint('uq_ai_recs_user_generation_movie', 'ai_recommendations', type_='unique')
+    op.create_unique_constraint('uq_ai_recs_user_movie', 'ai_recommendations', ['user_id', 'movie_id'])
+    op.drop_column('ai_recommendations', 'generation')
+    op.execute(sa.schema.DropSequence(sa.Sequence('ai_recommendation_generation_seq')))
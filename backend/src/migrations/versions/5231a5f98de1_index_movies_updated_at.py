@@ -0,0 +1,26 @@
+"""index movies.updated_at for change feeds
+
+Revision ID: 5231a5f98de1
+Revises: 19976077ec4b
+Create Date: 2026-10-19 11:04:17.220941
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5231a5f98de1'
+down_revision: Union[str, None] = '19976077ec4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_movies_updated_at'), 'movies', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_movies_updated_at'), table_name='movies')
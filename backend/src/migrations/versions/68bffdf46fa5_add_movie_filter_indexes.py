@@ -0,0 +1,30 @@
+"""add GIN indexes on movie genres/keywords and release_date index
+
+Revision ID: 68bffdf46fa5
+Revises: 5231a5f98de1
+Create Date: 2026-10-19 12:21:05.883410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '68bffdf46fa5'
+down_revision: Union[str, None] = '5231a5f98de1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_movies_genres', 'movies', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_movies_keywords', 'movies', ['keywords'], unique=False, postgresql_using='gin')
+    op.create_index(op.f('ix_movies_release_date'), 'movies', ['release_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_movies_release_date'), table_name='movies')
+    op.drop_index('ix_movies_keywords', table_name='movies')
+    op.drop_index('ix_movies_genres', table_name='movies')
@@ -0,0 +1,43 @@
+"""add movie_embeddings and similar_movies
+
+Revision ID: a2103825a3b3
+Revises: 3d3eff5d41c5
+Create Date: 2026-10-19 16:20:11.402315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2103825a3b3'
+down_revision: Union[str, None] = '3d3eff5d41c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('movie_embeddings',
+    sa.Column('movie_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('vector', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id')
+    )
+    op.create_index(op.f('ix_movie_embeddings_version'), 'movie_embeddings', ['version'], unique=False)
+    op.create_table('similar_movies',
+    sa.Column('movie_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('similar_ids', postgresql.ARRAY(postgresql.UUID(as_uuid=True)), nullable=False),
+    sa.Column('scores', postgresql.ARRAY(sa.Float()), nullable=False),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('similar_movies')
+    op.drop_index(op.f('ix_movie_embeddings_version'), table_name='movie_embeddings')
+    op.drop_table('movie_embeddings')
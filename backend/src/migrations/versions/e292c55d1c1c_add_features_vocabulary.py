@@ -0,0 +1,74 @@
+"""add interned features vocabulary and movies.feature_ids
+
+Revision ID: e292c55d1c1c
+Revises: 68bffdf46fa5
+Create Date: 2026-10-19 13:47:52.031884
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e292c55d1c1c'
+down_revision: Union[str, None] = '68bffdf46fa5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('features',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', postgresql.ENUM('genre', 'keyword', name='feature_kind'), nullable=False),
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.Column('doc_freq', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'name', name='uq_features_kind_name')
+    )
+    op.add_column('movies', sa.Column('feature_ids', postgresql.ARRAY(sa.Integer()), nullable=True))
+
+    # backfill vocabulary + movie feature ids from the existing text arrays
+    op.execute(
+        """
+        INSERT INTO features (kind, name)
+        SELECT DISTINCT 'genre'::feature_kind, g
+        FROM movies, unnest(genres) AS g
+        WHERE g IS NOT NULL
+        UNION
+        SELECT DISTINCT 'keyword'::feature_kind, k
+        FROM movies, unnest(keywords) AS k
+        WHERE k IS NOT NULL
+        ON CONFLICT ON CONSTRAINT uq_features_kind_name DO NOTHING
+        """
+    )
+    op.execute(
+        """
+        UPDATE movies m SET feature_ids = (
+            SELECT coalesce(array_agg(f.id ORDER BY f.id), '{}')
+            FROM features f
+            WHERE (f.kind = 'genre' AND f.name = ANY(m.genres))
+               OR (f.kind = 'keyword' AND f.name = ANY(m.keywords))
+        )
+        """
+    )
+    op.execute(
+        """
+        UPDATE features f SET doc_freq = c.n
+        FROM (
+            SELECT fid, count(*) AS n
+            FROM movies, unnest(feature_ids) AS fid
+            GROUP BY fid
+        ) c
+        WHERE f.id = c.fid
+        """
+    )
+    op.create_index('ix_movies_feature_ids', 'movies', ['feature_ids'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_movies_feature_ids', table_name='movies')
+    op.drop_column('movies', 'feature_ids')
+    op.drop_table('features')
+    op.execute("DROP TYPE IF EXISTS feature_kind")
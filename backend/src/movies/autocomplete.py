@@ -0,0 +1,369 @@
+"""
+In-process title autocomplete.
+
+The index is a sorted array of normalized title keys searched with bisect.
+Every word start of a title is indexed ("dark knight" for "The Dark
+Knight"), so suggestions match mid-title too. It is built from the
+`movies` table at API startup and kept current by polling
+`movies.updated_at` from shortly before a watermark; a periodic full
+rebuild picks up deletions, which the change feed cannot see (the process
+that served a DELETE drops the movie at once, the others at their next
+rebuild).
+"""
+
+import asyncio
+import heapq
+import logging
+import re
+import sys
+import time
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.movies.models import Movie
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# prefixes matching more keys than this get their top-k memoized; the
+# memo is pre-warmed for every 1-2 character prefix at build time
+MEMO_MIN_KEYS = 256
+MEMO_TOP_K = 20
+MEMO_MAX_ENTRIES = 50_000
+WARM_PREFIX_LEN = 2
+
+
+def normalize_title(value: str) -> str:
+    """
+    Lowercase, strip accents and punctuation, collapse whitespace.
+    """
+    decomposed = unicodedata.normalize("NFKD", value)
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", ascii_only.lower()).strip()
+
+
+def _title_keys(title: str) -> list[str]:
+    norm = normalize_title(title)
+    if not norm:
+        return []
+    words = norm.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class TitleRow(NamedTuple):
+    id: UUID
+    title: str
+    year: int | None
+    popularity: float
+    updated_at: datetime | None
+
+
+class Suggestion(NamedTuple):
+    id: UUID
+    title: str
+    year: int | None
+    popularity: float
+
+
+class TitlePrefixIndex:
+    """
+    Sorted prefix index over movie titles.
+
+    Movies live in parallel per-column lists addressed by a slot number;
+    `_keys`/`_slots` are parallel sorted lists of (normalized key, slot).
+    """
+
+    __slots__ = (
+        "_keys",
+        "_slots",
+        "_ids",
+        "_titles",
+        "_years",
+        "_popularity",
+        "_slot_by_id",
+        "_free_slots",
+        "_memo",
+        "watermark",
+        "loaded_at",
+    )
+
+    def __init__(self) -> None:
+        self._keys: list[str] = []
+        self._slots: list[int] = []
+        self._ids: list[UUID | None] = []
+        self._titles: list[str] = []
+        self._years: list[int | None] = []
+        self._popularity: list[float] = []
+        self._slot_by_id: dict[UUID, int] = {}
+        self._free_slots: list[int] = []
+        self._memo: dict[str, list[int]] = {}
+        self.watermark: datetime | None = None
+        self.loaded_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._slot_by_id)
+
+    # building ---------------------------------------------------------------
+
+    def build(self, rows: Iterable[TitleRow]) -> None:
+        """
+        Replace the whole index in one pass (sort once instead of insort).
+        """
+        fresh = TitlePrefixIndex()
+        pairs: list[tuple[str, int]] = []
+        for row in rows:
+            slot = fresh._store(row)
+            pairs.extend((key, slot) for key in _title_keys(row.title))
+            fresh._bump_watermark(row.updated_at)
+        pairs.sort()
+        fresh._keys = [key for key, _ in pairs]
+        fresh._slots = [slot for _, slot in pairs]
+        fresh._warm_memo()
+        fresh.loaded_at = time.monotonic()
+        self.adopt(fresh)
+
+    def adopt(self, other: "TitlePrefixIndex") -> None:
+        """
+        Take over another index's state (a build finished elsewhere).
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(other, name))
+
+    def upsert(self, row: TitleRow) -> None:
+        self.remove(row.id)
+        slot = self._store(row)
+        for key in _title_keys(row.title):
+            pos = bisect_left(self._keys, key)
+            self._keys.insert(pos, key)
+            self._slots.insert(pos, slot)
+            self._invalidate(key)
+        self._bump_watermark(row.updated_at)
+
+    def remove(self, movie_id: UUID) -> None:
+        slot = self._slot_by_id.pop(movie_id, None)
+        if slot is None:
+            return
+        for key in _title_keys(self._titles[slot]):
+            pos = bisect_left(self._keys, key)
+            while pos < len(self._keys) and self._keys[pos] == key:
+                if self._slots[pos] == slot:
+                    del self._keys[pos]
+                    del self._slots[pos]
+                    break
+                pos += 1
+            self._invalidate(key)
+        self._ids[slot] = None
+        self._titles[slot] = ""
+        self._free_slots.append(slot)
+
+    def _store(self, row: TitleRow) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._ids[slot] = row.id
+            self._titles[slot] = row.title
+            self._years[slot] = row.year
+            self._popularity[slot] = row.popularity
+        else:
+            slot = len(self._ids)
+            self._ids.append(row.id)
+            self._titles.append(row.title)
+            self._years.append(row.year)
+            self._popularity.append(row.popularity)
+        self._slot_by_id[row.id] = slot
+        return slot
+
+    def _invalidate(self, key: str) -> None:
+        for n in range(1, len(key) + 1):
+            self._memo.pop(key[:n], None)
+
+    def _warm_memo(self) -> None:
+        prefixes = {
+            key[:n] for key in self._keys for n in range(1, WARM_PREFIX_LEN + 1)
+        }
+        for prefix in prefixes:
+            self._top_slots(prefix, MEMO_TOP_K)
+
+    def _bump_watermark(self, updated_at: datetime | None) -> None:
+        if updated_at is not None and (
+            self.watermark is None or updated_at > self.watermark
+        ):
+            self.watermark = updated_at
+
+    # lookup -----------------------------------------------------------------
+
+    def lookup(self, prefix: str, k: int = 10) -> list[Suggestion]:
+        """
+        Top-k movies by popularity whose title (or a word in it) starts
+        with `prefix`.
+        """
+        norm = normalize_title(prefix)
+        if not norm or k <= 0:
+            return []
+
+        top = self._memo.get(norm) if k <= MEMO_TOP_K else None
+        if top is None:
+            top = self._top_slots(norm, k)
+        top = top[:k]
+
+        return [
+            Suggestion(
+                self._ids[s], self._titles[s], self._years[s], self._popularity[s]
+            )
+            for s in top
+        ]
+
+    def _top_slots(self, norm: str, k: int) -> list[int]:
+        lo = bisect_left(self._keys, norm)
+        hi = bisect_left(self._keys, norm + "\uffff", lo)
+        memoize = hi - lo > MEMO_MIN_KEYS and k <= MEMO_TOP_K
+        matched = set(self._slots[lo:hi])
+        top = heapq.nlargest(
+            MEMO_TOP_K if memoize else k,
+            matched,
+            key=self._popularity.__getitem__,
+        )
+        if memoize:
+            if len(self._memo) >= MEMO_MAX_ENTRIES:
+                self._memo.clear()
+            self._memo[norm] = top
+        return top
+
+    # reporting --------------------------------------------------------------
+
+    def memory_report(self) -> dict[str, int]:
+        """
+        Approximate resident size in bytes, per component.
+        """
+        keys = sys.getsizeof(self._keys) + sum(map(sys.getsizeof, self._keys))
+        slots = sys.getsizeof(self._slots)
+        columns = (
+            sys.getsizeof(self._ids)
+            + sum(sys.getsizeof(i) for i in self._ids if i is not None)
+            + sys.getsizeof(self._titles)
+            + sum(map(sys.getsizeof, self._titles))
+            + sys.getsizeof(self._years)
+            + sys.getsizeof(self._popularity)
+            + sum(map(sys.getsizeof, self._popularity))
+        )
+        lookup_maps = (
+            sys.getsizeof(self._slot_by_id)
+            + sys.getsizeof(self._memo)
+            + sum(sys.getsizeof(v) for v in self._memo.values())
+        )
+        return {
+            "movies": len(self._slot_by_id),
+            "keys": len(self._keys),
+            "keys_bytes": keys,
+            "slots_bytes": slots,
+            "columns_bytes": columns,
+            "lookup_maps_bytes": lookup_maps,
+            "total_bytes": keys + slots + columns + lookup_maps,
+        }
+
+
+title_index = TitlePrefixIndex()
+
+
+def _title_row_stmt():
+    return select(
+        Movie.id,
+        Movie.title,
+        Movie.release_date,
+        Movie.popularity,
+        Movie.updated_at,
+    )
+
+
+def _to_title_row(row) -> TitleRow:
+    return TitleRow(
+        id=row.id,
+        title=row.title,
+        year=row.release_date.year if row.release_date else None,
+        popularity=float(row.popularity or 0),
+        updated_at=row.updated_at,
+    )
+
+
+async def load_title_index(
+    db: AsyncSession, index: TitlePrefixIndex = title_index
+) -> None:
+    result = await db.stream(_title_row_stmt())
+    rows = [_to_title_row(row) async for row in result]
+    # sort and memo warm-up off the event loop; the swap is one step on it
+    fresh = TitlePrefixIndex()
+    await asyncio.to_thread(fresh.build, rows)
+    index.adopt(fresh)
+
+
+async def refresh_title_index(
+    db: AsyncSession,
+    index: TitlePrefixIndex = title_index,
+    full_reload_interval: float | None = None,
+    poll_lag: float = 60.0,
+) -> int:
+    """
+    Apply movies changed since the index watermark, or rebuild the index
+    from scratch when it is empty or older than `full_reload_interval`
+    seconds. Returns rows applied.
+
+    The poll starts `poll_lag` seconds before the watermark: updated_at
+    is stamped at flush, so a transaction committing after the watermark
+    passed its timestamp would otherwise be skipped. Re-applying a row is
+    idempotent.
+    """
+    if (
+        index.watermark is None
+        or index.loaded_at is None
+        or (
+            full_reload_interval is not None
+            and time.monotonic() - index.loaded_at >= full_reload_interval
+        )
+    ):
+        await load_title_index(db, index)
+        return len(index)
+
+    result = await db.execute(
+        _title_row_stmt()
+        .where(
+            Movie.updated_at >= index.watermark - timedelta(seconds=poll_lag)
+        )
+        .order_by(Movie.updated_at)
+    )
+    rows = result.all()
+    for row in rows:
+        index.upsert(_to_title_row(row))
+    return len(rows)
+
+
+async def run_title_index_refresher(
+    interval_seconds: float,
+    full_reload_seconds: float | None = None,
+    poll_lag: float = 60.0,
+) -> None:
+    """
+    Long-running task (started in the API lifespan): build the index,
+    then poll the change feed forever, rebuilding every
+    `full_reload_seconds`.
+    """
+    from src.app.db import AsyncSessionLocal
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await refresh_title_index(
+                    session,
+                    full_reload_interval=full_reload_seconds,
+                    poll_lag=poll_lag,
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("title index refresh failed")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,327 @@
+"""
+Nightly regeneration of stale recommendations.
+
+Real-time generation only runs after a user interacts, so inactive users'
+rankings would never change as the catalog does. The nightly job splits
+profiles into `n_shards` ranges of the profile id space (one Celery task
+each), streams every shard in keyset-paginated chunks, ranks each chunk
+against the popular catalog pool with one `rank_movies_for_users` call,
+and bulk-writes the results as new generations (Postgres + Redis). With
+a reranker, each chunk's heads go through the LLM stage together, so its
+backend calls are batched across the chunk's users.
+
+Users whose live generation is younger than `min_age` keep it: their
+real-time ranking also blends co-occurrence and factor scores, which the
+batch path leaves out. Profiles whose dense taste is missing or from an
+older layout (typically the inactive users this job is for) have their
+JSON taste re-encoded into the current layout first, and the dense
+vector is saved.
+"""
+
+import logging
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import UUID
+
+import numpy as np
+from redis import asyncio as redis_async
+from sqlalchemy import and_, exists, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.ai.features import GENRE, KEYWORD, taste_names
+from src.ai.llm import rank_movies_for_users, ranking_catalog
+from src.ai.taste import DenseTasteLayout
+from src.ai.rerank import Reranker, taste_bucket
+from src.app.tracing import span
+from src.auth.models import Profile
+from src.movies import rec_cache
+from src.movies.rerank import rerank_candidate, rerank_heads
+from src.movies.catalog_snapshot import get_catalog_store
+from src.movies.crud import (get_movies_by_ids, load_feature_vocabulary,
+                             write_recommendation_generations)
+from src.movies.models import AIRecommendation, Dislike, Favorite
+from src.profiles.crud import get_taste_layout
+
+logger = logging.getLogger(__name__)
+
+_ID_SPACE = 1 << 128
+
+
+def peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def shard_bounds(shard: int, n_shards: int) -> tuple[UUID | None, UUID | None]:
+    """
+    [lo, hi) slice of the UUID space for one shard; None is open-ended.
+    """
+    lo = UUID(int=_ID_SPACE * shard // n_shards) if shard > 0 else None
+    hi = (
+        UUID(int=_ID_SPACE * (shard + 1) // n_shards)
+        if shard + 1 < n_shards
+        else None
+    )
+    return lo, hi
+
+
+def _fresh_generation(min_age: timedelta):
+    # the live generation was written less than min_age ago
+    return exists().where(
+        and_(
+            AIRecommendation.user_id == Profile.user_id,
+            AIRecommendation.generation == Profile.rec_generation,
+            AIRecommendation.generated_at > datetime.utcnow() - min_age,
+        )
+    )
+
+
+async def _seen_pairs(
+    db: AsyncSession, user_ids: list[UUID]
+) -> list[tuple[UUID, UUID]]:
+    # same "seen" as generate_movie_recommendations: favorites + dislikes
+    result = await db.execute(
+        union_all(
+            select(Favorite.user_id, Favorite.movie_id).where(
+                Favorite.user_id.in_(user_ids)
+            ),
+            select(Dislike.user_id, Dislike.movie_id).where(
+                Dislike.user_id.in_(user_ids)
+            ),
+        )
+    )
+    return result.all()
+
+
+async def _dense_tastes(
+    db: AsyncSession, layout: DenseTasteLayout, batch: list
+) -> tuple[list, int]:
+    """
+    (row, vector or None) per profile row in the current layout, and how
+    many were re-encoded from their JSON taste (and saved; caller commits).
+    """
+    stale = [
+        p
+        for p in batch
+        if p.taste_dense_version != layout.version or p.taste_dense is None
+    ]
+    encoded: dict[UUID, np.ndarray] = {}
+    if stale:
+        genre_names: set[str] = set()
+        keyword_names: set[str] = set()
+        for p in stale:
+            names = taste_names(p.taste_vector)
+            genre_names.update(names[GENRE])
+            keyword_names.update(names[KEYWORD])
+        vocab = await load_feature_vocabulary(
+            db, genres=genre_names, keywords=keyword_names
+        )
+        for p in stale:
+            scores = vocab.encode_taste(p.taste_vector)
+            if scores:
+                encoded[p.id] = layout.encode(scores)
+        if encoded:
+            # ORM bulk UPDATE by primary key: one executemany
+            await db.execute(
+                update(Profile),
+                [
+                    {
+                        "id": profile_id,
+                        "taste_dense": layout.to_bytes(vec),
+                        "taste_dense_version": layout.version,
+                    }
+                    for profile_id, vec in encoded.items()
+                ],
+            )
+    stale_ids = {p.id for p in stale}
+    dense = [
+        (
+            p,
+            # an older layout's bytes may have the same length: never load them
+            encoded.get(p.id) if p.id in stale_ids else layout.load(p.taste_dense),
+        )
+        for p in batch
+    ]
+    return dense, len(encoded)
+
+
+async def regenerate_shard(
+    db: AsyncSession,
+    redis_client: redis_async.Redis,
+    shard: int,
+    n_shards: int,
+    *,
+    chunk: int = 1024,
+    pool: int = 20_000,
+    k: int = 200,
+    min_age: timedelta = timedelta(hours=20),
+    ttl: int,
+    card_ttl: int,
+    reranker: Reranker | None = None,
+    rerank_top_n: int = 20,
+) -> dict[str, float]:
+    """
+    Regenerate every stale profile of one shard. Returns counts, users/s
+    and peak RSS for the job log.
+    """
+    t0 = time.perf_counter()
+    with span("setup") as sp:
+        layout = await get_taste_layout(db)
+        if layout is None:
+            return {"users": 0.0}
+        store = await get_catalog_store(db)
+        rows = np.fromiter(
+            store.top_popular(pool or len(store)), dtype=np.int64
+        )
+        if not len(rows):
+            return {"users": 0.0}
+        movie_ids = [store.movie_id(r) for r in rows.tolist()]
+        indptr, feature_ids = store.feature_rows(rows)
+        catalog = ranking_catalog(
+            layout,
+            [str(m) for m in movie_ids],
+            indptr,
+            feature_ids,
+            store.popularity[rows],
+            store.rating[rows],
+        )
+        row_of = {m: i for i, m in enumerate(movie_ids)}
+
+        # every pool movie's card once, instead of per published ranking
+        candidates = {}
+        for start in range(0, len(movie_ids), 1000):
+            movies = await get_movies_by_ids(db, movie_ids[start:start + 1000])
+            await rec_cache.cache_movie_cards(redis_client, movies, card_ttl)
+            if reranker is not None:
+                candidates.update(
+                    (str(m.id), rerank_candidate(m)) for m in movies
+                )
+        sp.set(pool=len(rows))
+    t1 = time.perf_counter()
+
+    lo, hi = shard_bounds(shard, n_shards)
+    stmt = (
+        select(
+            Profile.id,
+            Profile.user_id,
+            Profile.taste_dense,
+            Profile.taste_dense_version,
+            Profile.taste_vector,
+        )
+        .where(
+            or_(
+                and_(
+                    Profile.taste_dense_version == layout.version,
+                    Profile.taste_dense.is_not(None),
+                ),
+                Profile.taste_vector.is_not(None),
+            ),
+            ~_fresh_generation(min_age),
+        )
+        .order_by(Profile.id)
+        .limit(chunk)
+    )
+    if lo is not None:
+        stmt = stmt.where(Profile.id >= lo)
+    if hi is not None:
+        stmt = stmt.where(Profile.id < hi)
+
+    users = skipped = reencoded = 0
+    rank_seconds = rerank_seconds = 0.0
+    last_id = None
+    while True:
+        with span("load_chunk") as sp:
+            page = stmt if last_id is None else stmt.where(Profile.id > last_id)
+            batch = (await db.execute(page)).all()
+            if batch:
+                last_id = batch[-1].id
+                dense, n_encoded = await _dense_tastes(db, layout, batch)
+                sp.set(profiles=len(batch), reencoded=n_encoded)
+        if not batch:
+            break
+        reencoded += n_encoded
+        skipped += sum(vec is None for _, vec in dense)
+        dense = [(p, vec) for p, vec in dense if vec is not None]
+        if not dense:
+            if n_encoded:
+                await db.commit()
+            continue
+        user_ids = [p.user_id for p, _ in dense]
+        user_index = {u: i for i, u in enumerate(user_ids)}
+        with span("seen_set") as sp:
+            pairs = [
+                (user_index[u], row_of[m])
+                for u, m in await _seen_pairs(db, user_ids)
+                if m in row_of
+            ]
+            sp.set(seen=len(pairs))
+        exclude = (
+            (np.array([u for u, _ in pairs]), np.array([r for _, r in pairs]))
+            if pairs
+            else None
+        )
+
+        t = time.perf_counter()
+        with span("rank", users=len(user_ids)):
+            top_rows, scores = rank_movies_for_users(
+                layout.ranker_weights(np.stack([vec for _, vec in dense])),
+                catalog,
+                k,
+                exclude,
+            )
+        rank_seconds += time.perf_counter() - t
+
+        rankings = {
+            user_id: [
+                (catalog.movie_ids[r], float(s))
+                for r, s in zip(top_rows[i].tolist(), scores[i].tolist())
+                if r >= 0
+            ]
+            for i, user_id in enumerate(user_ids)
+        }
+        if reranker is not None:
+            t = time.perf_counter()
+            with span("rerank", users=len(user_ids)):
+                reranked = await rerank_heads(
+                    reranker,
+                    [
+                        (p.user_id, taste_bucket(p.taste_vector), rankings[p.user_id])
+                        for p, _ in dense
+                    ],
+                    candidates,
+                    rerank_top_n,
+                )
+            rankings = dict(zip(user_ids, reranked))
+            rerank_seconds += time.perf_counter() - t
+        with span("write_generation", users=len(user_ids)):
+            generations = await write_recommendation_generations(db, rankings)
+        with span("publish", users=len(user_ids)):
+            await rec_cache.publish_recommendation_batch(
+                redis_client,
+                [(u, generations[u], rankings[u]) for u in user_ids],
+                ttl=ttl,
+                card_ttl=card_ttl,
+            )
+        users += len(user_ids)
+
+    seconds = time.perf_counter() - t0
+    stats = {
+        "shard": float(shard),
+        "users": float(users),
+        "skipped": float(skipped),
+        "reencoded": float(reencoded),
+        "pool": float(len(rows)),
+        "setup_seconds": t1 - t0,
+        "rank_seconds": rank_seconds,
+        "rerank_seconds": rerank_seconds,
+        "seconds": seconds,
+        "users_per_second": users / seconds if seconds else 0.0,
+        "peak_rss_mib": peak_rss_mib(),
+    }
+    if reranker is not None:
+        stats.update({f"rerank_{k}": float(v) for k, v in reranker.stats.items()})
+    logger.info("regenerated recommendations: %s", stats)
+    return stats
@@ -0,0 +1,212 @@
+"""
+Memory-mapped catalog snapshots shared by prefork workers.
+
+A builder exports the catalog store columns into a versioned directory of
+`.npy` files and publishes it by atomically swapping the `current`
+symlink. Workers open the published version with `np.load(mmap_mode="r")`,
+so the pages live once in the OS page cache no matter how many worker
+processes map them.
+
+Layout under the snapshot root:
+
+    20250101T120000123456/ids.npy, popularity.npy, ..., meta.json
+    current -> 20250101T120000123456
+
+Publishing is the reload signal: every worker re-reads the `current` link
+(one readlink, at most once per `check_interval`) before handing out the
+store and remaps when it points somewhere new. A snapshot older than
+`catalog_snapshot_max_age_seconds` (the build task keeps failing) is
+bypassed for the worker's own delta-refreshed store.
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.config import get_settings
+from src.app.metrics import observe_catalog_store
+from src.movies.catalog_store import (CatalogStore, catalog_store,
+                                      refresh_catalog_store)
+
+logger = logging.getLogger(__name__)
+
+CURRENT_LINK = "current"
+META_FILE = "meta.json"
+COLUMNS = (
+    "ids",
+    "popularity",
+    "rating",
+    "indptr",
+    "indices",
+    "by_popularity",
+    "sorted_ids",
+    "id_order",
+)
+
+# older versions kept around for workers still mapping them
+KEEP_VERSIONS = 3
+
+
+def current_snapshot_version(root: str) -> str | None:
+    try:
+        return os.readlink(os.path.join(root, CURRENT_LINK))
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def write_catalog_snapshot(
+    store: CatalogStore, root: str, keep: int = KEEP_VERSIONS
+) -> str:
+    """
+    Export `store` as a new snapshot version and publish it. Returns the
+    version name.
+    """
+    os.makedirs(root, exist_ok=True)
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+
+    columns = store.columns()
+    for name in COLUMNS:
+        np.save(os.path.join(staging, f"{name}.npy"), columns[name])
+    with open(os.path.join(staging, META_FILE), "w") as f:
+        json.dump(
+            {
+                "version": version,
+                "movies": len(store),
+                "nnz": int(len(columns["indices"])),
+                "watermark": (
+                    store.watermark.isoformat() if store.watermark else None
+                ),
+                "created_at": datetime.utcnow().isoformat(),
+            },
+            f,
+        )
+    os.rename(staging, os.path.join(root, version))
+
+    # symlink(2) cannot overwrite, rename(2) can — and atomically
+    tmp_link = os.path.join(root, f".{CURRENT_LINK}.{os.getpid()}")
+    if os.path.lexists(tmp_link):
+        os.unlink(tmp_link)
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, os.path.join(root, CURRENT_LINK))
+
+    _prune_versions(root, keep)
+    return version
+
+
+def _prune_versions(root: str, keep: int) -> None:
+    # unlinking a mapped file is safe on POSIX: the inode lives until the
+    # last worker unmaps it
+    versions = sorted(
+        name
+        for name in os.listdir(root)
+        if not name.startswith(".") and name != CURRENT_LINK
+    )
+    current = current_snapshot_version(root)
+    for name in versions[:-keep] if keep > 0 else versions:
+        if name != current:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def open_catalog_snapshot(root: str, version: str) -> CatalogStore:
+    path = os.path.join(root, version)
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    columns = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in COLUMNS
+    }
+    watermark = meta.get("watermark")
+    created_at = meta.get("created_at")
+    return CatalogStore.from_columns(
+        columns,
+        watermark=datetime.fromisoformat(watermark) if watermark else None,
+        snapshot_version=version,
+        built_at=datetime.fromisoformat(created_at) if created_at else None,
+    )
+
+
+class CatalogSnapshot:
+    """
+    Per-process handle on the published snapshot; remaps when the
+    `current` link moves.
+    """
+
+    __slots__ = ("root", "check_interval", "_store", "_checked_at")
+
+    def __init__(self, root: str | None, check_interval: float = 1.0) -> None:
+        self.root = root
+        self.check_interval = check_interval
+        self._store: CatalogStore | None = None
+        self._checked_at = float("-inf")
+
+    def get(self) -> CatalogStore | None:
+        """
+        The mapped store, or None if snapshots are disabled or nothing has
+        been published yet.
+        """
+        if not self.root:
+            return None
+        now = time.monotonic()
+        if self._store is not None and now - self._checked_at < self.check_interval:
+            return self._store
+        self._checked_at = now
+
+        version = current_snapshot_version(self.root)
+        if version is None:
+            return self._store
+        if self._store is None or self._store.snapshot_version != version:
+            try:
+                self._store = open_catalog_snapshot(self.root, version)
+            except (OSError, ValueError):
+                # pruned or half-written under us: keep the old mapping
+                logger.exception("cannot open catalog snapshot %s", version)
+            else:
+                logger.info(
+                    "mapped catalog snapshot %s (%d movies)",
+                    version,
+                    len(self._store),
+                )
+        return self._store
+
+    def reload(self) -> CatalogStore | None:
+        self._checked_at = float("-inf")
+        return self.get()
+
+
+catalog_snapshot = CatalogSnapshot(get_settings().catalog_snapshot_dir or None)
+
+
+async def get_catalog_store(db: AsyncSession) -> CatalogStore:
+    """
+    Catalog store for ranking: the shared snapshot when a fresh one is
+    published, otherwise this process' own delta-refreshed store.
+    """
+    settings = get_settings()
+    store = catalog_snapshot.get()
+    if store is not None and (
+        time.monotonic() - store.refreshed_at
+        > settings.catalog_snapshot_max_age_seconds
+    ):
+        if not catalog_store.is_loaded:
+            logger.warning(
+                "catalog snapshot %s is stale; using the resident store",
+                store.snapshot_version,
+            )
+        store = None
+    if store is None:
+        store = await refresh_catalog_store(
+            db,
+            min_interval=settings.catalog_store_refresh_seconds,
+            full_reload_interval=settings.catalog_store_full_reload_seconds,
+            poll_lag=settings.change_feed_lag_seconds,
+        )
+    observe_catalog_store(store)
+    return store
@@ -0,0 +1,386 @@
+"""
+Worker-resident catalog feature store.
+
+Holds what the rankers need about every movie — id, popularity, rating and
+feature ids — as flat NumPy columns (feature ids in CSR form), with no ORM
+objects. Loaded once per process and refreshed incrementally by polling
+`movies.updated_at` past a watermark; a periodic full reload picks up
+deletions, which the change feed cannot see.
+
+A store can also wrap read-only columns memory-mapped from a published
+snapshot (`catalog_snapshot`), shared by every prefork worker.
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.movies.models import Movie
+
+# compact once this share of rows are superseded copies
+_COMPACT_DEAD_RATIO = 0.2
+
+# raw UUID bytes as two big-endian words: sortable and searchsorted-able,
+# unlike V16
+_ID_KEY = np.dtype([("hi", ">u8"), ("lo", ">u8")])
+
+
+class CatalogStore:
+    """
+    Columnar, append-only movie store.
+
+    Row i: `ids[i]` (raw 16-byte UUID, V16 so trailing NULs survive), `popularity[i]`, `rating[i]` and
+    `indices[indptr[i]:indptr[i + 1]]` (sorted feature ids). An updated
+    movie is appended as a new row and its old row marked dead in `alive`.
+    """
+
+    __slots__ = (
+        "ids",
+        "popularity",
+        "rating",
+        "indptr",
+        "indices",
+        "alive",
+        "_row_by_id",
+        "_by_popularity",
+        "_sorted_ids",
+        "_id_order",
+        "watermark",
+        "loaded_at",
+        "refreshed_at",
+        "snapshot_version",
+    )
+
+    def __init__(self) -> None:
+        self.ids = np.empty(0, dtype="V16")
+        self.popularity = np.empty(0, dtype=np.float32)
+        self.rating = np.empty(0, dtype=np.float32)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int32)
+        self.alive = np.empty(0, dtype=bool)
+        self._row_by_id: dict[bytes, int] = {}
+        self._by_popularity = np.empty(0, dtype=np.int64)
+        self._sorted_ids: np.ndarray | None = None
+        self._id_order: np.ndarray | None = None
+        self.watermark: datetime | None = None
+        self.loaded_at: float | None = None
+        self.refreshed_at: float | None = None
+        self.snapshot_version: str | None = None
+
+    def __len__(self) -> int:
+        return len(self._by_popularity)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    # writing ----------------------------------------------------------------
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """
+        Replace the store with `(id, popularity, rating, feature_ids,
+        updated_at)` rows.
+        """
+        fresh = CatalogStore()
+        fresh._append(rows)
+        fresh.loaded_at = fresh.refreshed_at = time.monotonic()
+        for name in self.__slots__:
+            setattr(self, name, getattr(fresh, name))
+
+    def apply_delta(self, rows: Iterable[tuple]) -> int:
+        """
+        Upsert changed rows; returns how many were applied.
+        """
+        if self.snapshot_version is not None:
+            raise RuntimeError(
+                "snapshot-backed catalog store is read-only; "
+                "publish a new snapshot instead"
+            )
+        applied = self._append(rows)
+        self.refreshed_at = time.monotonic()
+        dead = len(self.alive) - len(self._row_by_id)
+        if dead > _COMPACT_DEAD_RATIO * max(len(self.alive), 1):
+            self._compact()
+        return applied
+
+    def _append(self, rows: Iterable[tuple]) -> int:
+        ids: list[bytes] = []
+        popularity: list[float] = []
+        rating: list[float] = []
+        lengths: list[int] = []
+        features: list[int] = []
+        for movie_id, pop, rate, feature_ids, updated_at in rows:
+            ids.append(movie_id.bytes)
+            popularity.append(float(pop or 0))
+            rating.append(float(rate or 0))
+            fids = sorted(feature_ids or ())
+            lengths.append(len(fids))
+            features.extend(fids)
+            if updated_at is not None and (
+                self.watermark is None or updated_at > self.watermark
+            ):
+                self.watermark = updated_at
+        if not ids:
+            return 0
+
+        start = len(self.ids)
+        alive_new = np.ones(len(ids), dtype=bool)
+        for offset, key in enumerate(ids):
+            old = self._row_by_id.get(key)
+            if old is not None:
+                # the superseded copy may also sit in this very batch
+                if old >= start:
+                    alive_new[old - start] = False
+                else:
+                    self.alive[old] = False
+            self._row_by_id[key] = start + offset
+
+        self.ids = np.concatenate([self.ids, np.array(ids, dtype="V16")])
+        self.popularity = np.concatenate(
+            [self.popularity, np.array(popularity, dtype=np.float32)]
+        )
+        self.rating = np.concatenate(
+            [self.rating, np.array(rating, dtype=np.float32)]
+        )
+        self.indptr = np.concatenate(
+            [self.indptr, self.indptr[-1] + np.cumsum(lengths, dtype=np.int64)]
+        )
+        self.indices = np.concatenate(
+            [self.indices, np.array(features, dtype=np.int32)]
+        )
+        self.alive = np.concatenate([self.alive, alive_new])
+        self._reindex()
+        return len(ids)
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self.alive)
+        lengths = np.diff(self.indptr)[keep]
+        nnz_keep = np.repeat(self.alive, np.diff(self.indptr))
+        self.ids = self.ids[keep]
+        self.popularity = self.popularity[keep]
+        self.rating = self.rating[keep]
+        self.indices = self.indices[nnz_keep]
+        self.indptr = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+        self.alive = np.ones(len(keep), dtype=bool)
+        self._row_by_id = {
+            key.tobytes(): row for row, key in enumerate(self.ids)
+        }
+        self._reindex()
+
+    def _reindex(self) -> None:
+        order = np.argsort(-self.popularity, kind="stable")
+        self._by_popularity = order[self.alive[order]]
+
+    # snapshots --------------------------------------------------------------
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """
+        Live rows as plain arrays, for writing a snapshot.
+        """
+        if len(self.alive) != len(self):
+            self._compact()
+        id_order = np.argsort(self.ids.view(_ID_KEY), kind="stable")
+        return {
+            "ids": self.ids,
+            "popularity": self.popularity,
+            "rating": self.rating,
+            "indptr": self.indptr,
+            "indices": self.indices,
+            "by_popularity": self._by_popularity,
+            "sorted_ids": self.ids[id_order],
+            "id_order": id_order,
+        }
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns: dict[str, np.ndarray],
+        *,
+        watermark: datetime | None = None,
+        snapshot_version: str | None = None,
+        built_at: datetime | None = None,
+    ) -> "CatalogStore":
+        """
+        Wrap `columns()` output as-is (no copy, so memory-mapped arrays
+        stay shared). Without a per-row id map the result is read-only.
+        `built_at` (UTC) dates the refresh times back to when the columns
+        were read from the database.
+        """
+        store = cls()
+        store.ids = columns["ids"]
+        store.popularity = columns["popularity"]
+        store.rating = columns["rating"]
+        store.indptr = columns["indptr"]
+        store.indices = columns["indices"]
+        store._by_popularity = columns["by_popularity"]
+        store._sorted_ids = columns["sorted_ids"]
+        store._id_order = columns["id_order"]
+        store.alive = np.ones(len(store.ids), dtype=bool)
+        store.watermark = watermark
+        store.loaded_at = store.refreshed_at = time.monotonic() - (
+            max((datetime.utcnow() - built_at).total_seconds(), 0.0)
+            if built_at
+            else 0.0
+        )
+        store.snapshot_version = snapshot_version
+        return store
+
+    # reading ----------------------------------------------------------------
+
+    def movie_id(self, row: int) -> UUID:
+        return UUID(bytes=self.ids[row].tobytes())
+
+    def features(self, row: int) -> np.ndarray:
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def feature_rows(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (indptr, indices) of the given rows' feature ids as one CSR block.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        gather = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return indptr, self.indices[gather]
+
+    def rows_of(self, movie_ids: Iterable[UUID]) -> list[int]:
+        """
+        Row numbers of the given movies, in order; unknown ids are skipped.
+        """
+        if self._sorted_ids is None:
+            rows = (self._row_by_id.get(m.bytes) for m in movie_ids)
+            return [row for row in rows if row is not None]
+
+        # snapshot-backed: binary search the shared sorted id column
+        movie_ids = list(movie_ids)
+        if not movie_ids or not len(self._sorted_ids):
+            return []
+        keys = np.frombuffer(b"".join(m.bytes for m in movie_ids), dtype=_ID_KEY)
+        sorted_keys = self._sorted_ids.view(_ID_KEY)
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        found = sorted_keys[pos] == keys
+        return [int(r) for r in self._id_order[pos[found]]]
+
+    def candidate(self, row: int) -> Tuple[str, np.ndarray, float, float]:
+        """
+        Ranker input tuple (movie_id, feature_ids, popularity, rating).
+        """
+        return (
+            str(self.movie_id(row)),
+            self.features(row),
+            float(self.popularity[row]),
+            float(self.rating[row]),
+        )
+
+    def top_popular(
+        self, n: int, exclude: set[UUID] | None = None
+    ) -> Iterator[int]:
+        """
+        Row numbers of the n most popular live movies not in `exclude`.
+        """
+        # compare raw id bytes: snapshot-backed stores carry no id → row map
+        exclude_keys = {m.bytes for m in exclude or ()}
+        taken = 0
+        for row in self._by_popularity:
+            if taken >= n:
+                return
+            row = int(row)
+            if exclude_keys and self.ids[row].tobytes() in exclude_keys:
+                continue
+            taken += 1
+            yield row
+
+    def candidates(
+        self, n: int, exclude: set[UUID] | None = None
+    ) -> list[Tuple[str, np.ndarray, float, float]]:
+        """
+        Ranker inputs for the n most popular movies not in `exclude`.
+        """
+        return [self.candidate(row) for row in self.top_popular(n, exclude)]
+
+    # metrics ----------------------------------------------------------------
+
+    def stats(self) -> dict[str, float]:
+        now = time.monotonic()
+        nbytes = sum(
+            getattr(self, name).nbytes
+            for name in (
+                "ids", "popularity", "rating", "indptr", "indices", "alive"
+            )
+        ) + self._by_popularity.nbytes
+        watermark_age = (
+            (datetime.utcnow() - self.watermark).total_seconds()
+            if self.watermark
+            else -1.0
+        )
+        return {
+            "movies": float(len(self)),
+            "rows": float(len(self.alive)),
+            "snapshot": 1.0 if self.snapshot_version else 0.0,
+            "nbytes": float(nbytes),
+            "seconds_since_refresh": (
+                now - self.refreshed_at if self.refreshed_at else -1.0
+            ),
+            "seconds_since_full_load": (
+                now - self.loaded_at if self.loaded_at else -1.0
+            ),
+            "watermark_age_seconds": watermark_age,
+        }
+
+
+catalog_store = CatalogStore()
+
+
+def _store_row_stmt():
+    return select(
+        Movie.id,
+        Movie.popularity,
+        Movie.rating,
+        Movie.feature_ids,
+        Movie.updated_at,
+    )
+
+
+async def refresh_catalog_store(
+    db: AsyncSession,
+    store: CatalogStore = catalog_store,
+    *,
+    min_interval: float = 10.0,
+    full_reload_interval: float = 3600.0,
+    poll_lag: float = 60.0,
+) -> CatalogStore:
+    """
+    Bring the store up to date: full load on first use or every
+    `full_reload_interval` seconds, otherwise a delta since `poll_lag`
+    seconds before the watermark at most every `min_interval` seconds.
+    """
+    now = time.monotonic()
+    if (
+        not store.is_loaded
+        or store.watermark is None
+        or now - store.loaded_at >= full_reload_interval
+    ):
+        result = await db.stream(_store_row_stmt())
+        store.load([tuple(row) async for row in result])
+        return store
+
+    if now - store.refreshed_at < min_interval:
+        return store
+
+    # updated_at is stamped at flush: a transaction that commits after
+    # the watermark moved past its timestamp is only caught by re-reading
+    # `poll_lag` seconds back; re-applying a row is idempotent
+    since = store.watermark - timedelta(seconds=poll_lag)
+    result = await db.execute(
+        _store_row_stmt()
+        .where(Movie.updated_at >= since)
+        .order_by(Movie.updated_at)
+    )
+    store.apply_delta([tuple(row) for row in result.all()])
+    return store
@@ -0,0 +1,421 @@
+"""
+Co-occurrence ("also liked") state in Redis.
+
+All state lives under a generation prefix `cooc:{gen}:`, where `gen` is
+the value of `cooc:generation` (before the first rebuild there is no
+pointer and the prefix is plain `cooc:`). Raw counts are updated
+incrementally as favorites and like-swipes arrive:
+
+    {prefix}user:{user_id}   SET   movies already counted for the user
+    {prefix}{movie_id}       ZSET  co-liked movie -> pair count
+    {prefix}items            ZSET  movie -> number of users who liked it
+    {prefix}users            STR   number of users with at least one like
+    {prefix}dirty            SET   movies whose counts changed
+
+A periodic job normalizes the dirty movies' counts into
+
+    {prefix}topk:{movie_id}  ZSET  neighbour -> cosine/lift similarity
+
+which is what recommendation reads. Raw count sets are trimmed to the
+strongest COOC_MAX_NEIGHBOURS members, so they are approximate between
+the nightly exact rebuild from Postgres.
+
+The rebuild writes a new generation next to the live one and then moves
+the pointer, so readers never see a half-written state. Likes counted
+while it runs are also appended to `cooc:journal` and replayed into the
+new generation after the switch.
+"""
+
+from typing import Iterable, Sequence
+from uuid import UUID
+
+import numpy as np
+from redis import asyncio as redis_async
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.ai.cooccurrence import (COSINE, cooccurrence_matrix,
+                                 neighbour_scores, normalize_counts,
+                                 top_k_neighbours)
+from src.app.tracing import span
+from src.movies.models import Favorite, Swipe
+
+COOC_PREFIX = "cooc:"
+COOC_GENERATION_KEY = "cooc:generation"
+COOC_GENERATION_SEQ_KEY = "cooc:generation_seq"
+# while this key exists, record_like also journals every counted like
+COOC_JOURNAL_ON_KEY = "cooc:journal_on"
+COOC_JOURNAL_KEY = "cooc:journal"
+_CONTROL_KEYS = {
+    COOC_GENERATION_KEY,
+    COOC_GENERATION_SEQ_KEY,
+    COOC_JOURNAL_ON_KEY,
+    COOC_JOURNAL_KEY,
+}
+# a crashed rebuild stops journaling after this long
+COOC_JOURNAL_TTL = 6 * 3600
+
+# raw co-counts kept per movie; the long tail is trimmed on materialize
+COOC_MAX_NEIGHBOURS = 500
+# a like is paired with at most this many of the user's earlier likes
+COOC_MAX_BASKET = 500
+
+
+def generation_prefix(generation) -> str:
+    # no generation yet: the keys written before generations existed
+    return f"{COOC_PREFIX}{generation}:" if generation else COOC_PREFIX
+
+
+def cooc_key(movie_id, prefix: str = COOC_PREFIX) -> str:
+    return f"{prefix}{movie_id}"
+
+
+def cooc_topk_key(movie_id, prefix: str = COOC_PREFIX) -> str:
+    return f"{prefix}topk:{movie_id}"
+
+
+def cooc_user_key(user_id, prefix: str = COOC_PREFIX) -> str:
+    return f"{prefix}user:{user_id}"
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def current_prefix(redis_client: redis_async.Redis) -> str:
+    return generation_prefix(_str(await redis_client.get(COOC_GENERATION_KEY)))
+
+
+def _generation_of(key: str) -> str | None:
+    # "cooc:{gen}:..." -> gen; None for unversioned keys
+    head, sep, _ = key[len(COOC_PREFIX):].partition(":")
+    return head if sep and head.isdigit() else None
+
+
+# SADD + pair increments in one script, so two likes of the same user
+# arriving concurrently cannot both (or neither) count their pair, and
+# the generation is resolved atomically with the writes. Generation keys
+# are derived in the script: single-node Redis only.
+_RECORD_LIKE = """
+local prefix = ARGV[4]
+local generation = redis.call('GET', KEYS[1])
+if generation then
+    prefix = prefix .. generation .. ':'
+end
+local user_key = prefix .. 'user:' .. ARGV[1]
+if redis.call('SADD', user_key, ARGV[2]) == 0 then
+    return 0
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    if redis.call('RPUSH', KEYS[3], ARGV[1] .. ' ' .. ARGV[2]) == 1 then
+        redis.call('EXPIRE', KEYS[3], redis.call('TTL', KEYS[2]))
+    end
+end
+local n = redis.call('SCARD', user_key)
+if n == 1 then
+    redis.call('INCR', prefix .. 'users')
+end
+redis.call('ZINCRBY', prefix .. 'items', 1, ARGV[2])
+redis.call('SADD', prefix .. 'dirty', ARGV[2])
+local others
+if n - 1 > tonumber(ARGV[3]) then
+    others = redis.call('SRANDMEMBER', user_key, ARGV[3])
+else
+    others = redis.call('SMEMBERS', user_key)
+end
+for _, other in ipairs(others) do
+    if other ~= ARGV[2] then
+        redis.call('ZINCRBY', prefix .. ARGV[2], 1, other)
+        redis.call('ZINCRBY', prefix .. other, 1, ARGV[2])
+        redis.call('SADD', prefix .. 'dirty', other)
+    end
+end
+return 1
+"""
+
+
+async def record_like(
+    redis_client: redis_async.Redis, user_id: UUID, movie_id: UUID
+) -> bool:
+    """
+    Count a positive interaction. Idempotent per (user, movie): returns
+    False if it was already counted.
+    """
+    counted = await redis_client.eval(
+        _RECORD_LIKE,
+        3,
+        COOC_GENERATION_KEY,
+        COOC_JOURNAL_ON_KEY,
+        COOC_JOURNAL_KEY,
+        str(user_id),
+        str(movie_id),
+        COOC_MAX_BASKET,
+        COOC_PREFIX,
+    )
+    return bool(counted)
+
+
+async def materialize_dirty(
+    redis_client: redis_async.Redis,
+    *,
+    k: int = 50,
+    method: str = COSINE,
+    batch: int = 500,
+) -> int:
+    """
+    Recompute `cooc:topk:*` for up to `batch` movies whose counts changed
+    and trim their raw counts. Returns how many were materialized.
+    """
+    prefix = await current_prefix(redis_client)
+    popped = await redis_client.spop(f"{prefix}dirty", batch)
+    movie_ids = [_str(m) for m in popped or ()]
+    if not movie_ids:
+        return 0
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(f"{prefix}users")
+        for movie_id in movie_ids:
+            pipe.zrevrange(
+                cooc_key(movie_id, prefix),
+                0,
+                COOC_MAX_NEIGHBOURS - 1,
+                withscores=True,
+            )
+        n_users, *neighbour_lists = await pipe.execute()
+    neighbour_lists = [
+        [(_str(member), score) for member, score in neighbours]
+        for neighbours in neighbour_lists
+    ]
+
+    members = sorted(
+        set(movie_ids) | {m for ns in neighbour_lists for m, _ in ns}
+    )
+    item_counts = dict(
+        zip(members, await redis_client.zmscore(f"{prefix}items", members))
+    )
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for movie_id, neighbours in zip(movie_ids, neighbour_lists):
+            topk = cooc_topk_key(movie_id, prefix)
+            pipe.delete(topk)
+            if neighbours:
+                ids = [m for m, _ in neighbours]
+                scores = normalize_counts(
+                    np.array([c for _, c in neighbours]),
+                    item_counts.get(movie_id) or 0,
+                    np.array([item_counts.get(m) or 0 for m in ids]),
+                    int(n_users or 0),
+                    method,
+                )
+                best = np.argsort(-scores, kind="stable")[:k]
+                mapping = {
+                    ids[i]: float(scores[i]) for i in best if scores[i] > 0
+                }
+                if mapping:
+                    pipe.zadd(topk, mapping)
+            pipe.zremrangebyrank(
+                cooc_key(movie_id, prefix), 0, -(COOC_MAX_NEIGHBOURS + 1)
+            )
+        await pipe.execute()
+    return len(movie_ids)
+
+
+async def get_cooccurrence_scores(
+    redis_client: redis_async.Redis, seed_ids: Sequence[UUID], k: int = 50
+) -> dict[str, float]:
+    """
+    `{movie_id: summed similarity}` over the top-k lists of the seeds.
+    """
+    if not seed_ids:
+        return {}
+    prefix = await current_prefix(redis_client)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for movie_id in seed_ids:
+            pipe.zrevrange(
+                cooc_topk_key(movie_id, prefix), 0, k - 1, withscores=True
+            )
+        neighbour_lists = await pipe.execute()
+    return neighbour_scores(
+        [(_str(member), score) for member, score in neighbours]
+        for neighbours in neighbour_lists
+    )
+
+
+def _positive_interactions_stmt():
+    # UNION (not ALL): favoriting a liked movie is one signal, not two
+    return union(
+        select(Favorite.user_id, Favorite.movie_id),
+        select(Swipe.user_id, Swipe.movie_id).where(Swipe.direction == "like"),
+    ).order_by("user_id")
+
+
+async def _load_baskets(
+    db: AsyncSession,
+) -> tuple[list[UUID], dict[UUID, list[int]]]:
+    """
+    (distinct movies, per-user liked movies as indices into them).
+    """
+    movie_index: dict[UUID, int] = {}
+    baskets: dict[UUID, list[int]] = {}
+    result = await db.stream(_positive_interactions_stmt())
+    async for user_id, movie_id in result:
+        row = movie_index.setdefault(movie_id, len(movie_index))
+        baskets.setdefault(user_id, []).append(row)
+    return list(movie_index), baskets
+
+
+def _batches(items: Iterable, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _unlink_generations_except(
+    redis_client: redis_async.Redis, keep: str | None, chunk: int
+) -> int:
+    """
+    Remove every co-occurrence key outside generation `keep` (None: the
+    unversioned keys); control keys stay. SCAN, not KEYS: never block Redis.
+    """
+    removed = 0
+    stale: list = []
+    async for key in redis_client.scan_iter(match=f"{COOC_PREFIX}*", count=1000):
+        name = _str(key)
+        if name in _CONTROL_KEYS or _generation_of(name) == keep:
+            continue
+        stale.append(key)
+        if len(stale) >= chunk:
+            removed += await redis_client.unlink(*stale)
+            stale = []
+    if stale:
+        removed += await redis_client.unlink(*stale)
+    return removed
+
+
+async def _replay_journal(redis_client: redis_async.Redis) -> int:
+    """
+    Count the journaled likes into the current generation (record_like is
+    idempotent, so likes the rebuild already read are skipped).
+    """
+    replayed = 0
+    for entry in await redis_client.lrange(COOC_JOURNAL_KEY, 0, -1):
+        user_id, movie_id = _str(entry).split(" ", 1)
+        replayed += await record_like(redis_client, user_id, movie_id)
+    return replayed
+
+
+async def rebuild_cooccurrence(
+    db: AsyncSession,
+    redis_client: redis_async.Redis,
+    *,
+    k: int = 50,
+    method: str = COSINE,
+    chunk: int = 1000,
+) -> dict[str, float]:
+    """
+    Exact rebuild of the co-occurrence state from favorites and
+    like-swipes, into a new generation that replaces the live one only
+    once it is complete. Likes counted from before the Postgres read until
+    the switch are journaled and replayed into it.
+    """
+    # before reading: a like committed after the read is journaled
+    await redis_client.delete(COOC_JOURNAL_KEY)
+    await redis_client.set(COOC_JOURNAL_ON_KEY, 1, ex=COOC_JOURNAL_TTL)
+
+    with span("load_baskets") as sp:
+        movies, baskets = await _load_baskets(db)
+        sp.set(users=len(baskets), movies=len(movies))
+    with span("count") as sp:
+        matrix, item_counts, n_users = cooccurrence_matrix(
+            (np.array(b) for b in baskets.values()),
+            len(movies),
+            max_basket=COOC_MAX_BASKET,
+        )
+        sp.set(pairs=len(matrix.indices) // 2)
+
+    live = _str(await redis_client.get(COOC_GENERATION_KEY))
+    with span("cleanup_stale"):
+        # leftovers of a rebuild that died before switching
+        await _unlink_generations_except(redis_client, live, chunk)
+    generation = str(await redis_client.incr(COOC_GENERATION_SEQ_KEY))
+    prefix = generation_prefix(generation)
+
+    with span("write_counts", generation=generation):
+        for users in _batches(baskets.items(), chunk):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for user_id, liked in users:
+                    pipe.sadd(
+                        cooc_user_key(user_id, prefix),
+                        *[str(movies[r]) for r in liked],
+                    )
+                await pipe.execute()
+
+        counted = np.flatnonzero(item_counts)
+        for rows in _batches(counted.tolist(), chunk):
+            mapping = {str(movies[r]): int(item_counts[r]) for r in rows}
+            await redis_client.zadd(f"{prefix}items", mapping)
+        await redis_client.set(f"{prefix}users", n_users)
+
+        for rows in _batches(range(matrix.n_rows), chunk):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for row in rows:
+                    lo, hi = matrix.indptr[row], matrix.indptr[row + 1]
+                    if hi == lo:
+                        continue
+                    counts = matrix.data[lo:hi]
+                    strongest = np.argsort(-counts, kind="stable")
+                    strongest = strongest[:COOC_MAX_NEIGHBOURS]
+                    pipe.zadd(
+                        cooc_key(movies[row], prefix),
+                        {
+                            str(movies[matrix.indices[lo + i]]): float(counts[i])
+                            for i in strongest
+                        },
+                    )
+                await pipe.execute()
+
+    # top-k lists are computed lazily, batch by batch, as they are written
+    with span("write_topk", generation=generation) as sp:
+        written = 0
+        for batch in _batches(
+            top_k_neighbours(matrix, item_counts, n_users, k, method), chunk
+        ):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for item, neighbours, scores in batch:
+                    pipe.zadd(
+                        cooc_topk_key(movies[item], prefix),
+                        {
+                            str(movies[n]): float(s)
+                            for n, s in zip(neighbours, scores)
+                        },
+                    )
+                await pipe.execute()
+            written += len(batch)
+        sp.set(lists=written)
+
+    with span("switch", generation=generation) as sp:
+        # switch: record_like and readers resolve the generation per call
+        await redis_client.set(COOC_GENERATION_KEY, generation)
+        # likes journaled after this read were counted into the new
+        # generation directly
+        replayed = await _replay_journal(redis_client)
+        await redis_client.delete(COOC_JOURNAL_ON_KEY, COOC_JOURNAL_KEY)
+        removed = await _unlink_generations_except(
+            redis_client, generation, chunk
+        )
+        sp.set(replayed=replayed, removed=removed)
+
+    return {
+        "generation": float(generation),
+        "users": float(n_users),
+        "movies": float(len(counted)),
+        "pairs": float(len(matrix.indices) // 2),
+        "topk_lists": float(written),
+        "replayed_likes": float(replayed),
+        "removed_keys": float(removed),
+    }
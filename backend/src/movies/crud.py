@@ -1,12 +1,18 @@
-from datetime import date
-from typing import Any, Dict, Sequence
-from uuid import UUID
-
-from sqlalchemy import and_, select
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Dict, Mapping, Sequence
+from uuid import UUID, uuid4
+
+from sqlalchemy import (and_, bindparam, delete, exists, func, or_, select,
+                        true, update)
+from sqlalchemy.dialects.postgresql import array, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.movies.models import (AIRecommendation, Dislike, Favorite, Movie,
-                               Status, Swipe)
+from src.ai.features import GENRE, KEYWORD, FeatureVocabulary
+from src.auth.models import Profile
+from src.movies.models import (AIRecommendation, Dislike, Favorite, Feature,
+                               Movie, Status, Swipe,
+                               recommendation_generation_seq)
 from src.movies.schema import MovieCreate, MovieUpdate
 
 
@@ -19,6 +25,97 @@ def _extract_keywords(keywords_data: Dict[str, Any]) -> list[str] | None:
     return [k.get("name") for k in keywords_data if k.get("name")]
 
 
+# Feature vocabulary -------------------------------------------------------
+
+
+async def intern_features(
+    db: AsyncSession,
+    genres: list[str] | None,
+    keywords: list[str] | None,
+) -> list[int]:
+    """
+    Map genre/keyword names to `features` ids, creating missing entries.
+
+    DO NOTHING instead of a no-op DO UPDATE: genres like "Drama" are hit by
+    every sync, and rewriting the row each time would only create churn.
+    """
+    wanted = {(GENRE, g) for g in genres or [] if g} | {
+        (KEYWORD, k) for k in keywords or [] if k
+    }
+    if not wanted:
+        return []
+
+    rows = [{"kind": kind, "name": name} for kind, name in sorted(wanted)]
+    await db.execute(
+        insert(Feature).values(rows).on_conflict_do_nothing(
+            constraint="uq_features_kind_name"
+        )
+    )
+    vocab = await load_feature_vocabulary(
+        db,
+        genres=[n for k, n in wanted if k == GENRE],
+        keywords=[n for k, n in wanted if k == KEYWORD],
+    )
+    return sorted(
+        {*vocab.encode(GENRE, genres), *vocab.encode(KEYWORD, keywords)}
+    )
+
+
+async def load_feature_vocabulary(
+    db: AsyncSession,
+    *,
+    ids: Sequence[int] | None = None,
+    genres: Sequence[str] | None = None,
+    keywords: Sequence[str] | None = None,
+) -> FeatureVocabulary:
+    """
+    Load the slice of the vocabulary a caller needs (by id or by name).
+    """
+    clauses = []
+    if ids:
+        clauses.append(Feature.id.in_(list(ids)))
+    if genres:
+        clauses.append(and_(Feature.kind == GENRE, Feature.name.in_(list(genres))))
+    if keywords:
+        clauses.append(
+            and_(Feature.kind == KEYWORD, Feature.name.in_(list(keywords)))
+        )
+    if not clauses:
+        return FeatureVocabulary()
+
+    result = await db.execute(
+        select(Feature.id, Feature.kind, Feature.name).where(or_(*clauses))
+    )
+    return FeatureVocabulary(result.all())
+
+
+async def refresh_feature_doc_freq(db: AsyncSession) -> None:
+    """
+    Recompute `features.doc_freq` from movies.feature_ids in bulk.
+    """
+    fid = func.unnest(Movie.feature_ids).table_valued("value").alias("fid")
+    counts = (
+        select(fid.c.value.label("feature_id"), func.count().label("n"))
+        .select_from(Movie)
+        .join(fid, true())
+        .group_by(fid.c.value)
+        .subquery()
+    )
+    await db.execute(
+        update(Feature)
+        .where(Feature.id == counts.c.feature_id)
+        .where(Feature.doc_freq.is_distinct_from(counts.c.n))
+        .values(doc_freq=counts.c.n)
+    )
+    await db.execute(
+        update(Feature)
+        .where(Feature.doc_freq != 0)
+        .where(~exists().where(Movie.feature_ids.contains(array([Feature.id]))))
+        .values(doc_freq=0)
+    )
+    await db.commit()
+
+
 async def upsert_movie_from_tmdb(
     db: AsyncSession,
     tmdb_movie: Dict[str, Any],
@@ -57,6 +154,7 @@ async def upsert_movie_from_tmdb(
         "backdrop_url": f"https://image.tmdb.org/t/p/w500{backdrop_path}" if backdrop_path else None,
         "genres": genres,
         "keywords": kw_list,
+        "feature_ids": await intern_features(db, genres, kw_list),
         "metadata_json": tmdb_movie,
     }
 
@@ -79,13 +177,139 @@ async def get_movie(db: AsyncSession, movie_id: UUID) -> Movie | None:
     return result.scalar_one_or_none()
 
 
-async def list_movies(db: AsyncSession) -> Sequence[Movie]:
-    result = await db.execute(select(Movie))
+async def get_movies_by_ids(
+    db: AsyncSession, movie_ids: Sequence[UUID]
+) -> list[Movie]:
+    """
+    Movies in the order of `movie_ids`; missing ids are skipped.
+    """
+    if not movie_ids:
+        return []
+    result = await db.execute(select(Movie).where(Movie.id.in_(movie_ids)))
+    by_id = {m.id: m for m in result.scalars().all()}
+    return [by_id[m] for m in movie_ids if m in by_id]
+
+
+async def list_movies(
+    db: AsyncSession,
+    *,
+    genres: list[str] | None = None,
+    genres_mode: str = "any",
+    keywords: list[str] | None = None,
+    keywords_mode: str = "any",
+    year_from: int | None = None,
+    year_to: int | None = None,
+    min_rating: float | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+) -> Sequence[Movie]:
+    """
+    Catalog listing with optional filters.
+
+    Array filters use `&&` (any) / `@>` (all) so they hit the GIN indexes
+    on genres/keywords; the year range is expressed on release_date so the
+    btree index applies.
+    """
+    stmt = select(Movie)
+    if genres:
+        stmt = stmt.where(
+            Movie.genres.contains(genres)
+            if genres_mode == "all"
+            else Movie.genres.overlap(genres)
+        )
+    if keywords:
+        stmt = stmt.where(
+            Movie.keywords.contains(keywords)
+            if keywords_mode == "all"
+            else Movie.keywords.overlap(keywords)
+        )
+    if year_from is not None:
+        stmt = stmt.where(Movie.release_date >= date(year_from, 1, 1))
+    if year_to is not None:
+        stmt = stmt.where(Movie.release_date <= date(year_to, 12, 31))
+    if min_rating is not None:
+        stmt = stmt.where(Movie.rating >= min_rating)
+    if limit is not None:
+        stmt = stmt.order_by(Movie.popularity.desc().nulls_last(), Movie.id)
+        stmt = stmt.offset(offset).limit(limit)
+
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+
+async def compute_catalog_facets(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Movie counts per genre and per release decade (unnest aggregates).
+
+    Full-table scan: meant for the scheduled refresh_catalog_facets task,
+    never for request handlers.
+    """
+    genre = func.unnest(Movie.genres).table_valued("value").alias("genre")
+    genre_rows = await db.execute(
+        select(genre.c.value, func.count())
+        .select_from(Movie)
+        .join(genre, true())
+        .group_by(genre.c.value)
+        .order_by(func.count().desc())
+    )
+
+    decade = (
+        func.floor(func.extract("year", Movie.release_date) / 10) * 10
+    ).label("decade")
+    decade_rows = await db.execute(
+        select(decade, func.count())
+        .where(Movie.release_date.is_not(None))
+        .group_by("decade")
+        .order_by("decade")
+    )
+
+    return {
+        "genres": [
+            {"value": value, "count": count} for value, count in genre_rows.all()
+        ],
+        "decades": [
+            {"value": f"{int(value)}s", "count": count}
+            for value, count in decade_rows.all()
+        ],
+        "generated_at": datetime.utcnow().isoformat(),
+    }
+
+
+async def search_movies(
+    db: AsyncSession, query: str, limit: int = 20
+) -> Sequence[Movie]:
+    """
+    Full-text + fuzzy search over the local catalog.
+
+    Matches either the weighted `search_vector` (GIN) or a trigram
+    similarity on the title (pg_trgm GIN, tolerates typos), and ranks by
+    ts_rank + title similarity, boosted by log popularity.
+    """
+    ts_query = func.websearch_to_tsquery("english", query)
+    text_rank = func.ts_rank(Movie.search_vector, ts_query)
+    title_sim = func.similarity(Movie.title, query)
+    popularity_boost = func.ln(1 + func.coalesce(Movie.popularity, 0))
+
+    stmt = (
+        select(Movie)
+        .where(
+            or_(
+                Movie.search_vector.op("@@")(ts_query),
+                Movie.title.op("%")(query),
+            )
+        )
+        .order_by((text_rank + title_sim + 0.05 * popularity_boost).desc())
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
 async def create_movie(db: AsyncSession, data: MovieCreate) -> Movie:
-    movie = Movie(**data.model_dump())
+    movie = Movie(
+        **data.model_dump(),
+        feature_ids=await intern_features(db, data.genres, data.keywords),
+    )
     db.add(movie)
     await db.commit()
     await db.refresh(movie)
@@ -97,8 +321,13 @@ async def update_movie(
     movie: Movie,
     data: MovieUpdate,
 ) -> Movie:
-    for field, value in data.model_dump(exclude_unset=True).items():
+    changes = data.model_dump(exclude_unset=True)
+    for field, value in changes.items():
         setattr(movie, field, value)
+    if "genres" in changes or "keywords" in changes:
+        movie.feature_ids = await intern_features(
+            db, movie.genres, movie.keywords
+        )
     await db.commit()
     await db.refresh(movie)
     return movie
@@ -110,79 +339,92 @@ async def delete_movie(db: AsyncSession, movie: Movie) -> None:
 
 
 # Favorites / dislikes -----------------------------------------------------
+#
+# Every interaction write is a single statement: INSERT ... ON CONFLICT
+# returns the existing row instead of racing a SELECT against a concurrent
+# double-tap, and the opposite reaction is cleared in the same statement
+# through a data-modifying CTE.
+
+
+def _clear_cte(model, user_id: UUID, movie_id: UUID, name: str):
+    return delete(model).where(
+        and_(model.user_id == user_id, model.movie_id == movie_id)
+    ).cte(name)
 
 
 async def add_favorite(
     db: AsyncSession, user_id: UUID, movie_id: UUID
 ) -> Favorite:
-    # idempotent: не создаём дубликат, если уже есть такая пара user/movie
-    result = await db.execute(
-        select(Favorite).where(
-            and_(Favorite.user_id == user_id, Favorite.movie_id == movie_id)
+    # idempotent: no-op DO UPDATE so RETURNING yields the existing row too
+    stmt = (
+        insert(Favorite)
+        .values(user_id=user_id, movie_id=movie_id)
+        .on_conflict_do_update(
+            constraint="uq_favorites_user_movie",
+            set_={"created_at": Favorite.created_at},
         )
+        .returning(Favorite)
+        .add_cte(_clear_cte(Dislike, user_id, movie_id, "cleared_dislike"))
+        .execution_options(populate_existing=True)
     )
-    existing = result.scalar_one_or_none()
-    if existing:
-        return existing
-
-    fav = Favorite(user_id=user_id, movie_id=movie_id)
-    db.add(fav)
+    fav = await db.scalar(stmt)
     await db.commit()
-    await db.refresh(fav)
     return fav
 
 
 async def remove_favorite(
     db: AsyncSession, user_id: UUID, movie_id: UUID
-) -> None:
+) -> bool:
     result = await db.execute(
-        select(Favorite).where(
+        delete(Favorite)
+        .where(
             and_(
                 Favorite.user_id == user_id,
                 Favorite.movie_id == movie_id,
             )
         )
+        .returning(Favorite.id)
     )
-    fav = result.scalar_one_or_none()
-    if fav:
-        await db.delete(fav)
-        await db.commit()
+    removed = result.scalar_one_or_none() is not None
+    await db.commit()
+    return removed
 
 
 async def add_dislike(
     db: AsyncSession, user_id: UUID, movie_id: UUID
 ) -> Dislike:
-    result = await db.execute(
-        select(Dislike).where(
-            and_(Dislike.user_id == user_id, Dislike.movie_id == movie_id)
+    stmt = (
+        insert(Dislike)
+        .values(user_id=user_id, movie_id=movie_id)
+        .on_conflict_do_update(
+            constraint="uq_dislikes_user_movie",
+            set_={"created_at": Dislike.created_at},
         )
+        .returning(Dislike)
+        .add_cte(_clear_cte(Favorite, user_id, movie_id, "cleared_favorite"))
+        .execution_options(populate_existing=True)
     )
-    existing = result.scalar_one_or_none()
-    if existing:
-        return existing
-
-    d = Dislike(user_id=user_id, movie_id=movie_id)
-    db.add(d)
+    d = await db.scalar(stmt)
     await db.commit()
-    await db.refresh(d)
     return d
 
 
 async def remove_dislike(
     db: AsyncSession, user_id: UUID, movie_id: UUID
-) -> None:
+) -> bool:
     result = await db.execute(
-        select(Dislike).where(
+        delete(Dislike)
+        .where(
             and_(
                 Dislike.user_id == user_id,
                 Dislike.movie_id == movie_id,
             )
         )
+        .returning(Dislike.id)
     )
-    d = result.scalar_one_or_none()
-    if d:
-        await db.delete(d)
-        await db.commit()
+    removed = result.scalar_one_or_none() is not None
+    await db.commit()
+    return removed
 
 
 # Statuses -----------------------------------------------------------------
@@ -191,25 +433,25 @@ async def remove_dislike(
 async def upsert_status(
     db: AsyncSession, user_id: UUID, movie_id: UUID, status_value: str
 ) -> Status:
-    result = await db.execute(
-        select(Status).where(
-            and_(
-                Status.user_id == user_id,
-                Status.movie_id == movie_id,
-            )
+    stmt = insert(Status).values(
+        user_id=user_id,
+        movie_id=movie_id,
+        status=status_value,
+        updated_at=datetime.utcnow(),
+    )
+    stmt = (
+        stmt.on_conflict_do_update(
+            constraint="uq_statuses_user_movie",
+            set_={
+                "status": stmt.excluded.status,
+                "updated_at": stmt.excluded.updated_at,
+            },
         )
+        .returning(Status)
+        .execution_options(populate_existing=True)
     )
-    s = result.scalar_one_or_none()
-    if s:
-        s.status = status_value
-        await db.commit()
-        await db.refresh(s)
-        return s
-
-    s = Status(user_id=user_id, movie_id=movie_id, status=status_value)
-    db.add(s)
+    s = await db.scalar(stmt)
     await db.commit()
-    await db.refresh(s)
     return s
 
 
@@ -224,3 +466,122 @@ async def create_swipe(
     await db.commit()
     await db.refresh(swipe)
     return swipe
+
+
+# Recommendations ----------------------------------------------------------
+
+# rows per multi-VALUES insert (6 bind params each, asyncpg caps at 32767)
+_RECS_WRITE_CHUNK = 5000
+
+
+def active_recommendations(user_id: UUID):
+    """
+    WHERE clause for the user's rows in their live generation; rows of a
+    generation still being written (or already replaced) never match.
+    """
+    return and_(
+        AIRecommendation.user_id == user_id,
+        AIRecommendation.generation
+        == select(Profile.rec_generation)
+        .where(Profile.user_id == user_id)
+        .scalar_subquery(),
+    )
+
+
+async def write_recommendation_generation(
+    db: AsyncSession, user_id: UUID, rankings: Sequence[tuple[str, float]]
+) -> int:
+    """
+    Insert `rankings` as a new generation and make it the user's live one,
+    in one transaction. Returns the generation id.
+    """
+    generations = await write_recommendation_generations(db, {user_id: rankings})
+    return generations[user_id]
+
+
+async def write_recommendation_generations(
+    db: AsyncSession, rankings_by_user: Mapping[UUID, Sequence[tuple[str, float]]]
+) -> dict[UUID, int]:
+    """
+    Bulk form of write_recommendation_generation: one new generation per
+    user, all rows and pointer flips in one transaction. A run that lost a
+    race to a newer generation leaves that user's pointer alone; its rows
+    are pruned like any other stale generation.
+    """
+    users = list(rankings_by_user)
+    if not users:
+        return {}
+    generation_ids = (
+        await db.scalars(
+            select(recommendation_generation_seq.next_value()).select_from(
+                func.generate_series(1, len(users))
+            )
+        )
+    ).all()
+    generations = dict(zip(users, generation_ids))
+
+    now = datetime.utcnow()
+    rows = (
+        {
+            "id": uuid4(),
+            "user_id": user_id,
+            "movie_id": UUID(mid),
+            "generation": generations[user_id],
+            "score": score,
+            "generated_at": now,
+        }
+        for user_id in users
+        for mid, score in rankings_by_user[user_id]
+    )
+    while batch := list(islice(rows, _RECS_WRITE_CHUNK)):
+        await db.execute(insert(AIRecommendation).values(batch))
+
+    profiles = Profile.__table__
+    await db.execute(
+        update(profiles)
+        .where(
+            profiles.c.user_id == bindparam("b_user_id"),
+            or_(
+                profiles.c.rec_generation.is_(None),
+                profiles.c.rec_generation < bindparam("b_generation"),
+            ),
+        )
+        .values(rec_generation=bindparam("b_generation")),
+        [
+            {"b_user_id": user_id, "b_generation": generation}
+            for user_id, generation in generations.items()
+        ],
+    )
+    await db.commit()
+    return generations
+
+
+async def prune_recommendation_generations(
+    db: AsyncSession, batch: int = 10_000
+) -> int:
+    """
+    Delete rows of replaced generations (and of users without a live one)
+    in batches of `batch`, committing after each. Returns rows deleted.
+    """
+    stale = (
+        select(AIRecommendation.id)
+        .outerjoin(Profile, Profile.user_id == AIRecommendation.user_id)
+        .where(
+            or_(
+                Profile.rec_generation.is_(None),
+                AIRecommendation.generation < Profile.rec_generation,
+            )
+        )
+        .limit(batch)
+    )
+    total = 0
+    while True:
+        result = await db.execute(
+            delete(AIRecommendation)
+            .where(AIRecommendation.id.in_(stale))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        total += result.rowcount
+        if result.rowcount < batch:
+            return total
@@ -0,0 +1,276 @@
+"""
+Collaborative filtering with implicit-feedback ALS (see src.ai.als).
+
+A scheduled job (`train_factor_model` task) trains on every user's
+favorites, dislikes, watch statuses and like-swipes, writes a new
+`factor_models` version with its `movie_factors`, and stores each trained
+user's factors on their profile. Between trainings, `recalc_taste_vector`
+folds the user's current interactions into the latest movie factors, so
+new users and new likes get fresh factors without a retrain.
+"""
+
+import asyncio
+import time
+from typing import Mapping, NamedTuple, Sequence
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.ai.als import fold_in, interaction_matrix, train_als
+from src.ai.taste import INTERACTION_STRENGTH, STATUS_WEIGHTS
+from src.app.tracing import span
+from src.auth.models import Profile
+from src.movies.models import (Dislike, FactorModel, Favorite, MovieFactor,
+                               Status, Swipe)
+
+# rows per multi-VALUES insert / executemany batch
+_WRITE_CHUNK = 5000
+# previous versions kept for profiles folded in against them
+KEEP_VERSIONS = 2
+
+
+class FactorModelParams(NamedTuple):
+    version: int
+    factors: int
+    reg: float
+    alpha: float
+    gram: np.ndarray
+
+
+_model_cache: dict[int, FactorModelParams] = {}
+
+
+def _vector(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype="<f4")
+
+
+def _interaction_sources():
+    # (statement, strength) per interaction type; the matrix sums a user's
+    # interactions with the same movie
+    strength = INTERACTION_STRENGTH
+    yield select(Favorite.user_id, Favorite.movie_id), strength["favorite"]
+    yield select(Dislike.user_id, Dislike.movie_id), strength["dislike"]
+    yield (
+        select(Swipe.user_id, Swipe.movie_id).where(Swipe.direction == "like"),
+        strength["like"],
+    )
+    for status in STATUS_WEIGHTS:
+        yield (
+            select(Status.user_id, Status.movie_id).where(Status.status == status),
+            strength[status],
+        )
+
+
+async def load_interactions(db: AsyncSession):
+    """
+    (user ids, movie ids, rows, cols, strengths) of every interaction,
+    rows/cols indexing into the id lists.
+    """
+    user_index: dict[UUID, int] = {}
+    movie_index: dict[UUID, int] = {}
+    rows: list[int] = []
+    cols: list[int] = []
+    values: list[float] = []
+    for stmt, strength in _interaction_sources():
+        result = await db.stream(stmt)
+        async for user_id, movie_id in result:
+            rows.append(user_index.setdefault(user_id, len(user_index)))
+            cols.append(movie_index.setdefault(movie_id, len(movie_index)))
+            values.append(strength)
+    return list(user_index), list(movie_index), rows, cols, values
+
+
+async def train_factor_model(
+    db: AsyncSession,
+    *,
+    factors: int = 64,
+    reg: float = 0.1,
+    alpha: float = 10.0,
+    iterations: int = 15,
+    cg_steps: int = 3,
+) -> dict[str, float]:
+    """
+    Train a new model version and write it in one transaction. Returns
+    sizes and timings for the job log.
+    """
+    t0 = time.perf_counter()
+    with span("load_interactions") as sp:
+        user_ids, movie_ids, rows, cols, values = await load_interactions(db)
+        if not user_ids:
+            return {"users": 0.0}
+        m = interaction_matrix(rows, cols, values, len(user_ids), len(movie_ids))
+        del rows, cols, values
+        sp.set(
+            users=len(user_ids), movies=len(movie_ids), interactions=len(m.indices)
+        )
+
+    t1 = time.perf_counter()
+    with span("train", factors=factors, iterations=iterations):
+        # CPU-bound; NumPy releases the GIL, the event loop stays responsive
+        user_factors, movie_factors = await asyncio.to_thread(
+            train_als,
+            m,
+            factors=factors,
+            reg=reg,
+            alpha=alpha,
+            iterations=iterations,
+            cg_steps=cg_steps,
+        )
+        gram = movie_factors.T @ movie_factors
+    t2 = time.perf_counter()
+
+    with span("write_model") as sp:
+        model = FactorModel(
+            factors=factors,
+            reg=reg,
+            alpha=alpha,
+            gram=gram.astype("<f4").tobytes(),
+            users=len(user_ids),
+            movies=len(movie_ids),
+            interactions=len(m.indices),
+        )
+        db.add(model)
+        await db.flush()
+        version = model.version
+        sp.set(version=version)
+
+        for start in range(0, len(movie_ids), _WRITE_CHUNK):
+            await db.execute(
+                insert(MovieFactor).values(
+                    [
+                        {
+                            "version": version,
+                            "movie_id": movie_ids[i],
+                            "vector": movie_factors[i].astype("<f4").tobytes(),
+                        }
+                        for i in range(
+                            start, min(start + _WRITE_CHUNK, len(movie_ids))
+                        )
+                    ]
+                )
+            )
+
+        profiles = Profile.__table__
+        set_factors = (
+            update(profiles)
+            .where(profiles.c.user_id == bindparam("b_user_id"))
+            .values(mf_factors=bindparam("b_factors"), mf_version=version)
+        )
+        for start in range(0, len(user_ids), _WRITE_CHUNK):
+            await db.execute(
+                set_factors,
+                [
+                    {
+                        "b_user_id": user_ids[i],
+                        "b_factors": user_factors[i].astype("<f4").tobytes(),
+                    }
+                    for i in range(
+                        start, min(start + _WRITE_CHUNK, len(user_ids))
+                    )
+                ],
+            )
+
+        # movie_factors go with their model (ON DELETE CASCADE)
+        await db.execute(
+            delete(FactorModel).where(
+                FactorModel.version <= version - KEEP_VERSIONS
+            )
+        )
+        await db.commit()
+
+    return {
+        "version": float(version),
+        "users": float(len(user_ids)),
+        "movies": float(len(movie_ids)),
+        "interactions": float(len(m.indices)),
+        "load_seconds": t1 - t0,
+        "train_seconds": t2 - t1,
+        "write_seconds": time.perf_counter() - t2,
+    }
+
+
+async def get_factor_model(db: AsyncSession) -> FactorModelParams | None:
+    """
+    Latest model; its Gram matrix is read once per version and process.
+    """
+    version = await db.scalar(select(func.max(FactorModel.version)))
+    if version is None:
+        return None
+    params = _model_cache.get(version)
+    if params is None:
+        model = await db.get(FactorModel, version)
+        if model is None:
+            return None
+        params = FactorModelParams(
+            version,
+            model.factors,
+            model.reg,
+            model.alpha,
+            _vector(model.gram).reshape(model.factors, model.factors),
+        )
+        _model_cache.clear()
+        _model_cache[version] = params
+    return params
+
+
+async def load_movie_factors(
+    db: AsyncSession, version: int, movie_ids: Sequence[UUID]
+) -> dict[UUID, np.ndarray]:
+    if not movie_ids:
+        return {}
+    result = await db.execute(
+        select(MovieFactor.movie_id, MovieFactor.vector).where(
+            (MovieFactor.version == version)
+            & MovieFactor.movie_id.in_(list(movie_ids))
+        )
+    )
+    return {movie_id: _vector(vector) for movie_id, vector in result.all()}
+
+
+async def fold_in_profile(
+    db: AsyncSession, profile: Profile, strengths: Mapping[UUID, float]
+) -> None:
+    """
+    Set `profile.mf_factors` from the user's interaction strengths and the
+    latest movie factors (movies newer than the model are skipped). The
+    caller commits.
+    """
+    model = await get_factor_model(db)
+    if model is None:
+        return
+    items = await load_movie_factors(
+        db, model.version, [m for m, s in strengths.items() if s]
+    )
+    if not items:
+        profile.mf_factors = None
+        profile.mf_version = None
+        return
+    ids = list(items)
+    user = fold_in(
+        np.stack([items[m] for m in ids]),
+        np.array([strengths[m] for m in ids]),
+        model.gram,
+        model.reg,
+        model.alpha,
+    )
+    profile.mf_factors = user.astype("<f4").tobytes()
+    profile.mf_version = model.version
+
+
+async def factor_scores(
+    db: AsyncSession, profile: Profile, movie_ids: Sequence[UUID]
+) -> dict[str, float]:
+    """
+    `{movie_id: predicted preference}` for the candidates that have
+    factors; empty when the profile has none for a live model version.
+    """
+    if profile.mf_factors is None or profile.mf_version is None:
+        return {}
+    items = await load_movie_factors(db, profile.mf_version, movie_ids)
+    if not items:
+        return {}
+    ids = list(items)
+    scores = np.stack([items[m] for m in ids]) @ _vector(profile.mf_factors)
+    return {str(m): float(s) for m, s in zip(ids, scores)}
@@ -1,9 +1,11 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import (Column, Date, DateTime, Float, ForeignKey, Numeric,
-                        Text, UniqueConstraint)
-from sqlalchemy.dialects.postgresql import ARRAY, ENUM, JSONB, UUID
+from sqlalchemy import (BigInteger, Column, Computed, Date, DateTime, Float,
+                        ForeignKey, Index, Integer, LargeBinary, Numeric,
+                        Sequence, Text, UniqueConstraint)
+from sqlalchemy.dialects.postgresql import ARRAY, ENUM, JSONB, TSVECTOR, UUID
+from sqlalchemy.orm import deferred
 
 from src.app.base import Base
 
@@ -21,24 +23,153 @@ swipe_direction_enum = ENUM(
     name="swipe_direction",
 )
 
+feature_kind_enum = ENUM(
+    "genre",
+    "keyword",
+    name="feature_kind",
+)
+
+
+class Feature(Base):
+    """
+    Interned genre/keyword vocabulary; movies reference it by integer id.
+    """
+
+    __tablename__ = "features"
+    __table_args__ = (
+        UniqueConstraint("kind", "name", name="uq_features_kind_name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(feature_kind_enum, nullable=False)
+    name = Column(Text, nullable=False)
+    # number of movies carrying the feature (refreshed by a scheduled task)
+    doc_freq = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+# Weighted full-text document: title (A) > keywords (B) > overview (C).
+# movies_keywords_text() is an IMMUTABLE wrapper around array_to_string,
+# created in the migration, because generated columns reject STABLE functions.
+MOVIE_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', "
+    "coalesce(movies_keywords_text(keywords), '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(overview, '')), 'C')"
+)
+
 
 class Movie(Base):
     __tablename__ = "movies"
+    __table_args__ = (
+        Index(
+            "ix_movies_search_vector",
+            "search_vector",
+            postgresql_using="gin",
+        ),
+        Index(
+            "ix_movies_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index("ix_movies_genres", "genres", postgresql_using="gin"),
+        Index("ix_movies_keywords", "keywords", postgresql_using="gin"),
+        Index("ix_movies_feature_ids", "feature_ids", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tmdb_id = Column(Text, unique=True, nullable=True)
     title = Column(Text, nullable=False)
     overview = Column(Text, nullable=True)
-    release_date = Column(Date, nullable=True)
+    release_date = Column(Date, nullable=True, index=True)
     rating = Column(Numeric, nullable=True)
     popularity = Column(Numeric, nullable=True)
     poster_url = Column(Text, nullable=True)
     backdrop_url = Column(Text, nullable=True)
     genres = Column(ARRAY(Text), nullable=True)
     keywords = Column(ARRAY(Text), nullable=True)
+    # sorted ids into `features` (genres + keywords), kept in sync on write
+    feature_ids = Column(ARRAY(Integer), nullable=True)
     metadata_json = Column("metadata", JSONB, nullable=True)
+    # deferred: only the search query needs it, keep it out of SELECT *
+    search_vector = deferred(
+        Column(TSVECTOR, Computed(MOVIE_SEARCH_VECTOR_SQL, persisted=True))
+    )
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
+    # change feed for in-process caches (autocomplete) polls on this column
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
+
+
+class MovieEmbedding(Base):
+    """
+    Content embedding of a movie (TF-IDF + truncated SVD, little-endian
+    float32). All rows written by one build share its `version`.
+    """
+
+    __tablename__ = "movie_embeddings"
+
+    movie_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("movies.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    version = Column(BigInteger, nullable=False, index=True)
+    vector = Column(LargeBinary, nullable=False)
+
+
+class SimilarMovies(Base):
+    """
+    Precomputed exact top-k content neighbours of a popular movie.
+    """
+
+    __tablename__ = "similar_movies"
+
+    movie_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("movies.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    version = Column(BigInteger, nullable=False)
+    similar_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=False)
+    scores = Column(ARRAY(Float), nullable=False)
+
+
+class FactorModel(Base):
+    """
+    One ALS training run; `gram` (movie factors Gram matrix, float32) is
+    what folding in a new user needs besides the movie factors.
+    """
+
+    __tablename__ = "factor_models"
+
+    version = Column(Integer, primary_key=True, autoincrement=True)
+    factors = Column(Integer, nullable=False)
+    reg = Column(Float, nullable=False)
+    alpha = Column(Float, nullable=False)
+    gram = Column(LargeBinary, nullable=False)
+    users = Column(Integer, nullable=False)
+    movies = Column(Integer, nullable=False)
+    interactions = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MovieFactor(Base):
+    __tablename__ = "movie_factors"
+
+    version = Column(
+        Integer,
+        ForeignKey("factor_models.version", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    movie_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("movies.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # little-endian float32, `factors` long
+    vector = Column(LargeBinary, nullable=False)
 
 
 class Favorite(Base):
@@ -128,10 +259,22 @@ class Swipe(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+# one value per generator run; profiles.rec_generation points at the
+# user's live generation
+recommendation_generation_seq = Sequence(
+    "ai_recommendation_generation_seq", metadata=Base.metadata
+)
+
+
 class AIRecommendation(Base):
     __tablename__ = "ai_recommendations"
     __table_args__ = (
-        UniqueConstraint("user_id", "movie_id", name="uq_ai_recs_user_movie"),
+        UniqueConstraint(
+            "user_id",
+            "generation",
+            "movie_id",
+            name="uq_ai_recs_user_generation_movie",
+        ),
     )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -147,5 +290,6 @@ class AIRecommendation(Base):
         nullable=False,
         index=True,
     )
+    generation = Column(BigInteger, nullable=False)
     score = Column(Float, nullable=False)
     generated_at = Column(DateTime, default=datetime.utcnow)
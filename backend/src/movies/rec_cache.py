@@ -0,0 +1,191 @@
+"""
+Ranked recommendations served from Redis.
+
+The generator publishes every run as a new versioned sorted set and then
+swaps the user's pointer to it, so readers see either the old ranking or
+the new one, never a half-written set:
+
+    recs:{user_id}             STR   name of the live versioned key
+    recs:{user_id}:{version}   ZSET  movie_id -> score
+    movie_card:{movie_id}      STR   MovieOut JSON
+
+The previous version lingers for RECS_SWAP_GRACE seconds for requests
+that already resolved the pointer. `GET /movies/recommendations` pages
+with ZREVRANGE and reads the cards in the same script call; Postgres is
+only touched for cards that are missing and for users without a pointer.
+"""
+
+from typing import Iterable, Mapping, Sequence
+
+from redis import asyncio as redis_async
+
+from src.movies.models import Movie
+from src.movies.schema import MovieOut
+
+RECS_PREFIX = "recs:"
+CARD_PREFIX = "movie_card:"
+
+# seconds the replaced version stays readable after a swap
+RECS_SWAP_GRACE = 60
+
+
+def recs_key(user_id) -> str:
+    return f"{RECS_PREFIX}{user_id}"
+
+
+def card_key(movie_id) -> str:
+    return f"{CARD_PREFIX}{movie_id}"
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# pointer swap; the old version expires instead of being deleted so a
+# reader that has just resolved it still finds it. A generation published
+# after a newer one (runs racing) expires itself instead of going live.
+_SWAP = """
+local old = redis.call('GET', KEYS[1])
+if old then
+    local live = tonumber(string.match(old, ':(%d+)$'))
+    if live and live > tonumber(ARGV[4]) then
+        redis.call('EXPIRE', ARGV[1], ARGV[3])
+        return old
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+if old and old ~= ARGV[1] then
+    redis.call('EXPIRE', old, ARGV[3])
+end
+return old
+"""
+
+# pointer -> page of ids -> their cards, in one round trip. Keys are
+# derived in the script: single-node Redis only.
+_PAGE = """
+local key = redis.call('GET', KEYS[1])
+if not key then
+    return false
+end
+local ids = redis.call('ZREVRANGE', key, ARGV[1], ARGV[2])
+if #ids == 0 then
+    return {ids, {}}
+end
+local cards = {}
+for i, id in ipairs(ids) do
+    cards[i] = ARGV[3] .. id
+end
+return {ids, redis.call('MGET', unpack(cards))}
+"""
+
+
+def movie_card(movie: Movie) -> str:
+    return MovieOut.model_validate(movie, from_attributes=True).model_dump_json()
+
+
+async def publish_recommendations(
+    redis_client: redis_async.Redis,
+    user_id,
+    version: int,
+    rankings: Sequence[tuple[str, float]],
+    movies: Iterable[Movie],
+    *,
+    ttl: int,
+    card_ttl: int,
+) -> str | None:
+    """
+    Write `rankings` as `version` (the ai_recommendations generation) with
+    the movies' cards and make it live. Returns the versioned key, or None
+    for an empty ranking (the previous one stays live).
+    """
+    keys = await publish_recommendation_batch(
+        redis_client,
+        [(user_id, version, rankings)],
+        movies,
+        ttl=ttl,
+        card_ttl=card_ttl,
+    )
+    return keys[0] if keys else None
+
+
+async def publish_recommendation_batch(
+    redis_client: redis_async.Redis,
+    items: Iterable[tuple[object, int, Sequence[tuple[str, float]]]],
+    movies: Iterable[Movie] = (),
+    *,
+    ttl: int,
+    card_ttl: int,
+) -> list[str]:
+    """
+    publish_recommendations for many (user_id, version, rankings) at once,
+    in one MULTI; users with an empty ranking are skipped. Returns the
+    versioned keys written.
+    """
+    written = []
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for movie in movies:
+            pipe.set(card_key(movie.id), movie_card(movie), ex=card_ttl)
+        for user_id, version, rankings in items:
+            if not rankings:
+                continue
+            key = f"{recs_key(user_id)}:{version}"
+            pipe.zadd(key, {mid: score for mid, score in rankings})
+            pipe.expire(key, ttl)
+            pipe.eval(
+                _SWAP, 1, recs_key(user_id), key, ttl, RECS_SWAP_GRACE, version
+            )
+            written.append(key)
+        if len(pipe):
+            await pipe.execute()
+    return written
+
+
+async def get_recommendation_page(
+    redis_client: redis_async.Redis, user_id, offset: int, limit: int
+) -> tuple[list[str], list[str | None]] | None:
+    """
+    (movie ids, card JSON or None) for one page, best first; None when
+    the user has no published ranking.
+    """
+    page = await redis_client.eval(
+        _PAGE, 1, recs_key(user_id), offset, offset + limit - 1, CARD_PREFIX
+    )
+    if page is None:
+        return None
+    ids, cards = page
+    return [_str(m) for m in ids], [
+        _str(c) if c is not None else None for c in cards
+    ]
+
+
+async def cache_movie_cards(
+    redis_client: redis_async.Redis, movies: Iterable[Movie], ttl: int
+) -> None:
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for movie in movies:
+            pipe.set(card_key(movie.id), movie_card(movie), ex=ttl)
+        await pipe.execute()
+
+
+async def invalidate_movie_cards(
+    redis_client: redis_async.Redis, movie_ids: Iterable
+) -> None:
+    keys = [card_key(m) for m in movie_ids]
+    if keys:
+        await redis_client.unlink(*keys)
+
+
+def page_from_cards(
+    ids: Sequence[str], cards: Sequence[str | None], loaded: Mapping[str, Movie]
+) -> list[MovieOut]:
+    """
+    Page in ranking order from cached cards plus movies loaded for the
+    cache misses; ids with neither (deleted movies) are dropped.
+    """
+    page = []
+    for mid, card in zip(ids, cards):
+        if card is not None:
+            page.append(MovieOut.model_validate_json(card))
+        elif mid in loaded:
+            page.append(MovieOut.model_validate(loaded[mid], from_attributes=True))
+    return page
@@ -0,0 +1,69 @@
+"""
+Glue between the recommendation generators and src.ai.rerank: the
+Reranker configured from settings, and re-ranking the head of finished
+rankings for one or many users.
+"""
+
+from typing import Mapping, Sequence
+
+from redis import asyncio as redis_async
+
+from src.ai.rerank import (RerankCandidate, Reranker, RerankRequest,
+                           apply_order, make_reranker)
+from src.app.config import get_settings
+from src.movies.models import Movie
+
+
+def get_reranker(redis_client: redis_async.Redis | None) -> Reranker | None:
+    """
+    Reranker from settings, None when RERANK_BACKEND is empty. Bound to the
+    running event loop: aclose() it before the loop ends.
+    """
+    settings = get_settings()
+    return make_reranker(
+        settings.rerank_backend,
+        redis_client=redis_client,
+        api_key=settings.openai_api_key,
+        model=settings.openai_model,
+        base_url=settings.openai_base_url,
+        fake_latency=settings.rerank_fake_latency_ms / 1000,
+        batch_size=settings.rerank_batch_size,
+        concurrency=settings.rerank_concurrency,
+        budget=settings.rerank_timeout_seconds,
+        cache_ttl=settings.rerank_cache_ttl_seconds,
+    )
+
+
+def rerank_candidate(movie: Movie) -> RerankCandidate:
+    return RerankCandidate(
+        str(movie.id),
+        movie.title,
+        movie.release_date.year if movie.release_date else None,
+        list(movie.genres or ()),
+    )
+
+
+async def rerank_heads(
+    reranker: Reranker,
+    items: Sequence[tuple[object, Mapping[str, Sequence[str]], list[tuple[str, float]]]],
+    candidates: Mapping[str, RerankCandidate],
+    top_n: int,
+) -> list[list[tuple[str, float]]]:
+    """
+    Re-rank the first `top_n` movies of every (user_id, taste bucket,
+    rankings) in one Reranker call, so backend calls are batched across
+    users. Movies without a candidate entry (deleted) stay where they are.
+    """
+    requests = [
+        RerankRequest(
+            str(user_id),
+            taste,
+            [candidates[mid] for mid, _ in rankings[:top_n] if mid in candidates],
+        )
+        for user_id, taste, rankings in items
+    ]
+    orders = await reranker.rerank(requests)
+    return [
+        apply_order(rankings, order)
+        for (_, _, rankings), order in zip(items, orders)
+    ]
@@ -1,30 +1,124 @@
-from typing import Sequence
+import logging
+from typing import Literal, Sequence
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.app.db import get_async_db
-from src.app.tasks import (generate_movie_recommendations, prepare_swipe_batch,
-                           recalc_taste_vector)
+from src.app.config import get_settings
+from src.app.db import get_async_db, get_async_read_db
+from src.app.tasks import (CATALOG_FACETS_KEY, generate_movie_recommendations,
+                           ingest_tmdb_search, prepare_swipe_batch,
+                           recalc_taste_vector, record_cooccurrence,
+                           refresh_catalog_facets)
 from src.auth.deps import get_current_user
 from src.auth.models import User
-from src.movies import tmdb_client
+from src.movies import rec_cache, tmdb_client
 from src.movies.models import AIRecommendation, Dislike, Favorite, Movie, Swipe
 
 from . import crud
-from .schema import (ActivityItem, CastMemberOut, DislikeOut, FavoriteOut,
-                     MovieCreate, MovieOut, MovieUpdate, StatusOut,
-                     StatusUpdate, SwipeCreate)
+from .autocomplete import title_index
+from .similar import get_precomputed_similar, similar_index
+from .schema import (ActivityItem, CastMemberOut, CatalogFacetsOut,
+                     DislikeOut, FavoriteOut, MovieCreate, MovieOut,
+                     MovieSuggestionOut, MovieUpdate, StatusOut, StatusUpdate,
+                     SwipeCreate)
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# ниже этого числа локальных совпадений дотягиваем запрос из TMDB
+TMDB_SEARCH_MIN_HITS = 3
+
 
 @router.get("/", response_model=Sequence[MovieOut])
 async def list_movies(
-    db: AsyncSession = Depends(get_async_db),
+    genres: list[str] | None = Query(None),
+    genres_mode: Literal["any", "all"] = "any",
+    keywords: list[str] | None = Query(None),
+    keywords_mode: Literal["any", "all"] = "any",
+    year_from: int | None = Query(None, ge=1800, le=2100),
+    year_to: int | None = Query(None, ge=1800, le=2100),
+    min_rating: float | None = Query(None, ge=0, le=10),
+    limit: int | None = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Каталог с фильтрами: жанры/ключевые слова (any/all), диапазон лет,
+    минимальный рейтинг. С `limit` — сортировка по популярности и пагинация.
+    """
+    return await crud.list_movies(
+        db,
+        genres=genres,
+        genres_mode=genres_mode,
+        keywords=keywords,
+        keywords_mode=keywords_mode,
+        year_from=year_from,
+        year_to=year_to,
+        min_rating=min_rating,
+        limit=limit,
+        offset=offset,
+    )
+
+
+@router.get("/facets", response_model=CatalogFacetsOut)
+async def get_catalog_facets():
+    """
+    Счётчики фильмов по жанрам и десятилетиям для экранов каталога.
+    Считаются по расписанию задачей refresh_catalog_facets и читаются из Redis.
+    """
+    from src.app.redis import get_redis_client
+
+    raw = await get_redis_client().get(CATALOG_FACETS_KEY)
+    if raw is None:
+        # ещё не посчитано — ставим пересчёт и отдаём пустые фасеты
+        refresh_catalog_facets.delay()
+        return CatalogFacetsOut()
+    return CatalogFacetsOut.model_validate_json(raw)
+
+
+@router.get("/search", response_model=Sequence[MovieOut])
+async def search_movies(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    return await crud.list_movies(db)
+    """
+    Поиск по локальному каталогу (full-text + trigram по названию).
+    Если совпадений почти нет (< TMDB_SEARCH_MIN_HITS) — на фоне
+    подтягиваем их из TMDB.
+    """
+    movies = await crud.search_movies(db, q, limit)
+
+    if len(movies) < min(limit, TMDB_SEARCH_MIN_HITS):
+        from src.app.redis import get_redis_client
+
+        # не чаще раза в час на один и тот же запрос; без Redis/брокера
+        # просто отдаём локальные результаты
+        dedup_key = f"tmdb_search:{q.strip().lower()}"
+        try:
+            if await get_redis_client().set(dedup_key, 1, nx=True, ex=3600):
+                ingest_tmdb_search.delay(q)
+        except Exception:
+            logger.warning("tmdb search ingest not queued", exc_info=True)
+
+    return movies
+
+
+@router.get("/autocomplete", response_model=Sequence[MovieSuggestionOut])
+async def autocomplete_movies(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Подсказки по названию на каждое нажатие клавиши.
+    Отвечает из in-memory индекса, без обращения к Postgres.
+    """
+    return [s._asdict() for s in title_index.lookup(prefix, limit)]
 
 
 @router.post(
@@ -37,10 +131,16 @@ async def create_movie(
     return await crud.create_movie(db, payload)
 
 
+async def _invalidate_movie_card(movie_id: UUID) -> None:
+    from src.app.redis import get_redis_client
+
+    await rec_cache.invalidate_movie_cards(get_redis_client(), [movie_id])
+
+
 @router.get("/by-id/{movie_id}", response_model=MovieOut)
 async def get_movie(
     movie_id: UUID,
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     movie: Movie | None = await crud.get_movie(db, movie_id)
     if movie is None:
@@ -57,7 +157,9 @@ async def update_movie(
     movie: Movie | None = await crud.get_movie(db, movie_id)
     if movie is None:
         raise HTTPException(status_code=404, detail="Movie not found")
-    return await crud.update_movie(db, movie, payload)
+    movie = await crud.update_movie(db, movie, payload)
+    await _invalidate_movie_card(movie_id)
+    return movie
 
 
 @router.delete(
@@ -71,24 +173,48 @@ async def delete_movie(
     if movie is None:
         raise HTTPException(status_code=404, detail="Movie not found")
     await crud.delete_movie(db, movie)
+    # удаления не видны в change feed по updated_at
+    title_index.remove(movie_id)
+    await _invalidate_movie_card(movie_id)
     return None
 
 
 @router.get("/recommendations", response_model=Sequence[MovieOut])
 async def get_recommendations(
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
-    Получить рекомендованные фильмы для текущего пользователя
-    из таблицы ai_recommendations.
+    Получить рекомендованные фильмы для текущего пользователя.
+    Читаем опубликованный генератором ZSET и карточки фильмов из Redis;
+    в БД идём только за отсутствующими карточками или если ключа нет.
     """
+    from src.app.redis import get_redis_client
+
+    redis_client = get_redis_client()
+    page = await rec_cache.get_recommendation_page(
+        redis_client, current_user.id, offset, limit
+    )
+    if page is not None:
+        ids, cards = page
+        misses = [UUID(m) for m, c in zip(ids, cards) if c is None]
+        loaded = await crud.get_movies_by_ids(db, misses)
+        if loaded:
+            await rec_cache.cache_movie_cards(
+                redis_client, loaded, settings.movie_card_ttl_seconds
+            )
+        return rec_cache.page_from_cards(
+            ids, cards, {str(m.id): m for m in loaded}
+        )
+
     stmt = (
         select(Movie)
         .join(AIRecommendation, AIRecommendation.movie_id == Movie.id)
-        .where(AIRecommendation.user_id == current_user.id)
+        .where(crud.active_recommendations(current_user.id))
         .order_by(AIRecommendation.score.desc())
+        .offset(offset)
         .limit(limit)
     )
     res = await db.execute(stmt)
@@ -98,7 +224,7 @@ async def get_recommendations(
 @router.get("/activity", response_model=Sequence[ActivityItem])
 async def get_my_activity(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Лента активности по свайпам текущего пользователя.
@@ -130,7 +256,7 @@ async def get_my_activity(
 @router.get("/{movie_id}/cast", response_model=Sequence[CastMemberOut])
 async def get_movie_cast(
     movie_id: UUID,
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Состав актёров для фильма по его UUID.
@@ -165,10 +291,34 @@ async def get_movie_cast(
     return result
 
 
+@router.get("/{movie_id}/similar", response_model=Sequence[MovieOut])
+async def get_similar_movies(
+    movie_id: UUID,
+    k: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Похожие фильмы по содержанию (описание, жанры, ключевые слова).
+    Для популярных фильмов — из предрасчитанной таблицы similar_movies,
+    для остальных — из in-memory LSH индекса по эмбеддингам.
+    """
+    similar_ids = await get_precomputed_similar(db, movie_id, k)
+    if similar_ids is None:
+        hits = similar_index.similar(movie_id, k)
+        if hits is None:
+            # фильм новее последней сборки эмбеддингов (или его нет вовсе)
+            if await crud.get_movie(db, movie_id) is None:
+                raise HTTPException(status_code=404, detail="Movie not found")
+            return []
+        similar_ids = [m_id for m_id, _ in hits]
+
+    return await crud.get_movies_by_ids(db, similar_ids)
+
+
 @router.get("/swipe-batch", response_model=Sequence[MovieOut])
 async def get_swipe_batch(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Получить предзагруженный набор фильмов для свайпов из Redis.
@@ -222,6 +372,7 @@ async def add_favorite_movie(
     fav = await crud.add_favorite(db, current_user.id, movie_id)
 
     # триггерим пересчёт taste-вектора и рекомендаций
+    record_cooccurrence.delay(str(current_user.id), str(movie_id))
     recalc_taste_vector.delay(str(current_user.id))
     generate_movie_recommendations.delay(str(current_user.id))
     prepare_swipe_batch.delay(str(current_user.id))
@@ -337,6 +488,7 @@ async def create_movie_swipe(
 
     # swipe "like" влияет на вкус
     if payload.direction == "like":
+        record_cooccurrence.delay(str(current_user.id), str(movie_id))
         recalc_taste_vector.delay(str(current_user.id))
         generate_movie_recommendations.delay(str(current_user.id))
         prepare_swipe_batch.delay(str(current_user.id))
@@ -28,6 +28,8 @@ class MovieUpdate(BaseModel):
     popularity: float | None = None
     poster_url: str | None = None
     backdrop_url: str | None = None
+    genres: list[str] | None = None
+    keywords: list[str] | None = None
 
 
 class MovieOut(MovieBase):
@@ -40,6 +42,23 @@ class MovieOut(MovieBase):
         from_attributes = True
 
 
+class MovieSuggestionOut(BaseModel):
+    id: UUID
+    title: str
+    year: int | None = None
+
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+
+class CatalogFacetsOut(BaseModel):
+    genres: list[FacetCount] = []
+    decades: list[FacetCount] = []
+    generated_at: datetime | None = None
+
+
 class FavoriteOut(BaseModel):
     id: UUID
     user_id: UUID
@@ -0,0 +1,252 @@
+"""
+"More like this": content-based similar movies.
+
+An offline job (`build_movie_embeddings` task) embeds every movie from its
+overview, genres and keywords, stores the vectors in `movie_embeddings`
+and precomputes exact neighbours of the most popular titles into
+`similar_movies`. The API keeps an in-process LSH index over the stored
+vectors for everything else, rebuilt when a new embedding version lands.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Iterable
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.ai.embeddings import (RandomProjectionLSH, exact_top_k_table,
+                               movie_terms, normalize_rows, tfidf_matrix,
+                               truncated_svd)
+from src.app.tracing import span
+from src.movies.models import Movie, MovieEmbedding, SimilarMovies
+
+logger = logging.getLogger(__name__)
+
+# rows per multi-VALUES upsert (3 bind params each, asyncpg caps at 32767)
+_WRITE_CHUNK = 5000
+
+
+class SimilarMovieIndex:
+    """
+    Approximate cosine neighbours over one embedding version.
+    """
+
+    __slots__ = ("version", "_ids", "_row_by_id", "_lsh")
+
+    def __init__(self) -> None:
+        self.version: int | None = None
+        self._ids: list[UUID] = []
+        self._row_by_id: dict[UUID, int] = {}
+        self._lsh: RandomProjectionLSH | None = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def build(self, version: int, rows: Iterable[tuple[UUID, bytes]]) -> None:
+        ids: list[UUID] = []
+        blobs: list[bytes] = []
+        for movie_id, vector in rows:
+            ids.append(movie_id)
+            blobs.append(vector)
+        lsh = None
+        if ids:
+            vectors = np.frombuffer(b"".join(blobs), dtype="<f4").reshape(
+                len(ids), -1
+            )
+            lsh = RandomProjectionLSH(vectors)
+        # swap everything at once; readers never see a half-built index
+        self._ids, self._row_by_id, self._lsh, self.version = (
+            ids,
+            {m: i for i, m in enumerate(ids)},
+            lsh,
+            version,
+        )
+
+    def similar(self, movie_id: UUID, k: int) -> list[tuple[UUID, float]] | None:
+        """
+        Top-k (movie_id, cosine) neighbours, or None for an unknown movie.
+        """
+        row = self._row_by_id.get(movie_id)
+        if row is None or self._lsh is None:
+            return None
+        rows, scores = self._lsh.query(row, k)
+        return [(self._ids[r], float(s)) for r, s in zip(rows, scores)]
+
+
+similar_index = SimilarMovieIndex()
+
+
+async def build_movie_embeddings(
+    db: AsyncSession,
+    *,
+    n_components: int = 64,
+    precompute_top: int = 5000,
+    top_k: int = 50,
+    seed: int = 0,
+) -> dict[str, float]:
+    """
+    Embed the whole catalog and write a new version of `movie_embeddings`
+    and `similar_movies` in one transaction, so readers see either the old
+    version or the new one. Returns timings for the job log.
+    """
+    t0 = time.perf_counter()
+    with span("load_movies") as sp:
+        result = await db.stream(
+            select(
+                Movie.id,
+                Movie.overview,
+                Movie.genres,
+                Movie.keywords,
+                Movie.popularity,
+            )
+        )
+        ids: list[UUID] = []
+        popularity: list[float] = []
+        docs: list[dict[str, float]] = []
+        async for row in result:
+            ids.append(row.id)
+            popularity.append(float(row.popularity or 0))
+            docs.append(movie_terms(row.overview, row.genres, row.keywords))
+        sp.set(movies=len(ids))
+    if len(ids) < 2:
+        return {"movies": float(len(ids))}
+
+    t1 = time.perf_counter()
+    with span("embed", n_components=n_components) as sp:
+        matrix, terms = tfidf_matrix(docs)
+        vectors = normalize_rows(truncated_svd(matrix, n_components, seed=seed))
+        sp.set(terms=len(terms))
+    with span("neighbours", top_k=top_k) as sp:
+        popular = np.argsort(-np.asarray(popularity), kind="stable")[
+            :precompute_top
+        ]
+        neighbours, scores = exact_top_k_table(vectors, popular, top_k)
+        sp.set(precomputed=len(popular))
+    t2 = time.perf_counter()
+
+    version = int(time.time())
+    with span("write_embeddings", version=version):
+        for start in range(0, len(ids), _WRITE_CHUNK):
+            stmt = insert(MovieEmbedding).values(
+                [
+                    {
+                        "movie_id": ids[i],
+                        "version": version,
+                        "vector": vectors[i].astype("<f4").tobytes(),
+                    }
+                    for i in range(start, min(start + _WRITE_CHUNK, len(ids)))
+                ]
+            )
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[MovieEmbedding.movie_id],
+                    set_={
+                        "version": stmt.excluded.version,
+                        "vector": stmt.excluded.vector,
+                    },
+                )
+            )
+        await db.execute(
+            delete(MovieEmbedding).where(MovieEmbedding.version != version)
+        )
+
+    with span("write_similar", version=version):
+        for start in range(0, len(popular), _WRITE_CHUNK):
+            stmt = insert(SimilarMovies).values(
+                [
+                    {
+                        "movie_id": ids[row],
+                        "version": version,
+                        "similar_ids": [ids[n] for n in neighbours[i]],
+                        "scores": [float(s) for s in scores[i]],
+                    }
+                    for i, row in enumerate(
+                        popular[start:start + _WRITE_CHUNK], start=start
+                    )
+                ]
+            )
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[SimilarMovies.movie_id],
+                    set_={
+                        "version": stmt.excluded.version,
+                        "similar_ids": stmt.excluded.similar_ids,
+                        "scores": stmt.excluded.scores,
+                    },
+                )
+            )
+        await db.execute(
+            delete(SimilarMovies).where(SimilarMovies.version != version)
+        )
+    with span("commit"):
+        await db.commit()
+
+    return {
+        "movies": float(len(ids)),
+        "terms": float(len(terms)),
+        "precomputed": float(len(popular)),
+        "version": float(version),
+        "load_seconds": t1 - t0,
+        "embed_seconds": t2 - t1,
+        "write_seconds": time.perf_counter() - t2,
+    }
+
+
+async def get_precomputed_similar(
+    db: AsyncSession, movie_id: UUID, k: int
+) -> list[UUID] | None:
+    """
+    Precomputed neighbours, if the movie is popular enough to have them
+    and the table holds at least k.
+    """
+    similar_ids = await db.scalar(
+        select(SimilarMovies.similar_ids).where(SimilarMovies.movie_id == movie_id)
+    )
+    if similar_ids is None or len(similar_ids) < k:
+        return None
+    return list(similar_ids[:k])
+
+
+async def refresh_similar_index(
+    db: AsyncSession, index: SimilarMovieIndex = similar_index
+) -> bool:
+    """
+    Rebuild the index if a newer embedding version was written. Returns
+    whether it was rebuilt.
+    """
+    version = await db.scalar(select(func.max(MovieEmbedding.version)))
+    if version is None or version == index.version:
+        return False
+    result = await db.execute(
+        select(MovieEmbedding.movie_id, MovieEmbedding.vector).where(
+            MovieEmbedding.version == version
+        )
+    )
+    rows = [tuple(row) for row in result.all()]
+    # hashing 200k vectors takes a while; keep the event loop free
+    await asyncio.to_thread(index.build, version, rows)
+    logger.info("similar-movies index v%s: %d movies", version, len(index))
+    return True
+
+
+async def run_similar_index_refresher(interval_seconds: float) -> None:
+    """
+    Long-running task (started in the API lifespan): load the index, then
+    pick up new embedding versions.
+    """
+    from src.app.db import AsyncSessionLocal
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await refresh_similar_index(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("similar-movies index refresh failed")
+        await asyncio.sleep(interval_seconds)
@@ -1,10 +1,15 @@
 from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import select
+import numpy as np
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.ai.features import GENRE, KEYWORD
+from src.ai.taste import DenseTasteLayout
 from src.auth.models import Profile
+from src.movies.models import Feature
+from src.profiles.models import TasteVocabulary
 from src.profiles.schema import ProfileUpdate
 
 
@@ -27,3 +32,113 @@ async def update_profile(
     return profile
 
 
+# Dense taste layouts --------------------------------------------------------
+
+# layouts are immutable per version, so caching them per process is safe
+_layouts: dict[int, DenseTasteLayout] = {}
+
+
+async def get_taste_layout(
+    db: AsyncSession, version: int | None = None
+) -> Optional[DenseTasteLayout]:
+    """
+    Layout for `version`, or for the latest version when it's None. A
+    layout frozen before the catalog had any genres counts as absent:
+    everything in it is hashed, so readers use the JSON taste instead.
+    """
+    if version is None:
+        version = await db.scalar(select(func.max(TasteVocabulary.version)))
+        if version is None:
+            return None
+
+    layout = _layouts.get(version)
+    if layout is None:
+        row = await db.get(TasteVocabulary, version)
+        if row is None:
+            return None
+        layout = DenseTasteLayout(
+            row.version, row.feature_ids, row.genre_names, row.n_buckets
+        )
+        _layouts[version] = layout
+    return layout if layout.n_genres else None
+
+
+async def create_taste_vocabulary(
+    db: AsyncSession,
+    top_keywords: int,
+    n_buckets: int,
+    only_if_changed: bool = False,
+) -> Optional[DenseTasteLayout]:
+    """
+    Freeze a new layout version: every genre + top keywords by doc_freq.
+    None while the catalog has no genres yet, or with `only_if_changed`
+    when the latest layout already has exactly these slots.
+    """
+    genres = (
+        await db.execute(
+            select(Feature.id, Feature.name)
+            .where(Feature.kind == GENRE)
+            .order_by(Feature.id)
+        )
+    ).all()
+    keyword_ids = (
+        await db.scalars(
+            select(Feature.id)
+            .where(Feature.kind == KEYWORD)
+            .order_by(Feature.doc_freq.desc(), Feature.id)
+            .limit(top_keywords)
+        )
+    ).all()
+
+    if not genres:
+        return None
+    feature_ids = [g.id for g in genres] + list(keyword_ids)
+    if only_if_changed:
+        current = await get_taste_layout(db)
+        if (
+            current is not None
+            and current.n_buckets == n_buckets
+            and current.feature_ids.tolist() == feature_ids
+        ):
+            return None
+
+    row = TasteVocabulary(
+        feature_ids=feature_ids,
+        genre_names=[g.name for g in genres],
+        n_buckets=n_buckets,
+    )
+    db.add(row)
+    await db.commit()
+    return await get_taste_layout(db, row.version)
+
+
+def set_dense_taste(
+    profile: Profile,
+    layout: Optional[DenseTasteLayout],
+    scores: dict[int, float],
+) -> None:
+    """
+    Keep `taste_dense` in sync with a freshly computed taste (caller commits).
+    """
+    if layout is None or not scores:
+        profile.taste_dense = None
+        profile.taste_dense_version = None
+        return
+    profile.taste_dense = layout.to_bytes(layout.encode(scores))
+    profile.taste_dense_version = layout.version
+
+
+async def load_dense_taste(
+    db: AsyncSession, profile: Profile
+) -> tuple[Optional[DenseTasteLayout], Optional[np.ndarray]]:
+    """
+    (layout, zero-copy vector) for a profile, or (None, None) when it has
+    no dense taste yet and readers should fall back to the JSON one.
+    """
+    if profile.taste_dense is None or profile.taste_dense_version is None:
+        return None, None
+    layout = await get_taste_layout(db, profile.taste_dense_version)
+    if layout is None:
+        return None, None
+    vec = layout.load(profile.taste_dense)
+    return (layout, vec) if vec is not None else (None, None)
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from src.app.base import Base
+
+
+class TasteVocabulary(Base):
+    """
+    Versioned slot layout for dense taste vectors (`Profile.taste_dense`).
+
+    `feature_ids` lists genres first, then the top-N keywords; the vector
+    dimension is len(feature_ids) + n_buckets.
+    """
+
+    __tablename__ = "taste_vocabularies"
+
+    version = Column(Integer, primary_key=True)
+    feature_ids = Column(ARRAY(Integer), nullable=False)
+    genre_names = Column(ARRAY(Text), nullable=False)
+    n_buckets = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
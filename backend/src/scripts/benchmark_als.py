@@ -0,0 +1,168 @@
+"""
+Время обучения, память и качество ALS на синтетических взаимодействиях.
+
+Generates users and movies from hidden taste clusters with Zipf movie
+popularity, holds out one positive interaction per evaluated user, trains
+implicit ALS and reports per-iteration time, peak RSS, matrix and factor
+memory, fold-in latency and hit rate@k against a popularity baseline.
+
+Запуск:
+
+    python -m src.scripts.benchmark_als --interactions 1000000
+    python -m src.scripts.benchmark_als --factors 128 --iterations 10
+"""
+
+import argparse
+import resource
+import sys
+import time
+
+import numpy as np
+
+from src.ai.als import fold_in, interaction_matrix, train_als
+from src.ai.taste import INTERACTION_STRENGTH
+
+
+def _peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _synthetic(args, rng):
+    # every user and movie belongs to one of `clusters` tastes; users mostly
+    # interact inside their cluster, picking movies by Zipf popularity
+    movie_cluster = rng.integers(0, args.clusters, args.movies)
+    popularity = 1.0 / np.arange(1, args.movies + 1) ** 0.8
+    rng.shuffle(popularity)
+    by_cluster = [np.flatnonzero(movie_cluster == c) for c in range(args.clusters)]
+    cluster_p = [popularity[ids] / popularity[ids].sum() for ids in by_cluster]
+    global_p = popularity / popularity.sum()
+
+    user_cluster = rng.integers(0, args.clusters, args.users)
+    per_user = rng.zipf(1.6, args.users).clip(1, 500)
+    per_user = (per_user * args.interactions / per_user.sum()).astype(np.int64) + 1
+    rows = np.repeat(np.arange(args.users), per_user)
+    in_cluster = rng.random(len(rows)) < 0.8
+    cols = rng.choice(args.movies, size=len(rows), p=global_p)
+    for c in range(args.clusters):
+        pick = in_cluster & (user_cluster[rows] == c)
+        cols[pick] = rng.choice(by_cluster[c], size=int(pick.sum()), p=cluster_p[c])
+
+    kinds = np.array(list(INTERACTION_STRENGTH.values()), dtype=np.float32)
+    values = kinds[rng.integers(0, len(kinds), len(rows))]
+    # out-of-cluster movies are what users dislike
+    values[~in_cluster & (rng.random(len(rows)) < 0.5)] = INTERACTION_STRENGTH[
+        "dislike"
+    ]
+    return rows, cols, values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--movies", type=int, default=20_000)
+    parser.add_argument("--interactions", type=int, default=1_000_000)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--reg", type=float, default=0.1)
+    parser.add_argument("--alpha", type=float, default=10.0)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--cg-steps", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--eval-users", type=int, default=2_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    t0 = time.perf_counter()
+    rows, cols, values = _synthetic(args, rng)
+    m = interaction_matrix(rows, cols, values, args.users, args.movies)
+    t1 = time.perf_counter()
+
+    # hold out one positive movie per evaluated user
+    row_of = np.repeat(np.arange(m.n_rows), np.diff(m.indptr))
+    positive_users = np.flatnonzero(
+        (np.bincount(row_of[m.data > 0], minlength=m.n_rows) > 0)
+        & (np.diff(m.indptr) > 1)
+    )
+    eval_users = rng.choice(
+        positive_users,
+        size=min(args.eval_users, len(positive_users)),
+        replace=False,
+    )
+    held_out = {}
+    keep = np.ones(len(m.data), dtype=bool)
+    for u in eval_users.tolist():
+        lo, hi = m.indptr[u], m.indptr[u + 1]
+        pos = lo + np.flatnonzero(m.data[lo:hi] > 0)
+        drop = int(rng.choice(pos))
+        held_out[u] = int(m.indices[drop])
+        keep[drop] = False
+    train = interaction_matrix(
+        row_of[keep],
+        m.indices[keep],
+        m.data[keep],
+        m.n_rows,
+        m.n_cols,
+    )
+    matrix_mib = (
+        train.indptr.nbytes + train.indices.nbytes + train.data.nbytes
+    ) / 2**20
+    print(
+        f"{args.users} users × {args.movies} movies, nnz {len(train.indices)}: "
+        f"generate {t1 - t0:.1f}s, matrix {matrix_mib:.1f} MiB"
+    )
+
+    seconds = []
+    users, items = train_als(
+        train,
+        factors=args.factors,
+        reg=args.reg,
+        alpha=args.alpha,
+        iterations=args.iterations,
+        cg_steps=args.cg_steps,
+        n_jobs=args.jobs,
+        seed=args.seed,
+        on_iteration=lambda i, s: seconds.append(s),
+    )
+    print(
+        f"train: {sum(seconds):.1f}s, per iteration "
+        f"p50={np.median(seconds):.2f}s max={max(seconds):.2f}s; "
+        f"factors {(users.nbytes + items.nbytes) / 2**20:.1f} MiB, "
+        f"peak RSS {_peak_rss_mib():.0f} MiB"
+    )
+
+    gram = items.T @ items
+    fold_us = []
+    hits = {"als": 0, "fold-in": 0, "popularity": 0}
+    popular = np.argsort(
+        -np.bincount(train.indices[train.data > 0], minlength=train.n_cols)
+    )
+    for u, target in held_out.items():
+        lo, hi = train.indptr[u], train.indptr[u + 1]
+        seen = train.indices[lo:hi]
+
+        t = time.perf_counter()
+        folded = fold_in(items[seen], train.data[lo:hi], gram, args.reg, args.alpha)
+        fold_us.append((time.perf_counter() - t) * 1e6)
+
+        for name, user in (("als", users[u]), ("fold-in", folded)):
+            scores = items @ user
+            scores[seen] = -np.inf
+            top = np.argpartition(-scores, args.k)[: args.k]
+            hits[name] += target in top
+        top_pop = [i for i in popular[: args.k + len(seen)] if i not in set(seen)]
+        hits["popularity"] += target in top_pop[: args.k]
+
+    print(
+        f"fold-in: p50={np.percentile(fold_us, 50):.0f}us "
+        f"p99={np.percentile(fold_us, 99):.0f}us"
+    )
+    for name, hit in hits.items():
+        print(f"hit rate@{args.k} {name:>10}: {hit / len(held_out):.3f}")
+
+
+if __name__ == "__main__":
+    main()
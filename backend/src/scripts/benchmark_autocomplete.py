@@ -0,0 +1,110 @@
+"""
+Memory budget and lookup latency of the in-process title autocomplete index.
+
+Builds the index either from a synthetic catalog (default) or from the
+`movies` table, prints the memory report and lookup percentiles for
+1-, 2-, 3- and 5-character prefixes.
+
+Запуск:
+
+    python -m src.scripts.benchmark_autocomplete --movies 200000
+    python -m src.scripts.benchmark_autocomplete --from-db
+"""
+
+import argparse
+import asyncio
+import random
+import string
+import time
+import uuid
+from datetime import datetime
+
+from src.movies.autocomplete import TitlePrefixIndex, TitleRow, load_title_index
+
+WORDS = [
+    "the", "dark", "night", "love", "star", "war", "man", "city", "last",
+    "king", "girl", "house", "dead", "life", "story", "lost", "blood", "game",
+    "black", "summer", "christmas", "return", "secret", "world", "time",
+    "road", "river", "ghost", "shadow", "dream", "fire", "ice", "iron", "moon",
+]
+
+
+def _synthetic_rows(n: int, seed: int) -> list[TitleRow]:
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    rows = []
+    for _ in range(n):
+        words = rnd.choices(WORDS, k=rnd.randint(1, 4))
+        # a made-up word so titles are not all drawn from a tiny vocabulary
+        words.append("".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 8))))
+        rows.append(
+            TitleRow(
+                id=uuid.uuid4(),
+                title=" ".join(words).title(),
+                year=rnd.randint(1950, 2025),
+                popularity=rnd.paretovariate(1.2),
+                updated_at=now,
+            )
+        )
+    return rows
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _bench_lookups(index: TitlePrefixIndex, queries: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    for length in (1, 2, 3, 5):
+        prefixes = [
+            rnd.choice(WORDS)[:length] if length <= 3 else rnd.choice(WORDS) + " "
+            for _ in range(queries)
+        ]
+        samples = []
+        for p in prefixes:
+            t0 = time.perf_counter()
+            index.lookup(p, 10)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        print(
+            f"prefix len {length}: "
+            f"p50={_percentile(samples, 0.50):.1f}us "
+            f"p99={_percentile(samples, 0.99):.1f}us "
+            f"max={max(samples):.1f}us"
+        )
+
+
+async def _load_from_db(index: TitlePrefixIndex) -> None:
+    from src.app.db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        await load_title_index(session, index)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--movies", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--from-db", action="store_true")
+    args = parser.parse_args()
+
+    index = TitlePrefixIndex()
+    t0 = time.perf_counter()
+    if args.from_db:
+        asyncio.run(_load_from_db(index))
+    else:
+        index.build(_synthetic_rows(args.movies, args.seed))
+    print(f"built {len(index)} movies in {time.perf_counter() - t0:.2f}s")
+
+    for name, value in index.memory_report().items():
+        if name.endswith("_bytes"):
+            print(f"{name:>20}: {value / 1024 / 1024:8.1f} MiB")
+        else:
+            print(f"{name:>20}: {value}")
+
+    _bench_lookups(index, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
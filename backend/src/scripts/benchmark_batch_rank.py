@@ -0,0 +1,104 @@
+"""
+Пропускная способность пакетного ранжирования rank_movies_for_users.
+
+Ranks a synthetic population of dense taste vectors against a synthetic
+catalog pool in chunks, the way the nightly regeneration job does, and
+reports users/s, peak RSS and the speed-up over calling
+rank_movies_dense once per user.
+
+Запуск:
+
+    python -m src.scripts.benchmark_batch_rank --users 100000 --pool 20000
+    python -m src.scripts.benchmark_batch_rank --chunk 512 --k 100
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.ai.llm import rank_movies_dense, rank_movies_for_users, ranking_catalog
+from src.ai.taste import DenseTasteLayout
+from src.movies.batch_recommendations import peak_rss_mib
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--pool", type=int, default=20_000)
+    parser.add_argument("--chunk", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=200)
+    parser.add_argument("--genres", type=int, default=19)
+    parser.add_argument("--top-keywords", type=int, default=1024)
+    parser.add_argument("--buckets", type=int, default=256)
+    parser.add_argument("--features-per-movie", type=int, default=12)
+    parser.add_argument("--sample", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    n_features = args.genres + 20 * args.top_keywords
+    layout = DenseTasteLayout(
+        1,
+        np.arange(args.genres + args.top_keywords),
+        [f"genre{i}" for i in range(args.genres)],
+        args.buckets,
+    )
+    # feature popularity is Zipf-like: a few genres/keywords everywhere
+    lengths = rng.poisson(args.features_per_movie, args.pool)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    feature_ids = (rng.zipf(1.3, indptr[-1]) - 1) % n_features
+    catalog = ranking_catalog(
+        layout,
+        [str(i) for i in range(args.pool)],
+        indptr,
+        feature_ids,
+        rng.pareto(1.5, args.pool) * 10,
+        rng.uniform(0, 10, args.pool),
+    )
+
+    def taste_chunk(n: int) -> np.ndarray:
+        dense = np.zeros((n, layout.dim), dtype=np.float32)
+        cols = rng.integers(0, layout.dim, (n, 40))
+        np.put_along_axis(
+            dense, cols, rng.normal(1.0, 1.5, (n, 40)).astype(np.float32), axis=1
+        )
+        return layout.ranker_weights(dense)
+
+    t0 = time.perf_counter()
+    ranked = 0
+    while ranked < args.users:
+        n = min(args.chunk, args.users - ranked)
+        weights = taste_chunk(n)
+        # ~10 seen movies per user
+        exclude = (
+            np.repeat(np.arange(n), 10),
+            rng.integers(0, args.pool, n * 10),
+        )
+        rank_movies_for_users(weights, catalog, args.k, exclude)
+        ranked += n
+    seconds = time.perf_counter() - t0
+    print(
+        f"{args.users} users × {args.pool} movies (nnz {indptr[-1]}), "
+        f"chunk {args.chunk}, k {args.k}: {seconds:.1f}s, "
+        f"{args.users / seconds:.0f} users/s, peak RSS {peak_rss_mib():.0f} MiB"
+    )
+
+    weights = taste_chunk(args.sample)
+    candidates = [
+        (str(i), feature_ids[indptr[i]:indptr[i + 1]], 0.0, 0.0)
+        for i in range(args.pool)
+    ]
+    t = time.perf_counter()
+    for w in weights:
+        rank_movies_dense("u", layout, w, candidates)
+    per_user = (time.perf_counter() - t) / args.sample
+    print(
+        f"rank_movies_dense per user: {per_user * 1000:.0f} ms "
+        f"({1 / per_user:.1f} users/s, batch is "
+        f"{args.users / seconds * per_user:.0f}x faster)"
+    )
+
+
+if __name__ == "__main__":
+    main()
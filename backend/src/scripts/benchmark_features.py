@@ -0,0 +1,124 @@
+"""
+Сравнение строковых жанров/ключевых слов с интернированными feature id.
+
+Prints estimated on-disk array sizes, taste-vector JSON payload sizes and
+ranking throughput of rank_movies_for_user vs rank_movies_encoded on the
+same synthetic candidates.
+
+Запуск:
+
+    python -m src.scripts.benchmark_features --movies 500 --users 2000
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+
+from src.ai import FeatureVocabulary, rank_movies_encoded, rank_movies_for_user
+from src.ai.features import GENRE, KEYWORD
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary",
+    "Drama", "Family", "Fantasy", "History", "Horror", "Music", "Mystery",
+    "Romance", "Science Fiction", "TV Movie", "Thriller", "War", "Western",
+]
+
+
+def _text_array_bytes(values: list[str]) -> int:
+    # varlena array header (24) + per element 1-byte short varlena header
+    return 24 + sum(1 + len(v.encode()) for v in values)
+
+
+def _int_array_bytes(values: list[int]) -> int:
+    return 24 + 4 * len(values)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--movies", type=int, default=500)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--vocab", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    keywords = [f"keyword {i} {rnd.choice(GENRES).lower()}" for i in range(args.vocab)]
+    kw_weights = [1.0 / (i + 1) for i in range(args.vocab)]  # Zipf
+
+    rows = [(i + 1, GENRE, g) for i, g in enumerate(GENRES)]
+    rows += [(len(GENRES) + i + 1, KEYWORD, k) for i, k in enumerate(keywords)]
+    vocab = FeatureVocabulary(rows)
+
+    movies = []
+    for _ in range(args.movies):
+        genres = rnd.sample(GENRES, rnd.randint(1, 3))
+        kws = list(set(rnd.choices(keywords, kw_weights, k=rnd.randint(3, 25))))
+        movies.append(
+            {
+                "movie_id": str(uuid.uuid4()),
+                "genres": genres,
+                "keywords": kws,
+                "popularity": rnd.paretovariate(1.2) * 10,
+                "rating": rnd.uniform(3, 9),
+                "feature_ids": sorted(
+                    vocab.encode(GENRE, genres) + vocab.encode(KEYWORD, kws)
+                ),
+            }
+        )
+
+    text_bytes = sum(
+        _text_array_bytes(m["genres"]) + _text_array_bytes(m["keywords"])
+        for m in movies
+    )
+    int_bytes = sum(_int_array_bytes(m["feature_ids"]) for m in movies)
+    print(
+        f"array bytes/movie: text[] {text_bytes / len(movies):.0f}, "
+        f"int[] {int_bytes / len(movies):.0f} "
+        f"({text_bytes / int_bytes:.1f}x smaller)"
+    )
+
+    taste = {
+        "genres": {g: rnd.uniform(-3, 9) for g in rnd.sample(GENRES, 8)},
+        "keywords": {
+            k: rnd.uniform(-2, 6) for k in rnd.choices(keywords, kw_weights, k=150)
+        },
+    }
+    encoded_taste = vocab.encode_taste(taste)
+    print(
+        f"taste JSON bytes: names {len(json.dumps(taste))}, "
+        f"ids {len(json.dumps(encoded_taste))}"
+    )
+
+    cand_dicts = [
+        {k: m[k] for k in ("movie_id", "genres", "keywords", "popularity", "rating")}
+        for m in movies
+    ]
+    cand_tuples = [
+        (m["movie_id"], m["feature_ids"], m["popularity"], m["rating"])
+        for m in movies
+    ]
+
+    t0 = time.perf_counter()
+    for _ in range(args.users):
+        strings = rank_movies_for_user("u", taste, cand_dicts)
+    t_strings = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(args.users):
+        weights = vocab.ranker_weights(taste)
+        ints = rank_movies_encoded("u", weights, cand_tuples)
+    t_ints = time.perf_counter() - t0
+
+    assert [m for m, _ in strings[:20]] == [m for m, _ in ints[:20]]
+    print(
+        f"ranking {args.movies} candidates x {args.users} users: "
+        f"strings {args.users / t_strings:.0f} users/s, "
+        f"ints {args.users / t_ints:.0f} users/s "
+        f"({t_strings / t_ints:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Микро-бенчмарки ядер ранжирования и сходства с JSON-базой для сравнения.
+
+Builds a deterministic synthetic catalog per size (Zipf genre and keyword
+frequencies, Pareto popularity) and users whose histories are drawn by
+movie popularity, then times the hot paths:
+
+    rank_movies_for_user      JSON taste, 200 popular candidates
+    rank_movies_encoded       the same candidates on feature ids
+    rank_movies_dense         the same candidates on a dense layout
+    rank_movies_for_users     batch ranker, --batch-users × whole catalog
+    rank_friend_match/json    JSON taste payload
+    rank_friend_match/dense   dense taste payload
+    cosine/genres             _cosine_similarity on genre weights
+    cosine/keywords           _cosine_similarity on keyword weights
+    accumulate_taste_scores   one history → feature weights, as in
+                              recalc_taste_vector
+
+Every case reports the median and the best per-call time over --repeat
+rounds. --output writes the results as a baseline; --compare reads one
+and flags cases whose median got slower than --threshold (exit code 1).
+Compare only baselines taken on the same machine.
+
+Запуск:
+
+    python -m src.scripts.benchmark_kernels --sizes 10000,100000 --output bench.json
+    python -m src.scripts.benchmark_kernels --sizes 10000,100000 --compare bench.json
+    python -m src.scripts.benchmark_kernels --sizes 500000 --repeat 3
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable
+from uuid import UUID
+
+import numpy as np
+
+from src.ai import (DenseTasteLayout, FeatureVocabulary,
+                    rank_friend_match_for_users, rank_movies_dense,
+                    rank_movies_encoded, rank_movies_for_user,
+                    rank_movies_for_users, ranking_catalog)
+from src.ai.features import GENRE, KEYWORD
+from src.ai.llm import _cosine_similarity
+from src.ai.taste import STATUS_WEIGHTS, accumulate_taste_scores
+
+GENRES = [
+    "Drama", "Comedy", "Thriller", "Action", "Romance", "Horror", "Crime",
+    "Adventure", "Science Fiction", "Family", "Fantasy", "Mystery",
+    "Animation", "Documentary", "History", "Music", "War", "TV Movie",
+    "Western",
+]
+
+CANDIDATES = 200
+
+
+def _zipf_p(n: int, s: float) -> np.ndarray:
+    p = 1.0 / np.arange(1, n + 1) ** s
+    return p / p.sum()
+
+
+class SyntheticCatalog:
+    """
+    Movies as CSR feature rows (genre ids 1..19, then keyword ids), with
+    the vocabulary and dense layout the rankers need.
+    """
+
+    def __init__(self, n_movies: int, rng: np.random.Generator, args) -> None:
+        n_genres = len(GENRES)
+        n_keywords = max(2000, n_movies // 4)
+        self.n_movies = n_movies
+        self.movie_ids = [UUID(int=i + 1) for i in range(n_movies)]
+        self.popularity = rng.pareto(1.2, n_movies) * 10
+        self.rating = rng.uniform(3, 9, n_movies)
+        self.pick_p = self.popularity / self.popularity.sum()
+
+        # 1-3 genres per movie without replacement: Gumbel top-k over the
+        # Zipf genre distribution, vectorized
+        keys = np.log(_zipf_p(n_genres, 1.0)) + rng.gumbel(size=(n_movies, n_genres))
+        top3 = np.argsort(-keys, axis=1)[:, :3]
+        n_g = rng.integers(1, 4, n_movies)
+        genre_rows = np.repeat(np.arange(n_movies), n_g)
+        genre_ids = top3[np.arange(3) < n_g[:, None]] + 1
+
+        n_k = rng.poisson(args.keywords_per_movie, n_movies) + 1
+        kw_rows = np.repeat(np.arange(n_movies), n_k)
+        kw_ids = (
+            rng.choice(n_keywords, n_k.sum(), p=_zipf_p(n_keywords, 1.07))
+            + n_genres
+            + 1
+        )
+
+        rows = np.concatenate([genre_rows, kw_rows])
+        ids = np.concatenate([genre_ids, kw_ids])
+        order = np.lexsort((ids, rows))
+        rows, ids = rows[order], ids[order]
+        keep = np.ones(len(ids), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (ids[1:] != ids[:-1])
+        rows, self.feature_ids = rows[keep], ids[keep].astype(np.int32)
+        self.indptr = np.concatenate(
+            [[0], np.cumsum(np.bincount(rows, minlength=n_movies))]
+        )
+
+        vocab_rows = [(i + 1, GENRE, g) for i, g in enumerate(GENRES)]
+        vocab_rows += [
+            (n_genres + 1 + i, KEYWORD, f"keyword {i}") for i in range(n_keywords)
+        ]
+        self.vocab = FeatureVocabulary(vocab_rows)
+        doc_freq = np.bincount(self.feature_ids, minlength=n_genres + n_keywords + 1)
+        top_kw = np.argsort(-doc_freq[n_genres + 1:], kind="stable")[
+            : args.top_keywords
+        ] + n_genres + 1
+        self.layout = DenseTasteLayout(
+            1,
+            np.concatenate([np.arange(1, n_genres + 1), top_kw]),
+            GENRES,
+            args.buckets,
+        )
+
+    def features(self, row: int) -> np.ndarray:
+        return self.feature_ids[self.indptr[row]:self.indptr[row + 1]]
+
+    def movie_dict(self, row: int) -> dict:
+        names = self.vocab.decode(self.features(row).tolist())
+        return {
+            "movie_id": str(self.movie_ids[row]),
+            "genres": [n for kind, n in names if kind == GENRE],
+            "keywords": [n for kind, n in names if kind == KEYWORD],
+            "popularity": float(self.popularity[row]),
+            "rating": float(self.rating[row]),
+        }
+
+    def candidate(self, row: int) -> tuple:
+        # the CatalogStore.candidate tuple
+        return (
+            str(self.movie_ids[row]),
+            self.features(row),
+            float(self.popularity[row]),
+            float(self.rating[row]),
+        )
+
+
+class SyntheticUser:
+    def __init__(self, catalog: SyntheticCatalog, rng: np.random.Generator):
+        n = int(min(500, max(5, rng.zipf(1.5) * 5)))
+        rows = np.unique(rng.choice(catalog.n_movies, n, p=catalog.pick_p))
+        kinds = rng.random(len(rows))
+        ids = [catalog.movie_ids[r] for r in rows.tolist()]
+        self.fav_ids = {m for m, k in zip(ids, kinds) if k < 0.3}
+        self.dis_ids = {m for m, k in zip(ids, kinds) if 0.3 <= k < 0.45}
+        statuses = list(STATUS_WEIGHTS)
+        self.status_map = {
+            m: statuses[i % len(statuses)]
+            for i, (m, k) in enumerate(zip(ids, kinds))
+            if 0.45 <= k < 0.65
+        }
+        self.swipe_map = {m: "like" for m, k in zip(ids, kinds) if k >= 0.5}
+        # movies as recalc_taste_vector loads them: (id, int[] as list)
+        self.history = [
+            (m, catalog.features(r).tolist()) for m, r in zip(ids, rows.tolist())
+        ]
+        self.scores = self.accumulate(catalog)
+        self.taste_vector = catalog.vocab.decode_taste(self.scores)
+        self.dense = catalog.layout.encode(self.scores)
+
+    def accumulate(self, catalog: SyntheticCatalog) -> dict[int, float]:
+        return accumulate_taste_scores(
+            self.history,
+            catalog.vocab,
+            self.fav_ids,
+            self.dis_ids,
+            self.status_map,
+            self.swipe_map,
+        )
+
+
+def _time(fn: Callable[[], object], repeat: int, min_seconds: float) -> dict:
+    # loops per round calibrated so one round lasts at least min_seconds
+    loops = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t
+        if elapsed >= min_seconds:
+            break
+        loops = max(loops * 2, int(loops * min_seconds * 1.2 / max(elapsed, 1e-9)))
+    per_call = [elapsed / loops]
+    for _ in range(repeat - 1):
+        t = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_call.append((time.perf_counter() - t) / loops)
+    return {
+        "median_us": statistics.median(per_call) * 1e6,
+        "min_us": min(per_call) * 1e6,
+        "loops": loops,
+        "rounds": repeat,
+    }
+
+
+def _cases(catalog: SyntheticCatalog, users: list[SyntheticUser], rng, args):
+    """
+    (name, zero-argument callable) per kernel; callables cycle through
+    users and candidate pools so no call sees warm per-input state.
+    """
+    top = np.argsort(-catalog.popularity)[: CANDIDATES * 4]
+    pools = [rng.choice(top, CANDIDATES, replace=False) for _ in range(8)]
+    dict_pools = [[catalog.movie_dict(r) for r in pool.tolist()] for pool in pools]
+    tuple_pools = [[catalog.candidate(r) for r in pool.tolist()] for pool in pools]
+    encoded = [catalog.vocab.ranker_weights(u.taste_vector) for u in users]
+    dense = [catalog.layout.ranker_weights(u.dense) for u in users]
+    n = len(users)
+    pairs = list(zip(range(n), range(1, n)))
+
+    def cycle(items):
+        it = itertools.cycle(items)
+        return lambda: next(it)
+
+    next_user = cycle(range(n))
+    next_pool = cycle(range(len(pools)))
+    next_pair = cycle(pairs)
+
+    def rank_json():
+        u, p = next_user(), next_pool()
+        rank_movies_for_user("u", users[u].taste_vector, dict_pools[p])
+
+    def rank_encoded():
+        u, p = next_user(), next_pool()
+        rank_movies_encoded("u", encoded[u], tuple_pools[p])
+
+    def rank_dense():
+        u, p = next_user(), next_pool()
+        rank_movies_dense("u", catalog.layout, dense[u], tuple_pools[p])
+
+    ranking = ranking_catalog(
+        catalog.layout,
+        [str(m) for m in catalog.movie_ids],
+        catalog.indptr,
+        catalog.feature_ids,
+        catalog.popularity,
+        catalog.rating,
+    )
+    batch = np.stack(dense[: args.batch_users])
+
+    def rank_batch():
+        rank_movies_for_users(batch, ranking, CANDIDATES)
+
+    def friend_json():
+        a, b = next_pair()
+        rank_friend_match_for_users(
+            "a",
+            "b",
+            {
+                "taste_a": users[a].taste_vector,
+                "taste_b": users[b].taste_vector,
+                "common_favorites_count": 3,
+            },
+        )
+
+    def friend_dense():
+        a, b = next_pair()
+        rank_friend_match_for_users(
+            "a",
+            "b",
+            {
+                "dense_a": users[a].dense,
+                "dense_b": users[b].dense,
+                "genre_dims": catalog.layout.n_genres,
+                "common_favorites_count": 3,
+            },
+        )
+
+    def cosine(section):
+        def run():
+            a, b = next_pair()
+            _cosine_similarity(
+                users[a].taste_vector.get(section) or {},
+                users[b].taste_vector.get(section) or {},
+            )
+
+        return run
+
+    def accumulate():
+        users[next_user()].accumulate(catalog)
+
+    return [
+        ("rank_movies_for_user", rank_json),
+        ("rank_movies_encoded", rank_encoded),
+        ("rank_movies_dense", rank_dense),
+        ("rank_movies_for_users", rank_batch),
+        ("rank_friend_match/json", friend_json),
+        ("rank_friend_match/dense", friend_dense),
+        ("cosine/genres", cosine("genres")),
+        ("cosine/keywords", cosine("keywords")),
+        ("accumulate_taste_scores", accumulate),
+    ]
+
+
+def run(args) -> dict:
+    results = {}
+    for size in args.sizes:
+        rng = np.random.default_rng(args.seed + size)
+        t = time.perf_counter()
+        catalog = SyntheticCatalog(size, rng, args)
+        users = [SyntheticUser(catalog, rng) for _ in range(args.users)]
+        print(
+            f"catalog {size}: nnz {len(catalog.feature_ids)}, "
+            f"{len(catalog.vocab)} features, {args.users} users, "
+            f"built in {time.perf_counter() - t:.1f}s"
+        )
+        for name, fn in _cases(catalog, users, rng, args):
+            if args.only and not any(o in name for o in args.only):
+                continue
+            key = f"{name}@{size}"
+            results[key] = _time(fn, args.repeat, args.min_seconds)
+            print(
+                f"  {name:<26} median {results[key]['median_us']:>12.1f}us  "
+                f"min {results[key]['min_us']:>12.1f}us"
+            )
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Cases whose median is more than `threshold` (0.1 = 10%) slower than
+    the baseline's, with the ratio; cases missing from either side are
+    skipped.
+    """
+    regressions = []
+    print(f"\n{'case':<36} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for key in sorted(results.keys() & baseline.keys()):
+        old = baseline[key]["median_us"]
+        new = results[key]["median_us"]
+        ratio = new / old if old else float("inf")
+        flag = ratio > 1 + threshold
+        print(
+            f"{key:<36} {old:>10.1f}us {new:>10.1f}us {ratio:>6.2f}x"
+            + ("  REGRESSION" if flag else "")
+        )
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[10_000, 100_000],
+        help="catalog sizes, comma-separated",
+    )
+    parser.add_argument("--users", type=int, default=256)
+    parser.add_argument("--batch-users", type=int, default=256)
+    parser.add_argument("--keywords-per-movie", type=float, default=10.0)
+    parser.add_argument("--top-keywords", type=int, default=1024)
+    parser.add_argument("--buckets", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=0.2)
+    parser.add_argument("--only", action="append", help="case name substring")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "machine": platform.machine(),
+                        "processor": platform.processor(),
+                        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "args": {
+                            k: v
+                            for k, v in vars(args).items()
+                            if k not in ("output", "compare")
+                        },
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nbaseline written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
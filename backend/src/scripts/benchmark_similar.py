@@ -0,0 +1,151 @@
+"""
+Recall и латентность индекса похожих фильмов.
+
+Embeds a synthetic topic-structured catalog (default) or the `movies`
+table with TF-IDF + truncated SVD, then compares the random-projection LSH
+index with exact brute force: recall@k, query latency percentiles, build
+times and index memory.
+
+Запуск:
+
+    python -m src.scripts.benchmark_similar --movies 50000 --k 10
+    python -m src.scripts.benchmark_similar --tables 12 --bits 10
+    python -m src.scripts.benchmark_similar --from-db
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+import numpy as np
+
+from src.ai.embeddings import (RandomProjectionLSH, brute_force_neighbours,
+                               movie_terms, normalize_rows, tfidf_matrix,
+                               truncated_svd)
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary",
+    "Drama", "Family", "Fantasy", "History", "Horror", "Music", "Mystery",
+    "Romance", "Science Fiction", "TV Movie", "Thriller", "War", "Western",
+]
+
+
+def _synthetic_docs(n: int, seed: int) -> list[dict[str, float]]:
+    # every movie draws from one of 200 topics: a few topic words and
+    # keywords over a shared Zipf background vocabulary
+    rnd = random.Random(seed)
+    background = [f"word{i}" for i in range(20_000)]
+    bg_cum = list(
+        itertools.accumulate(1.0 / (i + 1) for i in range(len(background)))
+    )
+    topics = [
+        (
+            [f"topic{t}w{j}" for j in range(30)],
+            [f"topic {t} kw {j}" for j in range(10)],
+            rnd.sample(GENRES, 2),
+        )
+        for t in range(200)
+    ]
+    docs = []
+    for _ in range(n):
+        words, keywords, genres = rnd.choice(topics)
+        overview = rnd.choices(background, cum_weights=bg_cum, k=40)
+        overview += rnd.choices(words, k=8)
+        docs.append(
+            movie_terms(
+                " ".join(overview),
+                genres[: rnd.randint(1, 2)],
+                rnd.sample(keywords, rnd.randint(2, 6)),
+            )
+        )
+    return docs
+
+
+async def _docs_from_db() -> list[dict[str, float]]:
+    from sqlalchemy import select
+
+    from src.app.db import AsyncSessionLocal
+    from src.movies.models import Movie
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            select(Movie.overview, Movie.genres, Movie.keywords)
+        )
+        return [
+            movie_terms(row.overview, row.genres, row.keywords)
+            async for row in result
+        ]
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--movies", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--tables", type=int, default=8)
+    parser.add_argument("--bits", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--from-db", action="store_true")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.from_db:
+        docs = asyncio.run(_docs_from_db())
+    else:
+        docs = _synthetic_docs(args.movies, args.seed)
+    t1 = time.perf_counter()
+    matrix, terms = tfidf_matrix(docs)
+    t2 = time.perf_counter()
+    vectors = normalize_rows(truncated_svd(matrix, args.dim, seed=args.seed))
+    t3 = time.perf_counter()
+    index = RandomProjectionLSH(vectors, args.tables, args.bits, args.seed)
+    t4 = time.perf_counter()
+    print(
+        f"{len(docs)} movies, {len(terms)} terms, nnz {len(matrix.indices)}: "
+        f"docs {t1 - t0:.1f}s, tfidf {t2 - t1:.1f}s, svd {t3 - t2:.1f}s, "
+        f"lsh {t4 - t3:.2f}s"
+    )
+    print(
+        f"memory: vectors {vectors.nbytes / 2**20:.1f} MiB, "
+        f"lsh {index.nbytes() / 2**20:.1f} MiB"
+    )
+
+    rng = np.random.default_rng(args.seed)
+    rows = rng.choice(
+        len(vectors), size=min(args.queries, len(vectors)), replace=False
+    )
+    exact_us, approx_us, recalls, candidates = [], [], [], []
+    for row in rows.tolist():
+        t = time.perf_counter()
+        exact, _ = brute_force_neighbours(vectors, row, args.k)
+        exact_us.append((time.perf_counter() - t) * 1e6)
+
+        t = time.perf_counter()
+        approx, _ = index.query(row, args.k)
+        approx_us.append((time.perf_counter() - t) * 1e6)
+
+        recalls.append(len(set(exact.tolist()) & set(approx.tolist())) / args.k)
+        candidates.append(len(index.candidates(vectors[row])))
+
+    print(
+        f"recall@{args.k}: {np.mean(recalls):.3f} "
+        f"(min {min(recalls):.2f}), "
+        f"candidates/query {np.mean(candidates):.0f}"
+    )
+    for name, samples in (("brute force", exact_us), ("lsh", approx_us)):
+        print(
+            f"{name:>11}: p50={_percentile(samples, 0.50):.0f}us "
+            f"p99={_percentile(samples, 0.99):.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -21,8 +21,8 @@ from src.app.db import AsyncSessionLocal
 from src.app.tasks import generate_movie_recommendations, recalc_taste_vector
 from src.auth import crud as auth_crud
 from src.auth.models import Profile, User
-from src.movies.crud import (add_dislike, add_favorite, create_swipe,
-                             upsert_status)
+from src.movies.crud import (active_recommendations, add_dislike,
+                             add_favorite, create_swipe, upsert_status)
 from src.movies.models import AIRecommendation, Favorite, Movie
 
 
@@ -103,7 +103,7 @@ async def _recompute_and_print(db: AsyncSession, users: list[User]) -> None:
         rec_res = await db.execute(
             select(AIRecommendation, Movie)
             .join(Movie, AIRecommendation.movie_id == Movie.id)
-            .where(AIRecommendation.user_id == user.id)
+            .where(active_recommendations(user.id))
             .order_by(AIRecommendation.score.desc())
             .limit(10)
         )
@@ -0,0 +1,405 @@
+"""
+Нагрузочный тест сценария свайпов iOS-клиента против запущенного стека.
+
+Every virtual user replays the app's session loop against a running API
+(uvicorn + Postgres + Redis + RabbitMQ + worker):
+
+    POST /auth/login, GET /auth/me
+    loop: GET /movies/swipe-batch
+          per card: think, POST /movies/{id}/swipes (like/dislike),
+                    sometimes POST /movies/{id}/favorites
+          GET /movies/recommendations
+
+Users log in as accounts from src.scripts.seed_synthetic. Think times,
+like and favorite decisions come from per-user streams of --seed, so a
+run replays the same sessions (card content still depends on the data).
+An empty swipe batch makes the client poll until the worker refills it;
+that wait is reported as time-to-fresh-deck. A sampler reads the depth of
+every Celery queue from the broker once a second, and task-queue lag
+(publish to worker start) comes from the worker's
+celery_task_queue_wait_seconds histogram, scraped from --worker-metrics
+before and after the run; its percentiles are estimated from the bucket
+deltas, like histogram_quantile.
+
+Reports per-endpoint p50/p90/p99/max latency, error rates, throughput,
+queue depths and lag and time-to-fresh-deck; --output also writes them
+as JSON.
+
+Запуск:
+
+    docker compose up -d && alembic upgrade head
+    python -m src.scripts.seed_synthetic --users 2000
+    python -m src.scripts.loadtest_swipe --users 200 --duration 120
+    python -m src.scripts.loadtest_swipe --users 50 --think 0.5 --output run.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.app.tasks import celery_app
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.latency: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.status: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.deck_wait: list[float] = []
+        self.deck_timeouts = 0
+        self.queue_depth: dict[str, list[int]] = defaultdict(list)
+        self.sessions = 0
+
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, stats: Stats, args):
+        self.index = index
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.rng = random.Random(f"{args.seed}:{index}")
+        self.headers: dict[str, str] = {}
+        self.user_id: str | None = None
+
+    async def call(self, name: str, method: str, url: str, **kwargs):
+        """
+        One request timed under its route template `name`; None on a
+        transport error or a 4xx/5xx.
+        """
+        t = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, url, headers=self.headers, **kwargs
+            )
+        except httpx.HTTPError:
+            self.stats.latency[name].append(time.perf_counter() - t)
+            self.stats.errors[name] += 1
+            return None
+        self.stats.latency[name].append(time.perf_counter() - t)
+        self.stats.status[name][response.status_code] += 1
+        if response.status_code >= 400:
+            self.stats.errors[name] += 1
+            return None
+        return response
+
+    async def think(self) -> None:
+        await asyncio.sleep(self.rng.expovariate(1 / self.args.think))
+
+    async def login(self) -> bool:
+        email = f"seed{self.args.data_seed}-{self.index % self.args.accounts}@example.com"
+        response = await self.call(
+            "POST /auth/login",
+            "POST",
+            "/auth/login",
+            json={"email": email, "password": self.args.password},
+        )
+        if response is None:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        me = await self.call("GET /auth/me", "GET", "/auth/me")
+        if me is None:
+            return False
+        self.user_id = me.json()["id"]
+        return True
+
+    async def deck(self, deadline: float) -> list[dict]:
+        """
+        Next swipe batch; polls while it is empty (the first empty answer
+        enqueues prepare_swipe_batch) and records how long that took.
+        """
+        t0 = time.perf_counter()
+        while time.perf_counter() < deadline:
+            response = await self.call(
+                "GET /movies/swipe-batch", "GET", "/movies/swipe-batch"
+            )
+            cards = response.json() if response is not None else []
+            if cards:
+                self.stats.deck_wait.append(time.perf_counter() - t0)
+                return cards
+            if time.perf_counter() - t0 > self.args.deck_timeout:
+                self.stats.deck_timeouts += 1
+                return []
+            await asyncio.sleep(self.args.deck_poll)
+        return []
+
+    async def run(self, deadline: float) -> None:
+        # spread logins so the ramp-up is not one thundering herd
+        await asyncio.sleep(self.rng.uniform(0, self.args.ramp))
+        if not await self.login():
+            return
+        self.stats.sessions += 1
+        while time.perf_counter() < deadline:
+            cards = await self.deck(deadline)
+            if not cards:
+                continue
+            for card in cards[: self.args.cards_per_batch]:
+                if time.perf_counter() >= deadline:
+                    return
+                await self.think()
+                like = self.rng.random() < self.args.like_rate
+                await self.call(
+                    "POST /movies/{id}/swipes",
+                    "POST",
+                    f"/movies/{card['id']}/swipes",
+                    json={
+                        "user_id": self.user_id,
+                        "direction": "like" if like else "dislike",
+                    },
+                )
+                if like and self.rng.random() < self.args.favorite_rate:
+                    await self.call(
+                        "POST /movies/{id}/favorites",
+                        "POST",
+                        f"/movies/{card['id']}/favorites",
+                    )
+            await self.call(
+                "GET /movies/recommendations",
+                "GET",
+                "/movies/recommendations",
+                params={"limit": 20},
+            )
+
+
+def _queue_sampler(stats: Stats, stop: threading.Event, interval: float) -> None:
+    # broker-side ready messages per queue; passive declare does not create
+    queues = sorted(
+        {t.queue for t in celery_app.tasks.values() if getattr(t, "queue", None)}
+    )
+    with celery_app.connection_for_read() as conn:
+        channel = conn.channel()
+        while not stop.wait(interval):
+            for queue in queues:
+                try:
+                    _, depth, _ = channel.queue_declare(queue=queue, passive=True)
+                except Exception:
+                    # undeclared until a worker consumes it; AMQP closes
+                    # the channel on a failed passive declare
+                    channel = conn.channel()
+                    continue
+                stats.queue_depth[queue].append(depth)
+
+
+QUEUE_WAIT_METRIC = "celery_task_queue_wait_seconds"
+
+
+async def scrape_queue_wait(url: str) -> dict[str, dict[float, float]] | None:
+    """
+    Cumulative queue-wait histogram buckets per queue (summed over tasks)
+    from a worker's /metrics, or None if it cannot be scraped.
+    """
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(url)
+            response.raise_for_status()
+    except httpx.HTTPError as exc:
+        print(f"cannot scrape {url}: {exc}")
+        return None
+    buckets: dict[str, dict[float, float]] = defaultdict(dict)
+    for family in text_string_to_metric_families(response.text):
+        if family.name != QUEUE_WAIT_METRIC:
+            continue
+        for sample in family.samples:
+            if sample.name != QUEUE_WAIT_METRIC + "_bucket":
+                continue
+            queue = buckets[sample.labels["queue"]]
+            le = float(sample.labels["le"])
+            queue[le] = queue.get(le, 0.0) + sample.value
+    return buckets
+
+
+def _histogram_quantile(q: float, buckets: list[tuple[float, float]]) -> float:
+    # buckets: (upper bound, cumulative count), sorted; linear within one
+    total = buckets[-1][1]
+    rank = q * total
+    lower, below = 0.0, 0.0
+    for upper, count in buckets:
+        if count >= rank:
+            if upper == float("inf"):
+                return lower
+            if count == below:
+                return upper
+            return lower + (upper - lower) * (rank - below) / (count - below)
+        lower, below = upper, count
+    return lower
+
+
+def queue_lag(
+    before: dict[str, dict[float, float]], after: dict[str, dict[float, float]]
+) -> dict[str, dict[str, float]]:
+    """
+    Per-queue lag percentiles of the tasks started between two scrapes.
+    """
+    lag = {}
+    for queue, cumulative in sorted(after.items()):
+        start = before.get(queue, {})
+        buckets = sorted(
+            (le, count - start.get(le, 0.0)) for le, count in cumulative.items()
+        )
+        if not buckets or buckets[-1][1] <= 0:
+            continue
+        lag[queue] = {
+            "count": int(buckets[-1][1]),
+            **{
+                f"p{int(q * 100)}_ms": _histogram_quantile(q, buckets) * 1000
+                for q in (0.5, 0.9, 0.99)
+            },
+        }
+    return lag
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ms = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def report(stats: Stats, seconds: float, lag: dict | None = None) -> dict:
+    endpoints = {}
+    for name, values in sorted(stats.latency.items()):
+        endpoints[name] = {
+            **_percentiles(values),
+            "rps": len(values) / seconds,
+            "error_rate": stats.errors[name] / len(values),
+            "status": dict(stats.status[name]),
+        }
+    return {
+        "seconds": seconds,
+        "sessions": stats.sessions,
+        "requests": sum(len(v) for v in stats.latency.values()),
+        "endpoints": endpoints,
+        "time_to_fresh_deck": {
+            **_percentiles(stats.deck_wait),
+            "timeouts": stats.deck_timeouts,
+        },
+        "queue_depth": {
+            queue: {
+                "max": max(depths),
+                "p90": float(np.percentile(depths, 90)),
+                "last": depths[-1],
+            }
+            for queue, depths in sorted(stats.queue_depth.items())
+            if depths
+        },
+        "queue_lag": lag or {},
+    }
+
+
+def _print(result: dict) -> None:
+    print(
+        f"\n{result['sessions']} sessions, {result['requests']} requests "
+        f"in {result['seconds']:.0f}s"
+    )
+    print(
+        f"{'endpoint':<32} {'rps':>7} {'p50':>8} {'p90':>8} {'p99':>8} "
+        f"{'max':>8} {'err':>6}"
+    )
+    for name, e in result["endpoints"].items():
+        print(
+            f"{name:<32} {e['rps']:>7.1f} {e['p50_ms']:>6.0f}ms {e['p90_ms']:>6.0f}ms "
+            f"{e['p99_ms']:>6.0f}ms {e['max_ms']:>6.0f}ms {e['error_rate']:>6.1%}"
+        )
+    deck = result["time_to_fresh_deck"]
+    if deck.get("count"):
+        print(
+            f"\ntime-to-fresh-deck: p50 {deck['p50_ms']:.0f}ms "
+            f"p90 {deck['p90_ms']:.0f}ms p99 {deck['p99_ms']:.0f}ms, "
+            f"{deck['timeouts']} timeouts"
+        )
+    for queue, q in result["queue_depth"].items():
+        print(f"queue {queue:<30} max {q['max']:>6} p90 {q['p90']:>8.0f} last {q['last']}")
+    for queue, q in result["queue_lag"].items():
+        print(
+            f"lag   {queue:<30} n {q['count']:>6} p50 {q['p50_ms']:>7.0f}ms "
+            f"p90 {q['p90_ms']:>7.0f}ms p99 {q['p99_ms']:>7.0f}ms"
+        )
+
+
+async def main_async(args) -> dict:
+    stats = Stats()
+    stop = threading.Event()
+    sampler = None
+    if args.queues:
+        sampler = threading.Thread(
+            target=_queue_sampler, args=(stats, stop, 1.0), daemon=True
+        )
+        sampler.start()
+    lag_before = (
+        await scrape_queue_wait(args.worker_metrics) if args.worker_metrics else None
+    )
+    limits = httpx.Limits(max_connections=args.connections)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        t0 = time.perf_counter()
+        deadline = t0 + args.duration
+        await asyncio.gather(
+            *(
+                VirtualUser(i, client, stats, args).run(deadline)
+                for i in range(args.users)
+            )
+        )
+        seconds = time.perf_counter() - t0
+    stop.set()
+    if sampler is not None:
+        sampler.join(timeout=5)
+    lag = None
+    if lag_before is not None:
+        lag_after = await scrape_queue_wait(args.worker_metrics)
+        if lag_after is not None:
+            lag = queue_lag(lag_before, lag_after)
+    return report(stats, seconds, lag)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=100, help="concurrent swipers")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--ramp", type=float, default=10.0)
+    parser.add_argument("--think", type=float, default=1.5, help="mean seconds per card")
+    parser.add_argument("--cards-per-batch", type=int, default=20)
+    parser.add_argument("--like-rate", type=float, default=0.6)
+    parser.add_argument("--favorite-rate", type=float, default=0.2)
+    parser.add_argument("--deck-poll", type=float, default=0.25)
+    parser.add_argument("--deck-timeout", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--accounts", type=int, default=2000, help="seeded users to log in as")
+    parser.add_argument("--data-seed", type=int, default=42, help="seed_synthetic --seed")
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--no-queues", dest="queues", action="store_false",
+        help="do not sample Celery queue depths from the broker",
+    )
+    parser.add_argument(
+        "--worker-metrics", default="http://localhost:9808/metrics",
+        help="Celery worker metrics URL for task-queue lag ('' to skip)",
+    )
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+    _print(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), **result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Синтетические пользователи, фильмы и взаимодействия в Postgres через COPY.
+
+Generates movies (Zipf genres/keywords, Pareto popularity), users with
+profiles, and a power-law number of swipes per user over popularity-
+weighted movies; favorites, statuses and dislikes are drawn from those
+swipes the way the app produces them (a favorite is also a like swipe).
+Rows are streamed with asyncpg copy_records_to_table, one transaction
+per block of users.
+
+Everything is derived from --seed in fixed-size blocks, so a run is
+reproducible and a later run with larger --users / --movies only adds
+the missing tail (incremental top-up). Seeded rows are recognisable by
+their tmdb_id (`seed:<seed>:<n>`) and e-mail (`seed<seed>-<n>@example.com`);
+every seeded user's password is --password, for the load-test harness.
+Timestamps are relative to the time of the run.
+
+Запуск:
+
+    alembic upgrade head
+    python -m src.scripts.seed_synthetic --users 50000 --movies 20000
+    python -m src.scripts.seed_synthetic --users 100000  # top-up
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+import asyncpg
+import numpy as np
+
+from src.ai.features import GENRE, KEYWORD
+from src.app.config import get_settings
+from src.auth.crud import hash_password
+
+GENRES = [
+    "Drama", "Comedy", "Thriller", "Action", "Romance", "Horror", "Crime",
+    "Adventure", "Science Fiction", "Family", "Fantasy", "Mystery",
+    "Animation", "Documentary", "History", "Music", "War", "TV Movie",
+    "Western",
+]
+STATUSES = ["watching", "want_to_watch", "completed", "dropped"]
+
+# rows generated per rng stream; fixed so top-ups line up with earlier runs
+BLOCK = 1000
+_MOVIE_STREAM, _USER_STREAM = 1, 2
+
+
+def _uuids(rng: np.random.Generator, n: int) -> list[UUID]:
+    # version-4 layout from the seeded stream instead of os.urandom
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    return [UUID(bytes=b.tobytes()) for b in raw]
+
+
+def _zipf_p(n: int, s: float) -> np.ndarray:
+    p = 1.0 / np.arange(1, n + 1) ** s
+    return p / p.sum()
+
+
+def _dedupe(rows: np.ndarray, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    return rows[keep], cols[keep]
+
+
+async def _seed_features(conn, seed: int, n_keywords: int) -> dict:
+    names = [(GENRE, g) for g in GENRES] + [
+        (KEYWORD, f"seed{seed} keyword {i}") for i in range(n_keywords)
+    ]
+    await conn.execute(
+        """
+        INSERT INTO features (kind, name)
+        SELECT * FROM unnest($1::feature_kind[], $2::text[])
+        ON CONFLICT ON CONSTRAINT uq_features_kind_name DO NOTHING
+        """,
+        [k for k, _ in names],
+        [n for _, n in names],
+    )
+    rows = await conn.fetch(
+        "SELECT id, kind::text, name FROM features WHERE name = ANY($1::text[])",
+        [n for _, n in names],
+    )
+    return {(r["kind"], r["name"]): r["id"] for r in rows}
+
+
+def _movie_block(seed: int, block: int, n_keywords: int, fids: dict, now):
+    rng = np.random.default_rng([seed, _MOVIE_STREAM, block])
+    ids = _uuids(rng, BLOCK)
+    popularity = rng.pareto(1.2, BLOCK) * 10
+    rating = rng.uniform(3, 9, BLOCK)
+    released = rng.integers(0, 60 * 365, BLOCK)
+    genre_p = _zipf_p(len(GENRES), 1.0)
+    kw_p = _zipf_p(n_keywords, 1.07)
+    records = []
+    for i in range(BLOCK):
+        genres = [
+            GENRES[g]
+            for g in rng.choice(len(GENRES), rng.integers(1, 4), replace=False, p=genre_p)
+        ]
+        keywords = sorted(
+            {
+                f"seed{seed} keyword {k}"
+                for k in rng.choice(n_keywords, rng.poisson(10) + 1, p=kw_p)
+            }
+        )
+        n = block * BLOCK + i
+        records.append(
+            (
+                ids[i],
+                f"seed:{seed}:{n}",
+                f"Synthetic Movie {n}",
+                f"Synthetic overview {n}: " + ", ".join(keywords[:5]),
+                date(1965, 1, 1) + timedelta(days=int(released[i])),
+                Decimal(f"{rating[i]:.1f}"),
+                Decimal(f"{popularity[i]:.3f}"),
+                genres,
+                keywords,
+                sorted(
+                    [fids[(GENRE, g)] for g in genres]
+                    + [fids[(KEYWORD, k)] for k in keywords]
+                ),
+                now,
+                now,
+            )
+        )
+    return records
+
+
+MOVIE_COLUMNS = [
+    "id", "tmdb_id", "title", "overview", "release_date", "rating",
+    "popularity", "genres", "keywords", "feature_ids", "created_at",
+    "updated_at",
+]
+
+
+async def seed_movies(conn, args, now) -> int:
+    n_keywords = max(2000, args.movies // 4)
+    have = await conn.fetchval(
+        "SELECT count(*) FROM movies WHERE tmdb_id LIKE $1", f"seed:{args.seed}:%"
+    )
+    if have >= args.movies:
+        return 0
+    fids = await _seed_features(conn, args.seed, n_keywords)
+    added = 0
+    for block in range(have // BLOCK, -(-args.movies // BLOCK)):
+        records = _movie_block(args.seed, block, n_keywords, fids, now)
+        lo = max(have - block * BLOCK, 0)
+        hi = min(args.movies - block * BLOCK, BLOCK)
+        await conn.copy_records_to_table(
+            "movies", records=records[lo:hi], columns=MOVIE_COLUMNS
+        )
+        added += hi - lo
+    return added
+
+
+def _user_block(seed: int, block: int, args, movie_ids, pick_p, password_hash, now):
+    """
+    Records per table for users block*BLOCK .. +BLOCK.
+    """
+    rng = np.random.default_rng([seed, _USER_STREAM, block])
+    user_ids = _uuids(rng, BLOCK)
+    profile_ids = _uuids(rng, BLOCK)
+    joined = [now - timedelta(days=int(d)) for d in rng.integers(1, 365, BLOCK)]
+
+    # swipes per user: Pareto (power law) with mean ~--swipes-per-user
+    a = 1.8
+    counts = np.ceil(
+        args.swipes_per_user * (a - 1) / a * (rng.pareto(a, BLOCK) + 1)
+    ).astype(np.int64)
+    counts = counts.clip(1, min(args.max_swipes, len(movie_ids)))
+    rows = np.repeat(np.arange(BLOCK), counts)
+    cols = rng.choice(len(movie_ids), len(rows), p=pick_p)
+    rows, cols = _dedupe(rows, cols)
+
+    n = len(rows)
+    like = rng.random(n) < 0.6
+    roll = rng.random(n)
+    favorite = like & (roll < 0.35)
+    status = like & (roll >= 0.35) & (roll < 0.65)
+    dislike = ~like & (roll < 0.5)
+    status_kind = rng.integers(0, len(STATUSES), n)
+    ago = rng.uniform(0, 90 * 24 * 3600, n)
+    ids = _uuids(rng, n)
+
+    users, profiles = [], []
+    for i in range(BLOCK):
+        k = block * BLOCK + i
+        users.append(
+            (
+                user_ids[i],
+                f"seed{seed}-{k}@example.com",
+                password_hash,
+                f"seed{seed}_{k}",
+                joined[i],
+            )
+        )
+        profiles.append((profile_ids[i], user_ids[i], joined[i]))
+
+    swipes, favorites, dislikes, statuses = [], [], [], []
+    for j, (r, c) in enumerate(zip(rows.tolist(), cols.tolist())):
+        at = now - timedelta(seconds=float(ago[j]))
+        uid, mid = user_ids[r], movie_ids[c]
+        swipes.append((ids[j], uid, mid, "like" if like[j] else "dislike", at))
+        if favorite[j]:
+            favorites.append((ids[j], uid, mid, at))
+        elif dislike[j]:
+            dislikes.append((ids[j], uid, mid, at))
+        elif status[j]:
+            statuses.append((ids[j], uid, mid, STATUSES[status_kind[j]], at))
+    return rows, {
+        "users": users,
+        "profiles": profiles,
+        "swipes": swipes,
+        "favorites": favorites,
+        "dislikes": dislikes,
+        "statuses": statuses,
+    }
+
+
+USER_COLUMNS = {
+    "users": ["id", "email", "password_hash", "username", "created_at"],
+    "profiles": ["id", "user_id", "updated_at"],
+    "swipes": ["id", "user_id", "movie_id", "direction", "created_at"],
+    "favorites": ["id", "user_id", "movie_id", "created_at"],
+    "dislikes": ["id", "user_id", "movie_id", "created_at"],
+    "statuses": ["id", "user_id", "movie_id", "status", "updated_at"],
+}
+
+
+async def seed_users(conn, args, now) -> dict[str, int]:
+    movies = await conn.fetch(
+        "SELECT id, tmdb_id, popularity FROM movies WHERE tmdb_id LIKE $1",
+        f"seed:{args.seed}:%",
+    )
+    if not movies:
+        raise SystemExit("no seeded movies; run with --movies > 0 first")
+    # interactions depend on the seeded catalog in seed order only
+    movies = sorted(movies, key=lambda r: int(r["tmdb_id"].rsplit(":", 1)[1]))
+    movie_ids = [r["id"] for r in movies]
+    popularity = np.array([float(r["popularity"]) for r in movies]) + 1e-3
+    pick_p = popularity / popularity.sum()
+
+    have = await conn.fetchval(
+        "SELECT count(*) FROM users WHERE email LIKE $1", f"seed{args.seed}-%"
+    )
+    loaded = dict.fromkeys(USER_COLUMNS, 0)
+    if have >= args.users:
+        return loaded
+    password_hash = hash_password(args.password)
+    t0 = time.perf_counter()
+    for block in range(have // BLOCK, -(-args.users // BLOCK)):
+        lo = max(have - block * BLOCK, 0)
+        hi = min(args.users - block * BLOCK, BLOCK)
+        rows, tables = _user_block(
+            args.seed, block, args, movie_ids, pick_p, password_hash, now
+        )
+        # a partial block keeps only its users' rows
+        user_ids = {u[0] for u in tables["users"][lo:hi]}
+        async with conn.transaction():
+            for table, columns in USER_COLUMNS.items():
+                records = (
+                    tables[table][lo:hi]
+                    if table in ("users", "profiles")
+                    else [r for r in tables[table] if r[1] in user_ids]
+                )
+                if records:
+                    await conn.copy_records_to_table(
+                        table, records=records, columns=columns
+                    )
+                loaded[table] += len(records)
+        seconds = time.perf_counter() - t0
+        interactions = sum(v for k, v in loaded.items() if k not in ("users", "profiles"))
+        print(
+            f"  users {block * BLOCK + hi}/{args.users}: "
+            f"{interactions} interactions, {interactions / seconds:.0f} rows/s"
+        )
+    return loaded
+
+
+async def main_async(args) -> None:
+    dsn = get_settings().database_url_async.replace("postgresql+asyncpg", "postgresql")
+    conn = await asyncpg.connect(dsn)
+    now = datetime.utcnow()
+    try:
+        t0 = time.perf_counter()
+        added = await seed_movies(conn, args, now)
+        print(f"movies: +{added} in {time.perf_counter() - t0:.1f}s")
+        t1 = time.perf_counter()
+        loaded = await seed_users(conn, args, now)
+        print(f"users: {loaded} in {time.perf_counter() - t1:.1f}s")
+        if args.analyze:
+            await conn.execute(
+                "ANALYZE movies, features, users, profiles, swipes, "
+                "favorites, dislikes, statuses"
+            )
+    finally:
+        await conn.close()
+    if added:
+        # features.doc_freq and the dense layout only follow via their jobs
+        print(
+            "new movies: run refresh_catalog_facets and "
+            "rebuild_taste_vocabulary before benchmarking the rankers"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--movies", type=int, default=20_000)
+    parser.add_argument("--swipes-per-user", type=float, default=20.0)
+    parser.add_argument("--max-swipes", type=int, default=2000)
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--no-analyze", dest="analyze", action="store_false",
+        help="skip ANALYZE after loading",
+    )
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Разбор трейсов задач по стадиям из файла TRACING_FILE.
+
+Reads the JSON-lines spans written with TRACING_EXPORTER=file (by the API
+and every worker process into the same file) and answers "where does the
+time of this task go": for each task, the p50/p90/max of the task span
+and of each of its stages (the task span's direct children), and the
+share of the task time the stages account for. --trace prints one trace
+as a tree, from the HTTP request that enqueued the task down to the
+stages; --slowest prints the N slowest traces of a task.
+
+Запуск:
+
+    TRACING_EXPORTER=file TRACING_FILE=traces.jsonl celery -A src.app.tasks worker
+    python -m src.scripts.trace_report traces.jsonl
+    python -m src.scripts.trace_report traces.jsonl --task generate_movie_recommendations --slowest 3
+    python -m src.scripts.trace_report traces.jsonl --user <user id>
+    python -m src.scripts.trace_report traces.jsonl --trace <trace id>
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+import numpy as np
+
+
+def load(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _children(spans: list[dict]) -> dict[str | None, list[dict]]:
+    children: dict[str | None, list[dict]] = defaultdict(list)
+    for s in spans:
+        children[s["parent_id"]].append(s)
+    for group in children.values():
+        group.sort(key=lambda s: s["start_ns"])
+    return children
+
+
+def _summary(values: list[float]) -> str:
+    ms = np.asarray(values)
+    return (
+        f"n={len(values):<6} p50 {np.percentile(ms, 50):>8.1f}ms "
+        f"p90 {np.percentile(ms, 90):>8.1f}ms max {ms.max():>8.1f}ms"
+    )
+
+
+def stage_report(spans: list[dict]) -> None:
+    children = _children(spans)
+    tasks = [s for s in spans if s["kind"] == "consumer" and "task_id" in s["attributes"]]
+    by_task: dict[str, list[dict]] = defaultdict(list)
+    for s in tasks:
+        by_task[s["name"]].append(s)
+    for name, runs in sorted(by_task.items()):
+        failed = sum(bool(s["error"]) for s in runs)
+        print(f"\n{name}: {_summary([s['duration_ms'] for s in runs])}, {failed} failed")
+        stages: dict[str, list[float]] = defaultdict(list)
+        covered = 0.0
+        for run in runs:
+            for stage in children.get(run["span_id"], []):
+                stages[stage["name"]].append(stage["duration_ms"])
+                covered += stage["duration_ms"]
+        total = sum(s["duration_ms"] for s in runs)
+        for stage, values in sorted(stages.items(), key=lambda kv: -sum(kv[1])):
+            share = sum(values) / total if total else 0.0
+            print(f"  {stage:<28} {_summary(values)} {share:>6.1%}")
+        if stages and total:
+            print(f"  {'(outside stages)':<28} {1 - covered / total:>6.1%}")
+
+
+def print_tree(spans: list[dict], trace_id: str) -> None:
+    trace = [s for s in spans if s["trace_id"] == trace_id]
+    if not trace:
+        print(f"no spans for trace {trace_id}")
+        return
+    children = _children(trace)
+    ids = {s["span_id"] for s in trace}
+    # roots: no parent, or a parent that was not recorded (sampled elsewhere)
+    roots = [s for s in trace if s["parent_id"] not in ids]
+    roots.sort(key=lambda s: s["start_ns"])
+    t0 = roots[0]["start_ns"]
+    print(f"trace {trace_id}")
+
+    def walk(s: dict, depth: int) -> None:
+        offset = (s["start_ns"] - t0) / 1e6
+        attrs = " ".join(f"{k}={v}" for k, v in s["attributes"].items())
+        error = f" ERROR {s['error']}" if s["error"] else ""
+        print(
+            f"  +{offset:>9.1f}ms {s['duration_ms']:>9.1f}ms "
+            f"{'  ' * depth}{s['name']}  {attrs}{error}"
+        )
+        for child in children.get(s["span_id"], []):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="TRACING_FILE of the API and workers")
+    parser.add_argument("--task", help="only this task (span name)")
+    parser.add_argument("--user", help="only traces touching this user id")
+    parser.add_argument("--trace", help="print this trace as a tree")
+    parser.add_argument("--slowest", type=int, default=0, help="print N slowest traces")
+    args = parser.parse_args()
+
+    spans = load(args.path)
+    if args.trace:
+        print_tree(spans, args.trace)
+        return
+    if args.user or args.task:
+        traces = {
+            s["trace_id"]
+            for s in spans
+            if (args.user is None or s["attributes"].get("user_id") == args.user)
+            and (args.task is None or s["name"] == args.task)
+        }
+        spans = [s for s in spans if s["trace_id"] in traces]
+    stage_report(spans)
+
+    if args.slowest:
+        tasks = [
+            s
+            for s in spans
+            if s["kind"] == "consumer" and (args.task is None or s["name"] == args.task)
+        ]
+        tasks.sort(key=lambda s: -s["duration_ms"])
+        for s in tasks[: args.slowest]:
+            print()
+            print_tree(spans, s["trace_id"])
+
+
+if __name__ == "__main__":
+    main()
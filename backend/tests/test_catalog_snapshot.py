@@ -0,0 +1,63 @@
+"""
+Workers rank from the published snapshot while it is fresh and fall back
+to their own delta-refreshed store once it is older than the max age.
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.movies import catalog_snapshot
+from src.movies.catalog_snapshot import (CatalogSnapshot, META_FILE,
+                                         write_catalog_snapshot)
+from src.movies.catalog_store import CatalogStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def published(tmp_path, monkeypatch):
+    store = CatalogStore()
+    store.load([(uuid.uuid4(), 1.0, 5.0, [1, 2], datetime.utcnow())])
+    version = write_catalog_snapshot(store, str(tmp_path))
+    monkeypatch.setattr(
+        catalog_snapshot, "catalog_snapshot", CatalogSnapshot(str(tmp_path))
+    )
+
+    resident = CatalogStore()
+
+    async def refresh_catalog_store(db, **kwargs):
+        return resident
+
+    monkeypatch.setattr(
+        catalog_snapshot, "refresh_catalog_store", refresh_catalog_store
+    )
+
+    def age(seconds: float) -> None:
+        meta_path = os.path.join(tmp_path, version, META_FILE)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta["created_at"] = (
+            datetime.utcnow() - timedelta(seconds=seconds)
+        ).isoformat()
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+
+    return age, resident
+
+
+async def test_fresh_snapshot_is_used(published):
+    age, resident = published
+    age(10)
+    store = await catalog_snapshot.get_catalog_store(db=None)
+    assert store.snapshot_version is not None
+    assert store.stats()["seconds_since_refresh"] >= 10
+
+
+async def test_stale_snapshot_falls_back_to_resident_store(published):
+    age, resident = published
+    age(catalog_snapshot.get_settings().catalog_snapshot_max_age_seconds + 60)
+    assert await catalog_snapshot.get_catalog_store(db=None) is resident
@@ -0,0 +1,86 @@
+"""
+The `movies.updated_at` change feed re-reads `poll_lag` seconds behind the
+watermark, so a row stamped before the watermark but committed after the
+previous poll is still applied.
+"""
+
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.movies.autocomplete import (TitlePrefixIndex, TitleRow,
+                                     refresh_title_index)
+from src.movies.catalog_store import CatalogStore, refresh_catalog_store
+
+pytestmark = pytest.mark.anyio
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+StoreRow = namedtuple(
+    "StoreRow", "id popularity rating feature_ids updated_at"
+)
+TitleDbRow = namedtuple(
+    "TitleDbRow", "id title release_date popularity updated_at"
+)
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class _ChangeFeed:
+    """
+    Stands in for the session: answers `updated_at >= :since` polls from
+    the committed rows.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.since = []
+
+    async def execute(self, stmt):
+        (since,) = stmt.compile().params.values()
+        self.since.append(since)
+        return _Result([r for r in self.rows if r.updated_at >= since])
+
+
+def _late_commit(make_row):
+    # committed after the poll that advanced the watermark to T0, but
+    # stamped a few seconds earlier at flush
+    return make_row(uuid.uuid4(), T0 - timedelta(seconds=5))
+
+
+async def test_catalog_store_applies_late_committed_rows():
+    seen = StoreRow(uuid.uuid4(), 1.0, 5.0, [1], T0)
+    store = CatalogStore()
+    store.load([tuple(seen)])
+    store.refreshed_at = 0.0
+
+    late = _late_commit(lambda id_, ts: StoreRow(id_, 2.0, 6.0, [2], ts))
+    feed = _ChangeFeed([seen, late])
+    await refresh_catalog_store(feed, store, min_interval=0, poll_lag=30)
+
+    assert feed.since == [T0 - timedelta(seconds=30)]
+    assert store.rows_of([late.id])
+    assert store.watermark == T0
+
+
+async def test_title_index_applies_late_committed_rows():
+    seen = TitleRow(uuid.uuid4(), "Heat", 1995, 1.0, T0)
+    index = TitlePrefixIndex()
+    index.build([seen])
+
+    late = _late_commit(
+        lambda id_, ts: TitleDbRow(id_, "Heathers", None, 2.0, ts)
+    )
+    feed = _ChangeFeed([late])
+    assert await refresh_title_index(feed, index, poll_lag=30) == 1
+
+    assert feed.since == [T0 - timedelta(seconds=30)]
+    assert [s.title for s in index.lookup("heat")] == ["Heathers", "Heat"]
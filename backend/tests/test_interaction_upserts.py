@@ -0,0 +1,124 @@
+"""
+Concurrency checks for the single-statement interaction upserts
+(add_favorite, add_dislike, upsert_status).
+
+They fire identical requests in parallel, each on its own session, and
+check both correctness (one row, no IntegrityError) and round trips (one
+statement per call, counted by assert_max_queries). They need the
+migrated compose Postgres (POSTGRES_* as for the API) and are skipped
+when it is unreachable:
+
+    docker compose up -d postgres && alembic upgrade head
+    python -m pytest tests
+"""
+
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import DBAPIError
+
+from src.app.db import AsyncSessionLocal, engine
+from src.app.querycount import assert_max_queries
+from src.auth.models import User
+from src.movies import crud
+from src.movies.models import Dislike, Favorite, Movie, Status
+
+pytestmark = pytest.mark.anyio
+
+PARALLEL = 8
+
+
+@asynccontextmanager
+async def user_and_movie():
+    """
+    A throwaway user and movie, deleted (with their interactions) after.
+    """
+    suffix = uuid.uuid4().hex[:12]
+    user = User(
+        email=f"upsert-{suffix}@example.com",
+        username=f"upsert-{suffix}",
+        password_hash="x",
+    )
+    movie = Movie(title=f"Upsert test {suffix}")
+    try:
+        async with AsyncSessionLocal() as session:
+            session.add_all([user, movie])
+            await session.commit()
+    except (OSError, DBAPIError) as exc:
+        await engine.dispose()
+        pytest.skip(f"Postgres unavailable: {exc}")
+    try:
+        yield user.id, movie.id
+    finally:
+        async with AsyncSessionLocal() as session:
+            for model in (Favorite, Dislike, Status):
+                await session.execute(delete(model).where(model.user_id == user.id))
+            await session.execute(delete(Movie).where(Movie.id == movie.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+        # pooled connections belong to this test's event loop
+        await engine.dispose()
+
+
+async def _parallel(call, *args):
+    async def one():
+        async with AsyncSessionLocal() as session:
+            return await call(session, *args)
+
+    return await asyncio.gather(*(one() for _ in range(PARALLEL)))
+
+
+async def _count(model, user_id, movie_id) -> int:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(
+            select(func.count())
+            .select_from(model)
+            .where(model.user_id == user_id, model.movie_id == movie_id)
+        )
+
+
+async def test_parallel_add_favorite_is_one_row_one_statement_each():
+    async with user_and_movie() as (user_id, movie_id):
+        with assert_max_queries(PARALLEL):
+            favorites = await _parallel(crud.add_favorite, user_id, movie_id)
+
+        assert len({f.id for f in favorites}) == 1
+        assert await _count(Favorite, user_id, movie_id) == 1
+
+
+async def test_parallel_add_dislike_clears_favorite():
+    async with user_and_movie() as (user_id, movie_id):
+        async with AsyncSessionLocal() as session:
+            await crud.add_favorite(session, user_id, movie_id)
+
+        with assert_max_queries(PARALLEL):
+            dislikes = await _parallel(crud.add_dislike, user_id, movie_id)
+
+        assert len({d.id for d in dislikes}) == 1
+        assert await _count(Dislike, user_id, movie_id) == 1
+        assert await _count(Favorite, user_id, movie_id) == 0
+
+
+async def test_parallel_upsert_status_keeps_one_row():
+    async with user_and_movie() as (user_id, movie_id):
+        values = ["watching", "completed"] * (PARALLEL // 2)
+
+        async def upsert(value):
+            async with AsyncSessionLocal() as session:
+                return await crud.upsert_status(session, user_id, movie_id, value)
+
+        with assert_max_queries(PARALLEL):
+            statuses = await asyncio.gather(*(upsert(v) for v in values))
+
+        assert len({s.id for s in statuses}) == 1
+        assert await _count(Status, user_id, movie_id) == 1
+        async with AsyncSessionLocal() as session:
+            final = await session.scalar(
+                select(Status.status).where(
+                    Status.user_id == user_id, Status.movie_id == movie_id
+                )
+            )
+        assert final in {"watching", "completed"}
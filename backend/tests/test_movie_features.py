@@ -0,0 +1,73 @@
+"""
+update_movie keeps `movies.feature_ids` in sync with genres/keywords, the
+way create_movie and the TMDB upsert do; rankers, the catalog store and
+taste accumulation read only the ids.
+
+Needs the migrated compose Postgres and is skipped when it is
+unreachable.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.exc import DBAPIError
+
+from src.app.db import AsyncSessionLocal, engine
+from src.movies import crud
+from src.movies.models import Feature, Movie
+from src.movies.schema import MovieCreate, MovieUpdate
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_update_movie_reinterns_features():
+    suffix = uuid.uuid4().hex[:12]
+    drama, comedy, heist = (f"{n} {suffix}" for n in ("drama", "comedy", "heist"))
+
+    try:
+        async with AsyncSessionLocal() as session:
+            movie = await crud.create_movie(
+                session,
+                MovieCreate(
+                    title=f"Features test {suffix}",
+                    genres=[drama],
+                    keywords=[heist],
+                ),
+            )
+    except (OSError, DBAPIError) as exc:
+        await engine.dispose()
+        pytest.skip(f"Postgres unavailable: {exc}")
+
+    try:
+        async with AsyncSessionLocal() as session:
+            movie = await session.get(Movie, movie.id)
+            created = list(movie.feature_ids)
+
+            # untouched genres/keywords leave the ids alone
+            movie = await crud.update_movie(
+                session, movie, MovieUpdate(title=f"Renamed {suffix}")
+            )
+            assert movie.feature_ids == created
+
+            movie = await crud.update_movie(
+                session, movie, MovieUpdate(genres=[comedy])
+            )
+            expected = await crud.intern_features(session, [comedy], [heist])
+            assert movie.feature_ids == expected
+            assert movie.feature_ids != created
+
+            movie = await crud.update_movie(
+                session, movie, MovieUpdate(keywords=None)
+            )
+            assert movie.feature_ids == await crud.intern_features(
+                session, [comedy], None
+            )
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(Movie).where(Movie.id == movie.id))
+            await session.execute(
+                delete(Feature).where(Feature.name.in_([drama, comedy, heist]))
+            )
+            await session.commit()
+        await engine.dispose()
@@ -0,0 +1,64 @@
+"""
+/movies/search only falls back to TMDB when the local catalog has almost
+nothing, and a Redis/broker outage degrades it to the local results.
+"""
+
+import pytest
+
+import src.app.redis
+from src.movies import router
+
+pytestmark = pytest.mark.anyio
+
+
+class _Redis:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.keys = []
+
+    async def set(self, key, value, nx=False, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.keys.append(key)
+        return True
+
+
+@pytest.fixture
+def search(monkeypatch):
+    queued = []
+    redis = _Redis()
+
+    def run(hits: int, limit: int = 20, redis_down: bool = False):
+        movies = [object()] * hits
+
+        async def search_movies(db, q, limit):
+            return movies
+
+        redis.fail = redis_down
+        monkeypatch.setattr(router.crud, "search_movies", search_movies)
+        monkeypatch.setattr(src.app.redis, "get_redis_client", lambda: redis)
+        monkeypatch.setattr(router.ingest_tmdb_search, "delay", queued.append)
+        return router.search_movies(q="Heat", limit=limit, db=None), movies
+
+    run.queued = queued
+    return run
+
+
+@pytest.mark.parametrize("hits", [5, 19])
+async def test_enough_local_hits_do_not_queue_tmdb(search, hits):
+    result, movies = search(hits)
+    assert await result is movies
+    assert search.queued == []
+
+
+@pytest.mark.parametrize("hits", [0, router.TMDB_SEARCH_MIN_HITS - 1])
+async def test_few_local_hits_queue_tmdb(search, hits):
+    result, movies = search(hits)
+    assert await result is movies
+    assert search.queued == ["Heat"]
+
+
+async def test_redis_outage_returns_local_results(search):
+    result, movies = search(0, redis_down=True)
+    assert await result is movies
+    assert search.queued == []